@@ -0,0 +1,100 @@
+# Benchmark do cache em disco de árvores sintáticas (.tupac)
+#
+# Gera um programa grande, com muitas funções e classes, em um diretório
+# temporário e mede a preparação do arquivo para execução sem cache (lexer e
+# parser), na primeira execução (que ainda grava o .tupac) e com o cache
+# quente, além do tempo total de um processo que executa o arquivo.
+#
+# Uso: python benchmarks/cache_disco.py [funcoes]
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+from tupa_interpreter import analisar_arquivo, caminho_cache
+
+def gerar_programa(funcoes):
+    """Gera 'funcoes' funções e classes pequenas e uma chamada a cada uma"""
+    linhas = []
+    for i in range(funcoes):
+        linhas += [
+            f"função calcular_{i}(x, y)",
+            f"    criar lista valores = [x, y, {i}, x * y]",
+            "    criar total = 0",
+            "    para v em valores fazer",
+            "        se v > 10 e não (v == 20) então",
+            f"            total = total + v * {i} - (x / 2)",
+            "        senão",
+            "            total = total - 1",
+            "        fim",
+            "    fim",
+            "    devolver total",
+            "fim",
+            f"classe Ponto{i}",
+            "    criar x = 0",
+            "    função mover(dx)",
+            "        self.x = self.x + dx",
+            "        devolver self.x",
+            "    fim",
+            "fim",
+        ]
+    linhas.append("criar soma = 0")
+    for i in range(funcoes):
+        linhas.append(f"soma = soma + calcular_{i}({i}, 3)")
+    linhas.append("mostrar soma")
+    return '\n'.join(linhas)
+
+def medir(funcao, repeticoes=5):
+    """Menor tempo de 'repeticoes' chamadas"""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+def processo(caminho, *opcoes):
+    """Tempo de um processo que executa o arquivo"""
+    inicio = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(RAIZ, 'tupa_interpreter.py'), *opcoes, caminho],
+                   check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - inicio
+
+def main():
+    funcoes = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'programa.tupa')
+        codigo = gerar_programa(funcoes)
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(codigo)
+
+        def sem_cache():
+            analisar_arquivo(caminho, codigo, usar_cache=False)
+
+        def primeira():
+            if os.path.exists(caminho_cache(caminho)):
+                os.remove(caminho_cache(caminho))
+            analisar_arquivo(caminho, codigo)
+
+        def quente():
+            analisar_arquivo(caminho, codigo)
+
+        print(f"{len(codigo.splitlines())} linhas, {len(codigo) / 1024:.0f} KB")
+        print(f"{'análise sem cache':<28} {medir(sem_cache) * 1000:>8.1f}ms")
+        print(f"{'primeira (grava .tupac)':<28} {medir(primeira) * 1000:>8.1f}ms")
+        print(f"{'cache quente':<28} {medir(quente) * 1000:>8.1f}ms")
+
+        frio = min(processo(caminho, '--sem-cache') for _ in range(3))
+        processo(caminho)
+        morno = min(processo(caminho) for _ in range(3))
+        print(f"{'processo sem cache':<28} {frio * 1000:>8.1f}ms")
+        print(f"{'processo com cache quente':<28} {morno * 1000:>8.1f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Benchmark do Otimizador
+#
+# Gera um programa numérico cujo laço está cheio de subexpressões constantes,
+# parênteses, 'se' de condição fixa e 'não não', e o executa em cada motor
+# com e sem o Otimizador.
+#
+# Uso: python benchmarks/dobra_constantes.py [iteracoes]
+
+import io
+import os
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tupa_interpreter import MOTORES, Interpretador, Lexer, Parser
+
+def gerar_programa(iteracoes, expressoes=12):
+    """Gera um laço com 'expressoes' atualizações cheias de constantes"""
+    aleatorio = random.Random(42)
+    linhas = ["criar total = 0", f"para i de 1 até {iteracoes} fazer"]
+    for _ in range(expressoes):
+        a, b, c = (aleatorio.randint(1, 9) for _ in range(3))
+        linhas.append(f"    total = total + i * ({a} * 3.14159 / 180) - ({b} * {c} - {b * c - 1})")
+        linhas.append(f"    se {a} < {b + 10} então")
+        linhas.append(f"        total = total + (({a} + {b}) * {c})")
+        linhas.append("    senão")
+        linhas.append("        total = 0")
+        linhas.append("    fim")
+        linhas.append("    se não não (i > 0) então")
+        linhas.append("        total = total - 1")
+        linhas.append("    fim")
+    linhas.append("fim")
+    linhas.append("mostrar total")
+    return '\n'.join(linhas)
+
+def executar(codigo, motor, otimizar):
+    """Executa o programa e devolve (segundos, saída)"""
+    arvore = Parser(Lexer(codigo).iter_tokens()).analisar()
+    interpretador = Interpretador(motor, otimizar)
+    saida = io.StringIO()
+
+    inicio = time.perf_counter()
+    with redirect_stdout(saida):
+        interpretador.interpretar(arvore)
+    return time.perf_counter() - inicio, saida.getvalue().strip()
+
+def main():
+    iteracoes = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    codigo = gerar_programa(iteracoes)
+
+    print(f"{'motor':<12} {'sem otimizar':>13} {'otimizado':>10} {'ganho':>7}")
+    for motor in MOTORES:
+        sem, saida_sem = executar(codigo, motor, False)
+        com, saida_com = executar(codigo, motor, True)
+        if saida_sem != saida_com:
+            raise SystemExit(f"Resultados diferentes no motor {motor}: {saida_sem} != {saida_com}")
+        print(f"{motor:<12} {sem:>12.3f}s {com:>9.3f}s {sem / com:>6.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Benchmark da API de embutir
+#
+# Executa muitos trechos curtos, como um serviço que embute o interpretador:
+# criando um Interpretador por trecho e, depois, reaproveitando um único
+# interpretador com executar_fonte e redefinir() e um reservatório usado por
+# várias threads.
+#
+# Uso: python benchmarks/embutir.py [trechos]
+
+import io
+import os
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tupa_interpreter import MOTORES, Interpretador, Lexer, Parser, ReservatorioInterpretadores
+
+TRECHO = """
+usar colecoes
+função quadrado(x)
+    devolver x * x
+fim
+criar total = soma(mapear(quadrado, valores))
+mostrar total
+devolver total
+"""
+
+VALORES = list(range(20))
+
+def novo_por_trecho(motor, trechos):
+    """Cria Lexer, Parser e Interpretador para cada trecho, como executar_codigo"""
+    for _ in range(trechos):
+        interpretador = Interpretador(motor)
+        interpretador.definir('valores', VALORES)
+        with redirect_stdout(io.StringIO()):
+            interpretador.interpretar(Parser(Lexer(TRECHO).iter_tokens()).analisar())
+
+def reaproveitado(motor, trechos):
+    """Um único interpretador, redefinido entre os trechos"""
+    interpretador = Interpretador(motor)
+    for _ in range(trechos):
+        interpretador.executar_fonte(TRECHO, globais={'valores': VALORES})
+        interpretador.redefinir()
+
+def reservatorio(motor, trechos, threads=4):
+    """Um reservatório de interpretadores atendendo a várias threads"""
+    conjunto = ReservatorioInterpretadores(threads, motor)
+
+    def trabalhar():
+        for _ in range(trechos // threads):
+            conjunto.executar_fonte(TRECHO, globais={'valores': VALORES})
+
+    trabalhadoras = [threading.Thread(target=trabalhar) for _ in range(threads)]
+    for trabalhadora in trabalhadoras:
+        trabalhadora.start()
+    for trabalhadora in trabalhadoras:
+        trabalhadora.join()
+
+def main():
+    trechos = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    print(f"{'motor':<12} {'novo por trecho':>16} {'reaproveitado':>14} {'reservatório':>13}")
+    for motor in MOTORES:
+        tempos = []
+        for modo in (novo_por_trecho, reaproveitado, reservatorio):
+            inicio = time.perf_counter()
+            modo(motor, trechos)
+            tempos.append((time.perf_counter() - inicio) / trechos * 1e6)
+        print(f"{motor:<12} {tempos[0]:>14.1f}us {tempos[1]:>12.1f}us {tempos[2]:>11.1f}us")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# Benchmark de inicialização
+#
+# Mede o custo de importar o interpretador, com 'python -X importtime' em um
+# processo novo, e o de criar um Interpretador e executar um programa vazio
+# (e um com 'usar matematica') em cada motor, como faz quem cria muitos
+# interpretadores de vida curta.
+#
+# Uso: python benchmarks/inicializacao.py [repeticoes]
+
+import io
+import os
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+from tupa_interpreter import MOTORES, Interpretador, Lexer, Parser
+
+PROGRAMAS = {
+    'vazio': "",
+    'usar matematica': "usar matematica\nmostrar piso(pi)",
+}
+
+def tempo_importacao():
+    """Microssegundos de 'import tupa_interpreter', próprios e com as dependências"""
+    # Sem PYTHONDONTWRITEBYTECODE, para medir a importação com o .pyc já gravado
+    ambiente = {nome: valor for nome, valor in os.environ.items() if nome != 'PYTHONDONTWRITEBYTECODE'}
+    resultado = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import tupa_interpreter'],
+                               cwd=RAIZ, env=ambiente, capture_output=True, text=True, check=True)
+    for linha in resultado.stderr.splitlines():
+        # Formato: "import time: self [us] | cumulative | imported package"
+        partes = [parte.strip() for parte in linha.split(':', 1)[1].split('|')]
+        if partes[2] == 'tupa_interpreter':
+            return int(partes[0]), int(partes[1])
+    raise SystemExit("tupa_interpreter não aparece na saída de -X importtime")
+
+def medir(codigo, motor, repeticoes):
+    """Microssegundos por criação de Interpretador mais execução do programa"""
+    inicio = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        for _ in range(repeticoes):
+            arvore = Parser(Lexer(codigo).iter_tokens()).analisar()
+            Interpretador(motor).executar_programa(arvore)
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    proprio, total = min(tempo_importacao() for _ in range(5))
+    print(f"import tupa_interpreter: {proprio / 1000:.1f}ms próprios, {total / 1000:.1f}ms com dependências")
+
+    print(f"{'motor':<12} " + ' '.join(f"{nome:>16}" for nome in PROGRAMAS))
+    for motor in MOTORES:
+        tempos = [medir(codigo, motor, repeticoes) for codigo in PROGRAMAS.values()]
+        print(f"{motor:<12} " + ' '.join(f"{tempo:>14.1f}us" for tempo in tempos))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# Benchmark do módulo 'matriz'
+#
+# Multiplica duas matrizes quadradas e soma os elementos do resultado com
+# laços 'para' escritos em Tupã e com 'produto' e 'somar_eixo' do módulo
+# 'matriz', em cada motor. Precisa do NumPy instalado.
+#
+# Uso: python benchmarks/matriz.py [ordem]
+
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tupa_interpreter import MOTORES, ErroTupa, Interpretador, Lexer, Parser, carregar_modulo_matriz
+
+LACOS = """
+criar c = []
+para i de 0 até n - 1 fazer
+    criar linha = []
+    para j de 0 até n - 1 fazer
+        criar s = 0
+        para k de 0 até n - 1 fazer
+            s = s + a[i][k] * b[k][j]
+        fim
+        linha.append(s)
+    fim
+    c.append(linha)
+fim
+criar total = 0
+para i de 0 até n - 1 fazer
+    para j de 0 até n - 1 fazer
+        total = total + c[i][j]
+    fim
+fim
+mostrar total
+"""
+
+MATRIZ = """
+usar matriz
+criar c = produto(matriz(a), matriz(b))
+mostrar para_texto(somar_eixo(c))
+"""
+
+def executar(codigo, motor, ordem):
+    """Executa o programa e devolve (segundos, saída)"""
+    arvore = Parser(Lexer(codigo).iter_tokens()).analisar()
+    interpretador = Interpretador(motor)
+    interpretador.definir('n', ordem)
+    interpretador.definir('a', [[i + j for j in range(ordem)] for i in range(ordem)])
+    interpretador.definir('b', [[i - j for j in range(ordem)] for i in range(ordem)])
+    saida = io.StringIO()
+
+    inicio = time.perf_counter()
+    with redirect_stdout(saida):
+        interpretador.interpretar(arvore)
+    return time.perf_counter() - inicio, saida.getvalue().strip()
+
+def main():
+    try:
+        carregar_modulo_matriz()
+    except ErroTupa as e:
+        raise SystemExit(str(e))
+
+    ordem = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+
+    print(f"{'motor':<12} {'laços':>9} {'matriz':>9} {'ganho':>8}")
+    for motor in MOTORES:
+        lacos, saida_lacos = executar(LACOS, motor, ordem)
+        matriz, saida_matriz = executar(MATRIZ, motor, ordem)
+        if saida_lacos != saida_matriz:
+            raise SystemExit(f"Resultados diferentes no motor {motor}: {saida_lacos} != {saida_matriz}")
+        print(f"{motor:<12} {lacos:>8.3f}s {matriz:>8.3f}s {lacos / matriz:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Benchmark de memória da árvore sintática
+#
+# Gera um programa Tupã grande, analisa-o e compara a memória ocupada pela
+# árvore de nós com __slots__ e pela mesma árvore em dicionários (to_dict(),
+# o formato usado antes pelo Parser).
+#
+# Uso: python benchmarks/memoria_ast.py [quantidade_de_funcoes]
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tupa_interpreter import Lexer, Parser
+
+def gerar_programa(quantidade):
+    """Gera um programa com a quantidade indicada de funções"""
+    linhas = []
+    for i in range(quantidade):
+        linhas.append(f"função f{i}(a, b)")
+        linhas.append(f"    criar x = a * {i} + b / 2")
+        linhas.append(f"    se x >= {i} e não (b == \"texto\") então")
+        linhas.append(f"        devolver [x, {{\"k\": b}}, f{i}(x - 1, b)]")
+        linhas.append("    fim")
+        linhas.append("    devolver x")
+        linhas.append("fim")
+    return '\n'.join(linhas)
+
+def medir(funcao):
+    """Executa a função e devolve (resultado, bytes alocados que continuam vivos)"""
+    tracemalloc.start()
+    try:
+        resultado = funcao()
+        atual, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return resultado, atual
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    codigo = gerar_programa(quantidade)
+
+    arvore, bytes_nos = medir(lambda: Parser(Lexer(codigo).iter_tokens()).analisar())
+    _, bytes_dicionarios = medir(arvore.to_dict)
+
+    print(f"Programa: {codigo.count(chr(10)) + 1} linhas")
+    print(f"Árvore com __slots__: {bytes_nos / 1024 / 1024:8.2f} MiB")
+    print(f"Árvore em dicionários: {bytes_dicionarios / 1024 / 1024:8.2f} MiB")
+    print(f"Redução: {1 - bytes_nos / bytes_dicionarios:.0%}")
+
+if __name__ == '__main__':
+    main()
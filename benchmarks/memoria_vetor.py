@@ -0,0 +1,64 @@
+# Benchmark de memória de vetores
+#
+# Cria uma série de números reais como 'lista' e como 'vetor' e mede o tempo
+# para preenchê-la e somá-la em cada motor e, em uma segunda execução com
+# tracemalloc (que deixa tudo mais lento), o pico de memória alocada.
+#
+# Uso: python benchmarks/memoria_vetor.py [quantidade]
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tupa_interpreter import MOTORES, Interpretador, Lexer, Parser
+
+PROGRAMA = """
+criar {tipo} xs = {criacao}
+para i de 0 até quantidade - 1 fazer
+    xs[i] = i * 0.5
+fim
+criar total = 0
+para x em xs fazer
+    total = total + x
+fim
+"""
+
+CRIACOES = {
+    'lista': 'para_lista(zeros)',
+    'vetor': 'vetor_real(quantidade)',
+}
+
+def executar(motor, tipo, quantidade, medir_memoria=False):
+    """Executa o programa e devolve os segundos ou, medindo a memória, os bytes alocados no pico"""
+    codigo = PROGRAMA.format(tipo=tipo, criacao=CRIACOES[tipo])
+    arvore = Parser(Lexer(codigo).iter_tokens()).analisar()
+    interpretador = Interpretador(motor)
+    interpretador.definir('quantidade', quantidade)
+    interpretador.definir('zeros', [0.0] * quantidade)
+
+    if not medir_memoria:
+        inicio = time.perf_counter()
+        interpretador.interpretar(arvore)
+        return time.perf_counter() - inicio
+
+    tracemalloc.start()
+    interpretador.interpretar(arvore)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pico
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    print(f"{'motor':<12} {'tipo':<6} {'tempo':>9} {'memória':>10}")
+    for motor in MOTORES:
+        for tipo in CRIACOES:
+            segundos = executar(motor, tipo, quantidade)
+            pico = executar(motor, tipo, quantidade, medir_memoria=True)
+            print(f"{motor:<12} {tipo:<6} {segundos:>8.3f}s {pico / 2**20:>8.1f}MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Benchmark das operações em lote do módulo 'colecoes'
+#
+# Soma, filtra e transforma a mesma lista com laços 'para ... em' escritos em
+# Tupã e com 'soma', 'filtrar' e 'mapear', em cada motor.
+#
+# Uso: python benchmarks/operacoes_em_lote.py [tamanho]
+
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tupa_interpreter import MOTORES, Interpretador, Lexer, Parser
+
+LACOS = """
+criar total = 0
+para x em xs fazer
+    total = total + x
+fim
+criar positivos = []
+para x em xs fazer
+    se x > 0 então
+        positivos.append(x)
+    fim
+fim
+criar raizes = []
+para x em positivos fazer
+    raizes.append(raiz(x))
+fim
+mostrar total
+mostrar soma(raizes)
+"""
+
+EM_LOTE = """
+função positivo(x)
+    devolver x > 0
+fim
+criar total = soma(xs)
+criar raizes = mapear(raiz, filtrar(positivo, xs))
+mostrar total
+mostrar soma(raizes)
+"""
+
+def executar(codigo, motor, tamanho):
+    """Executa o programa e devolve (segundos, saída)"""
+    arvore = Parser(Lexer("usar colecoes\n" + codigo).iter_tokens()).analisar()
+    interpretador = Interpretador(motor)
+    interpretador.definir('xs', [i - tamanho // 2 for i in range(tamanho)])
+    saida = io.StringIO()
+
+    inicio = time.perf_counter()
+    with redirect_stdout(saida):
+        interpretador.interpretar(arvore)
+    return time.perf_counter() - inicio, saida.getvalue().strip()
+
+def main():
+    tamanho = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    print(f"{'motor':<12} {'laços':>9} {'em lote':>9} {'ganho':>7}")
+    for motor in MOTORES:
+        lacos, saida_lacos = executar(LACOS, motor, tamanho)
+        lote, saida_lote = executar(EM_LOTE, motor, tamanho)
+        if saida_lacos != saida_lote:
+            raise SystemExit(f"Resultados diferentes no motor {motor}: {saida_lacos} != {saida_lote}")
+        print(f"{motor:<12} {lacos:>8.3f}s {lote:>8.3f}s {lacos / lote:>6.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# Benchmark de paralelo_mapear
+#
+# Aplica uma função numérica pura (conta os primos até n por divisões
+# sucessivas) a uma lista de entradas com 1, 2, 4... processos, até o número
+# de núcleos da máquina, e compara com o mapeamento no próprio processo. Com
+# trabalho suficiente por elemento, o tempo cai quase na proporção dos núcleos.
+#
+# Uso: python benchmarks/paralelo.py [elementos] [limite] [motor]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tupa_interpreter import Interpretador, Lexer, Parser
+
+PROGRAMA = """
+usar matematica com piso
+
+função contar_primos(n)
+    criar quantidade = 0
+    para candidato de 2 até n fazer
+        criar primo = verdadeiro
+        criar divisor = 2
+        enquanto primo e divisor * divisor <= candidato fazer
+            se candidato - piso(candidato / divisor) * divisor == 0 então
+                primo = falso
+            fim
+            divisor = divisor + 1
+        fim
+        se primo então
+            quantidade = quantidade + 1
+        fim
+    fim
+    devolver quantidade
+fim
+
+criar resultado = paralelo_mapear(contar_primos, entradas, processos)
+"""
+
+def executar(motor, entradas, processos):
+    """Executa o programa e devolve (segundos, resultados)"""
+    arvore = Parser(Lexer(PROGRAMA).iter_tokens()).analisar()
+    interpretador = Interpretador(motor)
+    interpretador.definir('entradas', entradas)
+    interpretador.definir('processos', processos)
+
+    inicio = time.perf_counter()
+    interpretador.executar_programa(arvore)
+    return time.perf_counter() - inicio, interpretador.obter('resultado')
+
+def main():
+    elementos = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    limite = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    motor = sys.argv[3] if len(sys.argv) > 3 else 'vm'
+    entradas = [limite + i for i in range(elementos)]
+    nucleos = os.cpu_count() or 1
+
+    # Cria os processos antes de medir, como num programa que mapeia várias vezes
+    executar(motor, entradas[:2], max(2, nucleos))
+
+    base, esperado = executar(motor, entradas, 1)
+    print(f"{nucleos} núcleos, motor {motor}")
+    print(f"{'processos':>9} {'tempo':>9} {'aceleração':>11}")
+    print(f"{1:>9} {base:>8.3f}s {1:>10.2f}x")
+    processos = 2
+    while processos <= max(2, nucleos):
+        segundos, resultado = executar(motor, entradas, processos)
+        if resultado != esperado:
+            raise SystemExit(f"Resultado diferente com {processos} processos")
+        print(f"{processos:>9} {segundos:>8.3f}s {base / segundos:>10.2f}x")
+        processos *= 2
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Benchmark de retorno antecipado
+#
+# Executa buscas que encontram o alvo logo no início de listas de tamanhos
+# crescentes, com 'devolver' dentro de 'se' em laços 'para ... em' e
+# 'enquanto'. Um contador conta os elementos visitados: quando 'devolver'
+# encerra a função de imediato, ele e o tempo não crescem com o tamanho da
+# lista.
+#
+# Uso: python benchmarks/retorno_antecipado.py [quantidade_de_buscas]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tupa_interpreter import MOTORES, Interpretador, Lexer, Parser
+
+PROGRAMA = """
+criar visitados = [0]
+
+função buscar(xs, alvo)
+    para x em xs fazer
+        visitados[0] = visitados[0] + 1
+        se x == alvo então
+            devolver x
+        fim
+    fim
+    devolver -1
+fim
+
+função buscar_enquanto(xs, alvo)
+    criar i = 0
+    enquanto i < tamanho(xs) fazer
+        visitados[0] = visitados[0] + 1
+        se xs[i] == alvo então
+            devolver i
+        fim
+        i = i + 1
+    fim
+    devolver -1
+fim
+
+criar xs = para_lista(intervalo)
+para n de 1 até buscas fazer
+    buscar(xs, 10)
+    buscar_enquanto(xs, 10)
+fim
+"""
+
+def executar(motor, tamanho, buscas):
+    """Executa as buscas e devolve (segundos, elementos visitados)"""
+    arvore = Parser(Lexer(PROGRAMA).iter_tokens()).analisar()
+    interpretador = Interpretador(motor)
+    interpretador.definir('intervalo', range(tamanho))
+    interpretador.definir('buscas', buscas)
+
+    inicio = time.perf_counter()
+    interpretador.interpretar(arvore)
+    return time.perf_counter() - inicio, interpretador.obter('visitados')[0]
+
+def main():
+    buscas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    print(f"{'motor':<12} {'tamanho':>8} {'tempo':>9} {'visitados':>10}")
+    for motor in MOTORES:
+        for tamanho in (100, 10000):
+            segundos, visitados = executar(motor, tamanho, buscas)
+            print(f"{motor:<12} {tamanho:>8} {segundos:>8.3f}s {visitados:>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# Benchmark da saída de 'mostrar'
+#
+# Executa, em um processo novo por medição, um laço que mostra um milhão de
+# linhas para um pipe lido por este script, com a saída acumulada em buffer
+# (padrão) e com '--sem-buffer', que escreve cada linha assim que mostrada,
+# como o print fazia antes.
+#
+# Uso: python benchmarks/saida_mostrar.py [linhas]
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+INTERPRETADOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tupa_interpreter.py')
+
+PROGRAMA = """
+para i de 1 até {linhas} fazer
+    mostrar i
+fim
+"""
+
+def executar(caminho, motor, *opcoes):
+    """Segundos para executar o arquivo, lendo toda a saída pelo pipe"""
+    inicio = time.perf_counter()
+    resultado = subprocess.run([sys.executable, INTERPRETADOR, '--motor', motor, '--sem-cache', *opcoes, caminho],
+                               stdout=subprocess.PIPE, check=True)
+    segundos = time.perf_counter() - inicio
+    return segundos, resultado.stdout.count(b'\n')
+
+def main():
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'mostrar.tupa')
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(PROGRAMA.format(linhas=linhas))
+
+        print(f"{'motor':<12} {'sem buffer':>11} {'com buffer':>11} {'ganho':>7} {'linhas/s':>12}")
+        for motor in ('vm', 'fechamentos'):
+            sem, contadas_sem = executar(caminho, motor, '--sem-buffer')
+            com, contadas_com = executar(caminho, motor)
+            if contadas_sem != linhas or contadas_com != linhas:
+                raise SystemExit(f"Linhas perdidas no motor {motor}: {contadas_sem}, {contadas_com}")
+            print(f"{motor:<12} {sem:>10.2f}s {com:>10.2f}s {sem / com:>6.2f}x {linhas / com:>12,.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+# Suíte de benchmarks do interpretador
+#
+# Executa os programas Tupã de benchmarks/programas, cada um exercitando um
+# caminho quente diferente (recursão, laços aninhados, concatenação de textos,
+# listas e dicionários, chamadas de métodos), e um programa grande gerado
+# aqui, que exercita o lexer e o parser. Cada programa é medido em três fases
+# separadas: lexer, parser e execução (que inclui resolver, otimizar e
+# compilar). Depois das execuções de aquecimento, descartadas, relata a
+# mediana e o desvio-padrão de cada fase nas repetições. A saída de cada
+# programa precisa ser a mesma em todos os motores e repetições.
+#
+# Com --salvar, grava os resultados em JSON. Com --comparar, compara um
+# arquivo salvo com outro ou com a execução atual e aponta as fases que
+# ficaram mais lentas que o limite, terminando com código 1 se houver alguma.
+#
+# Uso: python benchmarks/suite.py [--motor vm ...] [--repeticoes 7] [--aquecimento 1]
+#                                 [--filtro nome] [--salvar resultados.json]
+#      python benchmarks/suite.py --comparar base.json [novo.json] [--limite 10]
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIRETORIO, '..'))
+
+from tupa_interpreter import MOTORES, Interpretador, Lexer, Parser, SaidaTupa
+
+DIRETORIO_PROGRAMAS = os.path.join(DIRETORIO, 'programas')
+
+FASES = ('lexer', 'parser', 'execucao')
+
+# Versão do formato do JSON gravado por --salvar
+VERSAO_RESULTADOS = 1
+
+# Diferenças menores que esta, em segundos, não contam como regressão: em
+# fases muito curtas, como o lexer dos programas pequenos, são só ruído
+DIFERENCA_MINIMA = 0.001
+
+def gerar_programa_grande(funcoes=400):
+    """Gera um programa longo, de funções e classes variadas, que quase não executa nada"""
+    linhas = ["// Programa gerado por benchmarks/suite.py para medir o lexer e o parser", ""]
+    for i in range(funcoes):
+        linhas += [
+            f"função calcular_{i}(a, b, itens)",
+            f"    criar total = a * {i} + b / 2.5 - (a - b) * 3",
+            "    para x de 1 até b fazer",
+            "        se x > a e não (x == b) então",
+            f"            total = total + x * {i % 7 + 1}",
+            "        senão",
+            "            total = total - 1",
+            "        fim",
+            "    fim",
+            "    para item em itens fazer",
+            f'        total = total + tamanho("texto {i}") + item[0]',
+            "    fim",
+            "    devolver total",
+            "fim",
+            "",
+        ]
+        if i % 10 == 0:
+            linhas += [
+                f"classe Registro{i}",
+                f'    criar nome = "registro {i}"',
+                "    criar valores = [1, 2, 3]",
+                "    função somar(x)",
+                "        devolver self.valores[0] + x",
+                "    fim",
+                "fim",
+                "",
+            ]
+    linhas.append(f"mostrar calcular_{funcoes - 1}(2, 3, [[1], [2]])")
+    return '\n'.join(linhas)
+
+def carregar_programas(filtro=None):
+    """Dicionário ordenado de nome -> código dos programas da suíte"""
+    programas = {}
+    for arquivo in sorted(os.listdir(DIRETORIO_PROGRAMAS)):
+        if arquivo.endswith('.tupa'):
+            with open(os.path.join(DIRETORIO_PROGRAMAS, arquivo), encoding='utf-8') as entrada:
+                programas[arquivo[:-len('.tupa')]] = entrada.read()
+    programas['analise_grande'] = gerar_programa_grande()
+    if filtro:
+        programas = {nome: codigo for nome, codigo in programas.items() if filtro in nome}
+    return programas
+
+def medir(codigo, motor):
+    """Segundos de cada fase de um programa e o que ele mostrou"""
+    gc.collect()
+    inicio = time.perf_counter()
+    tokens = list(Lexer(codigo).iter_tokens())
+    analisado = time.perf_counter()
+    arvore = Parser(tokens).analisar()
+    executado = time.perf_counter()
+
+    interpretador = Interpretador(motor)
+    saida = io.StringIO()
+    interpretador.saida = SaidaTupa(saida)
+    interpretador.executar_programa(arvore)
+    fim = time.perf_counter()
+    tempos = {'lexer': analisado - inicio, 'parser': executado - analisado, 'execucao': fim - executado}
+    return tempos, saida.getvalue()
+
+def executar_suite(programas, motores, repeticoes, aquecimento):
+    """Mede cada programa em cada motor e devolve os resultados no formato do JSON"""
+    resultados = {}
+    for nome, codigo in programas.items():
+        esperada = None
+        for motor in motores:
+            amostras = {fase: [] for fase in FASES}
+            for repeticao in range(aquecimento + repeticoes):
+                tempos, saida = medir(codigo, motor)
+                if esperada is None:
+                    esperada = saida
+                elif saida != esperada:
+                    raise SystemExit(f"Saída diferente em {nome} com o motor {motor}")
+                if repeticao >= aquecimento:
+                    for fase in FASES:
+                        amostras[fase].append(tempos[fase])
+            resultados[f"{nome}/{motor}"] = {fase: resumir(amostras[fase]) for fase in FASES}
+            print(formatar_linha(nome, motor, resultados[f"{nome}/{motor}"]), flush=True)
+    return resultados
+
+def resumir(amostras):
+    """Mediana e desvio-padrão das amostras, guardadas também"""
+    return {
+        'mediana': statistics.median(amostras),
+        'desvio': statistics.stdev(amostras) if len(amostras) > 1 else 0.0,
+        'amostras': amostras,
+    }
+
+def formatar_tempo(resumo):
+    """'mediana ±desvio' em milissegundos"""
+    return f"{resumo['mediana'] * 1000:>9.2f} ±{resumo['desvio'] * 1000:<7.2f}"
+
+def formatar_linha(nome, motor, fases):
+    return f"{nome:<20} {motor:<12} " + ' '.join(formatar_tempo(fases[fase]) for fase in FASES)
+
+def cabecalho():
+    return f"{'programa':<20} {'motor':<12} " + ' '.join(f"{fase + ' (ms)':>18}" for fase in FASES)
+
+def comparar(base, novo, limite):
+    """Mostra a variação de cada fase e devolve as regressões acima de 'limite' (em %)"""
+    regressoes = []
+    print(f"{'programa/motor':<33} {'fase':<9} {'base (ms)':>10} {'novo (ms)':>10} {'variação':>9}")
+    for chave in base['resultados']:
+        if chave not in novo['resultados']:
+            continue
+        for fase in FASES:
+            antes = base['resultados'][chave][fase]
+            depois = novo['resultados'][chave][fase]
+            variacao = (depois['mediana'] / antes['mediana'] - 1) * 100 if antes['mediana'] else 0.0
+            # Mais lenta além do limite, do ruído medido e da diferença mínima
+            regressao = (variacao > limite
+                         and depois['mediana'] - antes['mediana'] > max(DIFERENCA_MINIMA,
+                                                                        2 * max(antes['desvio'], depois['desvio'])))
+            if regressao:
+                regressoes.append((chave, fase, variacao))
+            print(f"{chave:<33} {fase:<9} {antes['mediana'] * 1000:>10.2f} {depois['mediana'] * 1000:>10.2f} "
+                  f"{variacao:>+8.1f}%{'  REGRESSÃO' if regressao else ''}")
+    return regressoes
+
+def ler_resultados(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        resultados = json.load(arquivo)
+    if resultados.get('versao') != VERSAO_RESULTADOS:
+        raise SystemExit(f"Formato de resultados desconhecido em {caminho}")
+    return resultados
+
+def main():
+    argumentos = argparse.ArgumentParser(description="Suíte de benchmarks do interpretador Tupã")
+    argumentos.add_argument('--motor', action='append', choices=MOTORES,
+                            help="motor a medir; pode ser repetido (padrão: todos)")
+    argumentos.add_argument('--repeticoes', type=int, default=7, help="medições por programa e motor")
+    argumentos.add_argument('--aquecimento', type=int, default=1, help="execuções descartadas antes das medições")
+    argumentos.add_argument('--filtro', help="mede só os programas com este trecho no nome")
+    argumentos.add_argument('--salvar', metavar='ARQUIVO', help="grava os resultados em JSON")
+    argumentos.add_argument('--comparar', nargs='+', metavar='ARQUIVO',
+                            help="compara com um resultado salvo; com dois arquivos, não executa a suíte")
+    argumentos.add_argument('--limite', type=float, default=10.0,
+                            help="aumento da mediana, em %%, a partir do qual uma fase é regressão")
+    opcoes = argumentos.parse_args()
+
+    if opcoes.comparar and len(opcoes.comparar) > 2:
+        argumentos.error("--comparar aceita um ou dois arquivos")
+    base = ler_resultados(opcoes.comparar[0]) if opcoes.comparar else None
+
+    if opcoes.comparar and len(opcoes.comparar) == 2:
+        novo = ler_resultados(opcoes.comparar[1])
+    else:
+        programas = carregar_programas(opcoes.filtro)
+        print(cabecalho())
+        novo = {
+            'versao': VERSAO_RESULTADOS,
+            'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'repeticoes': opcoes.repeticoes,
+            'aquecimento': opcoes.aquecimento,
+            'resultados': executar_suite(programas, opcoes.motor or MOTORES, opcoes.repeticoes,
+                                         opcoes.aquecimento),
+        }
+        if opcoes.salvar:
+            with open(opcoes.salvar, 'w', encoding='utf-8') as arquivo:
+                json.dump(novo, arquivo, ensure_ascii=False, indent=2)
+
+    if base is not None:
+        print()
+        regressoes = comparar(base, novo, opcoes.limite)
+        if regressoes:
+            print(f"\n{len(regressoes)} regressões acima de {opcoes.limite:.0f}%")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
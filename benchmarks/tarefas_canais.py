@@ -0,0 +1,81 @@
+# Benchmark de tarefas 'vá' e canais
+#
+# Monta um pipeline de três tarefas (gerar -> quadrado -> somar) ligadas por
+# canais e o compara com o mesmo cálculo em um único laço. Com buffer, cada
+# troca de tarefa processa vários valores; sem buffer, cada valor passa de
+# uma tarefa à outra. Só o motor 'vm' tem tarefas.
+#
+# Uso: python benchmarks/tarefas_canais.py [quantidade]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tupa_interpreter import Interpretador, Lexer, Parser
+
+PIPELINE = """
+função gerar(saida)
+    para i de 1 até quantidade fazer
+        saida.enviar(i)
+    fim
+    saida.fechar()
+fim
+
+função quadrado(entrada, saida)
+    para x em entrada fazer
+        saida.enviar(x * x)
+    fim
+    saida.fechar()
+fim
+
+função somar(entrada, resultado)
+    criar total = 0
+    para x em entrada fazer
+        total = total + x
+    fim
+    resultado.enviar(total)
+fim
+
+criar numeros = canal(capacidade)
+criar quadrados = canal(capacidade)
+criar canal resultado
+vá gerar(numeros)
+vá quadrado(numeros, quadrados)
+vá somar(quadrados, resultado)
+criar total = resultado.receber()
+"""
+
+SEQUENCIAL = """
+criar total = 0
+para i de 1 até quantidade fazer
+    total = total + i * i
+fim
+"""
+
+def executar(codigo, quantidade, capacidade=0):
+    """Executa o programa e devolve (segundos, total)"""
+    arvore = Parser(Lexer(codigo).iter_tokens()).analisar()
+    interpretador = Interpretador('vm')
+    interpretador.definir('quantidade', quantidade)
+    interpretador.definir('capacidade', capacidade)
+
+    inicio = time.perf_counter()
+    interpretador.interpretar(arvore)
+    return time.perf_counter() - inicio, interpretador.obter('total')
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    base, esperado = executar(SEQUENCIAL, quantidade)
+    print(f"{'versão':<22} {'tempo':>9} {'valores/s':>11}")
+    print(f"{'laço único':<22} {base:>8.3f}s {quantidade / base:>11.0f}")
+    for capacidade in (0, 1, 16, 256):
+        segundos, total = executar(PIPELINE, quantidade, capacidade)
+        if total != esperado:
+            raise SystemExit(f"Resultado diferente com capacidade {capacidade}: {total} != {esperado}")
+        print(f"{f'pipeline, buffer {capacidade}':<22} {segundos:>8.3f}s {quantidade / segundos:>11.0f}")
+
+if __name__ == '__main__':
+    main()
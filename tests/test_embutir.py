@@ -0,0 +1,38 @@
+# Testes da API de embutir (Interpretador.executar_fonte)
+#
+# Uso: python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tupa_interpreter import MOTORES, ErroTupa, Interpretador
+
+class TestExecutarFonte(unittest.TestCase):
+    def test_erro_de_execucao_vira_erro_tupa_com_a_saida_anterior(self):
+        for motor in MOTORES:
+            for codigo in ('mostrar "antes"\nmostrar 1 / 0', 'mostrar "antes"\nmostrar "a" + 1'):
+                with self.subTest(motor=motor, codigo=codigo):
+                    interpretador = Interpretador(motor)
+                    with self.assertRaises(ErroTupa) as contexto:
+                        interpretador.executar_fonte(codigo)
+                    self.assertEqual(contexto.exception.saida, "antes\n")
+                    # O interpretador continua utilizável depois do erro
+                    self.assertEqual(interpretador.executar_fonte("mostrar 1 + 1").saida, "2\n")
+
+    def test_caches_em_linha_nao_acumulam_entre_trechos(self):
+        codigo = ("classe Ponto\n    criar x = 1\n    função valor()\n        devolver self.x\n    fim\nfim\n"
+                  "criar p = Ponto()\nmostrar p.x + p.valor()")
+        for motor in MOTORES:
+            with self.subTest(motor=motor):
+                interpretador = Interpretador(motor)
+                for _ in range(50):
+                    self.assertEqual(interpretador.executar_fonte(codigo).saida, "2\n")
+                self.assertEqual(interpretador.caches, [])
+                # Os métodos definidos no trecho continuam funcionando
+                self.assertEqual(interpretador.executar_fonte("mostrar p.valor()").saida, "1\n")
+
+if __name__ == '__main__':
+    unittest.main()
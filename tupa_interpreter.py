@@ -1,10 +1,18 @@
 # Interpretador para a Linguagem Tupã
 # Baseado em português brasileiro para facilitar o aprendizado de programação
 
-import re
+# Só o necessário para importar o interpretador rapidamente: re, hashlib,
+# pickle, json e argparse são importados quando usados pela primeira vez
+import io
+import os
 import sys
 import math
-from typing import Dict, List, Any, Callable, Optional, Union
+import operator
+import functools
+from array import array
+from collections import deque
+from functools import reduce
+from types import FunctionType, MethodType
 
 class ErroTupa(Exception):
     """Classe para representar erros na linguagem Tupã"""
@@ -14,6 +22,8 @@ class ErroTupa(Exception):
 
 class Token:
     """Representa um token na linguagem Tupã"""
+    __slots__ = ('tipo', 'valor', 'linha', 'coluna')
+
     def __init__(self, tipo, valor, linha, coluna):
         self.tipo = tipo
         self.valor = valor
@@ -23,244 +33,536 @@ class Token:
     def __repr__(self):
         return f"Token({self.tipo}, {self.valor}, linha={self.linha}, coluna={self.coluna})"
 
+# Definição de palavras-chave
+PALAVRAS_CHAVE = {
+    'criar': 'CRIAR',
+    'mostrar': 'MOSTRAR',
+    'pegar': 'PEGAR',
+    'se': 'SE',
+    'então': 'ENTAO',
+    'senão': 'SENAO',
+    'fim': 'FIM',
+    'enquanto': 'ENQUANTO',
+    'fazer': 'FAZER',
+    'para': 'PARA',
+    'de': 'DE',
+    'até': 'ATE',
+    'em': 'EM',
+    'função': 'FUNCAO',
+    'devolver': 'DEVOLVER',
+    'classe': 'CLASSE',
+    'tentar': 'TENTAR',
+    'pegar': 'PEGAR_ERRO',
+    'erro': 'ERRO',
+    'usar': 'USAR',
+    'vá': 'VA',
+    'lista': 'LISTA',
+    'dicionário': 'DICIONARIO',
+    'verdadeiro': 'BOOLEANO',
+    'falso': 'BOOLEANO',
+    'e': 'E',
+    'ou': 'OU',
+    'não': 'NAO'
+}
+
+# Símbolos de um ou dois caracteres e seus tipos de token
+SIMBOLOS = {
+    '==': 'IGUAL',
+    '!=': 'DIFERENTE',
+    '>=': 'MAIOR_IGUAL',
+    '<=': 'MENOR_IGUAL',
+    '+': 'MAIS',
+    '-': 'MENOS',
+    '*': 'MULTIPLICACAO',
+    '/': 'DIVISAO',
+    '=': 'ATRIBUICAO',
+    '>': 'MAIOR',
+    '<': 'MENOR',
+    '(': 'PARENTESE_ESQUERDO',
+    ')': 'PARENTESE_DIREITO',
+    '[': 'COLCHETE_ESQUERDO',
+    ']': 'COLCHETE_DIREITO',
+    '{': 'CHAVE_ESQUERDA',
+    '}': 'CHAVE_DIREITA',
+    ',': 'VIRGULA',
+    '.': 'PONTO',
+    ':': 'DOIS_PONTOS'
+}
+
+# Expressão regular mestre: espaços (exceto quebras de linha) são absorvidos
+# antes de cada token e a última alternativa captura qualquer outro caractere,
+# de modo que as correspondências de finditer cobrem o código sem lacunas.
+# A ordem importa: '//' é comentário antes de ser divisão e '-' seguido de
+# dígito é um número negativo. Compilada no primeiro uso, por padrao_tokens().
+EXPRESSAO_TOKENS = r"""[^\S\n]*(?:
+    (?P<nome>[^\W\d]\w*)
+  | (?P<simbolo>[=!<>]=|-(?!\d)|/(?!/)|[+*=<>()\[\]{},.:])
+  | (?P<numero>-?\d+(?:\.\d*)?)
+  | (?P<quebra>\n|//[^\n]*)
+  | (?P<texto>"[^"]*"|'[^']*')
+  | (?P<outro>\S)
+)"""
+PADRAO_TOKENS = None
+
+def padrao_tokens():
+    """Expressão regular mestre compilada, criada uma vez por processo"""
+    global PADRAO_TOKENS
+    if PADRAO_TOKENS is None:
+        import re
+        PADRAO_TOKENS = re.compile(EXPRESSAO_TOKENS, re.VERBOSE | re.DOTALL)
+    return PADRAO_TOKENS
+
 class Lexer:
     """Analisador léxico para a linguagem Tupã"""
     def __init__(self, codigo):
         self.codigo = codigo
-        self.posicao = 0
-        self.linha = 1
-        self.coluna = 1
         self.tokens = []
-        
-        # Definição de palavras-chave
-        self.palavras_chave = {
-            'criar': 'CRIAR',
-            'mostrar': 'MOSTRAR',
-            'pegar': 'PEGAR',
-            'se': 'SE',
-            'então': 'ENTAO',
-            'senão': 'SENAO',
-            'fim': 'FIM',
-            'enquanto': 'ENQUANTO',
-            'fazer': 'FAZER',
-            'para': 'PARA',
-            'de': 'DE',
-            'até': 'ATE',
-            'em': 'EM',
-            'função': 'FUNCAO',
-            'devolver': 'DEVOLVER',
-            'classe': 'CLASSE',
-            'tentar': 'TENTAR',
-            'pegar': 'PEGAR_ERRO',
-            'erro': 'ERRO',
-            'usar': 'USAR',
-            'lista': 'LISTA',
-            'dicionário': 'DICIONARIO',
-            'verdadeiro': 'BOOLEANO',
-            'falso': 'BOOLEANO',
-            'e': 'E',
-            'ou': 'OU',
-            'não': 'NAO'
-        }
+        self.palavras_chave = PALAVRAS_CHAVE
 
-    def avancar(self):
-        """Avança para o próximo caractere"""
-        self.posicao += 1
-        self.coluna += 1
-        if self.posicao < len(self.codigo) and self.codigo[self.posicao - 1] == '\n':
-            self.linha += 1
-            self.coluna = 1
-
-    def caractere_atual(self):
-        """Retorna o caractere atual"""
-        if self.posicao >= len(self.codigo):
-            return None
-        return self.codigo[self.posicao]
+    def posicao_final(self):
+        """Linha e coluna atribuídas ao fim do código"""
+        codigo = self.codigo
+        if not codigo:
+            return 1, 1
+        # Uma quebra de linha no último caractere não inicia uma nova linha
+        ultimo = len(codigo) - 1
+        return codigo.count('\n', 0, ultimo) + 1, len(codigo) - codigo.rfind('\n', 0, ultimo)
 
-    def pular_espacos(self):
-        """Pula espaços em branco"""
-        while self.caractere_atual() is not None and self.caractere_atual().isspace():
-            self.avancar()
+    def iter_tokens(self):
+        """Gera os tokens do código um a um, terminando com EOF"""
+        codigo = self.codigo
+        palavras_chave = self.palavras_chave
+        simbolos = SIMBOLOS
+        linha = 1
+        inicio_linha = 0
 
-    def pular_comentarios(self):
-        """Pula comentários (// até o final da linha)"""
-        if self.caractere_atual() == '/' and self.posicao + 1 < len(self.codigo) and self.codigo[self.posicao + 1] == '/':
-            while self.caractere_atual() is not None and self.caractere_atual() != '\n':
-                self.avancar()
+        for correspondencia in (PADRAO_TOKENS or padrao_tokens()).finditer(codigo):
+            grupo = correspondencia.lastgroup
+            valor = correspondencia.group(grupo)
+            inicio = correspondencia.start(grupo)
 
-    def identificar_numero(self):
-        """Identifica um número (inteiro ou decimal)"""
-        inicio_coluna = self.coluna
-        inicio = self.posicao
-        
-        # Verifica se é um número negativo
-        if self.caractere_atual() == '-':
-            self.avancar()
-        
-        # Processa os dígitos antes do ponto decimal
-        while self.caractere_atual() is not None and self.caractere_atual().isdigit():
-            self.avancar()
-        
-        # Verifica se há um ponto decimal
-        if self.caractere_atual() == '.':
-            self.avancar()
-            
-            # Processa os dígitos após o ponto decimal
-            while self.caractere_atual() is not None and self.caractere_atual().isdigit():
-                self.avancar()
-        
-        valor = self.codigo[inicio:self.posicao]
-        try:
-            if '.' in valor:
-                return Token('NUMERO', float(valor), self.linha, inicio_coluna)
+            if grupo == 'nome':
+                tipo = palavras_chave.get(valor, 'IDENTIFICADOR')
+                if tipo == 'BOOLEANO':
+                    valor = valor == 'verdadeiro'
+                yield Token(tipo, valor, linha, inicio - inicio_linha + 1)
+            elif grupo == 'simbolo':
+                yield Token(simbolos[valor], valor, linha, inicio - inicio_linha + 1)
+            elif grupo == 'numero':
+                yield Token('NUMERO', float(valor) if '.' in valor else int(valor), linha, inicio - inicio_linha + 1)
+            elif grupo == 'quebra':
+                # Comentários vão até o fim da linha; a quebra é tratada separadamente
+                if valor == '\n':
+                    linha += 1
+                    inicio_linha = inicio + 1
+            elif grupo == 'texto':
+                coluna = inicio - inicio_linha + 1
+                quebras = valor.count('\n')
+                if quebras:
+                    # A posição do token usa a linha em que a string termina
+                    linha += quebras
+                    inicio_linha = inicio + valor.rfind('\n') + 1
+                yield Token('STRING', valor[1:-1], linha, coluna)
+            elif valor in '"\'':
+                raise ErroTupa(f"String não fechada na linha {self.posicao_final()[0]}, coluna {inicio - inicio_linha + 1}")
             else:
-                return Token('NUMERO', int(valor), self.linha, inicio_coluna)
-        except ValueError:
-            raise ErroTupa(f"Número inválido: {valor} na linha {self.linha}, coluna {inicio_coluna}")
-
-    def identificar_string(self):
-        """Identifica uma string (entre aspas)"""
-        inicio_coluna = self.coluna
-        delimitador = self.caractere_atual()  # " ou '
-        self.avancar()  # Pula a aspas inicial
-        inicio = self.posicao
-        
-        while self.caractere_atual() is not None and self.caractere_atual() != delimitador:
-            self.avancar()
-        
-        if self.caractere_atual() is None:
-            raise ErroTupa(f"String não fechada na linha {self.linha}, coluna {inicio_coluna}")
-        
-        valor = self.codigo[inicio:self.posicao]
-        self.avancar()  # Pula a aspas final
-        return Token('STRING', valor, self.linha, inicio_coluna)
+                raise ErroTupa(f"Caractere inesperado: {valor} na linha {linha}, coluna {inicio - inicio_linha + 1}")
 
-    def identificar_identificador(self):
-        """Identifica um identificador ou palavra-chave"""
-        inicio_coluna = self.coluna
-        inicio = self.posicao
-        
-        while (self.caractere_atual() is not None and 
-               (self.caractere_atual().isalnum() or self.caractere_atual() == '_' or 
-                self.caractere_atual() in 'áàâãéèêíìîóòôõúùûçÁÀÂÃÉÈÊÍÌÎÓÒÔÕÚÙÛÇ')):
-            self.avancar()
-        
-        valor = self.codigo[inicio:self.posicao]
-        tipo = self.palavras_chave.get(valor, 'IDENTIFICADOR')
-        
-        if tipo == 'BOOLEANO':
-            valor = True if valor == 'verdadeiro' else False
-            
-        return Token(tipo, valor, self.linha, inicio_coluna)
+        linha, coluna = self.posicao_final()
+        yield Token('EOF', None, linha, coluna)
 
     def tokenizar(self):
         """Converte o código em uma lista de tokens"""
-        while self.posicao < len(self.codigo):
-            # Pula espaços em branco e comentários
-            self.pular_espacos()
-            self.pular_comentarios()
-            
-            if self.posicao >= len(self.codigo):
-                break
-            
-            caractere = self.caractere_atual()
-            
-            if caractere is None:
-                break
-            elif caractere.isdigit() or (caractere == '-' and self.posicao + 1 < len(self.codigo) and self.codigo[self.posicao + 1].isdigit()):
-                self.tokens.append(self.identificar_numero())
-            elif caractere == '"' or caractere == "'":
-                self.tokens.append(self.identificar_string())
-            elif caractere.isalpha() or caractere == '_':
-                self.tokens.append(self.identificar_identificador())
-            elif caractere == '+':
-                self.tokens.append(Token('MAIS', '+', self.linha, self.coluna))
-                self.avancar()
-            elif caractere == '-':
-                self.tokens.append(Token('MENOS', '-', self.linha, self.coluna))
-                self.avancar()
-            elif caractere == '*':
-                self.tokens.append(Token('MULTIPLICACAO', '*', self.linha, self.coluna))
-                self.avancar()
-            elif caractere == '/':
-                self.tokens.append(Token('DIVISAO', '/', self.linha, self.coluna))
-                self.avancar()
-            elif caractere == '=':
-                if self.posicao + 1 < len(self.codigo) and self.codigo[self.posicao + 1] == '=':
-                    self.tokens.append(Token('IGUAL', '==', self.linha, self.coluna))
-                    self.avancar()
-                    self.avancar()
-                else:
-                    self.tokens.append(Token('ATRIBUICAO', '=', self.linha, self.coluna))
-                    self.avancar()
-            elif caractere == '!':
-                if self.posicao + 1 < len(self.codigo) and self.codigo[self.posicao + 1] == '=':
-                    self.tokens.append(Token('DIFERENTE', '!=', self.linha, self.coluna))
-                    self.avancar()
-                    self.avancar()
-                else:
-                    raise ErroTupa(f"Caractere inesperado: ! na linha {self.linha}, coluna {self.coluna}")
-            elif caractere == '>':
-                if self.posicao + 1 < len(self.codigo) and self.codigo[self.posicao + 1] == '=':
-                    self.tokens.append(Token('MAIOR_IGUAL', '>=', self.linha, self.coluna))
-                    self.avancar()
-                    self.avancar()
-                else:
-                    self.tokens.append(Token('MAIOR', '>', self.linha, self.coluna))
-                    self.avancar()
-            elif caractere == '<':
-                if self.posicao + 1 < len(self.codigo) and self.codigo[self.posicao + 1] == '=':
-                    self.tokens.append(Token('MENOR_IGUAL', '<=', self.linha, self.coluna))
-                    self.avancar()
-                    self.avancar()
-                else:
-                    self.tokens.append(Token('MENOR', '<', self.linha, self.coluna))
-                    self.avancar()
-            elif caractere == '(':
-                self.tokens.append(Token('PARENTESE_ESQUERDO', '(', self.linha, self.coluna))
-                self.avancar()
-            elif caractere == ')':
-                self.tokens.append(Token('PARENTESE_DIREITO', ')', self.linha, self.coluna))
-                self.avancar()
-            elif caractere == '[':
-                self.tokens.append(Token('COLCHETE_ESQUERDO', '[', self.linha, self.coluna))
-                self.avancar()
-            elif caractere == ']':
-                self.tokens.append(Token('COLCHETE_DIREITO', ']', self.linha, self.coluna))
-                self.avancar()
-            elif caractere == '{':
-                self.tokens.append(Token('CHAVE_ESQUERDA', '{', self.linha, self.coluna))
-                self.avancar()
-            elif caractere == '}':
-                self.tokens.append(Token('CHAVE_DIREITA', '}', self.linha, self.coluna))
-                self.avancar()
-            elif caractere == ',':
-                self.tokens.append(Token('VIRGULA', ',', self.linha, self.coluna))
-                self.avancar()
-            elif caractere == '.':
-                self.tokens.append(Token('PONTO', '.', self.linha, self.coluna))
-                self.avancar()
-            elif caractere == ':':
-                self.tokens.append(Token('DOIS_PONTOS', ':', self.linha, self.coluna))
-                self.avancar()
-            else:
-                raise ErroTupa(f"Caractere inesperado: {caractere} na linha {self.linha}, coluna {self.coluna}")
-        
-        self.tokens.append(Token('EOF', None, self.linha, self.coluna))
+        self.tokens = list(self.iter_tokens())
         return self.tokens
 
+# Nós da árvore sintática
+#
+# Cada tipo de nó é uma classe com __slots__, o que evita um dicionário por nó.
+# O atributo de classe 'especie' é um inteiro usado no despacho pelos motores
+# de execução; 'tipo' guarda o nome da classe, como nas versões em dicionário.
+# 'campos' lista os atributos sintáticos, na ordem do construtor; os demais
+# slots (como 'endereco') são preenchidos pelo Resolvedor ou, como 'cache',
+# pelos motores de execução. O Parser preenche 'linha' e 'coluna' das
+# declarações com a posição do primeiro token e as das chamadas com a do '(';
+# nos demais nós elas ficam vazias.
+
+NO_PROGRAMA = 0
+NO_DECLARACAO_VARIAVEL = 1
+NO_DECLARACAO_MOSTRAR = 2
+NO_DECLARACAO_PEGAR = 3
+NO_DECLARACAO_SE = 4
+NO_DECLARACAO_ENQUANTO = 5
+NO_DECLARACAO_PARA = 6
+NO_DECLARACAO_PARA_CADA = 7
+NO_DECLARACAO_FUNCAO = 8
+NO_DECLARACAO_DEVOLVER = 9
+NO_DECLARACAO_CLASSE = 10
+NO_DECLARACAO_TENTAR = 11
+NO_DECLARACAO_USAR = 12
+NO_EXPRESSAO_DECLARACAO = 13
+NO_ATRIBUICAO_EXPRESSAO = 14
+NO_ATRIBUICAO_INDEXACAO = 15
+NO_ATRIBUICAO_ATRIBUTO = 16
+NO_LOGICA_EXPRESSAO = 17
+NO_BINARIA_EXPRESSAO = 18
+NO_UNARIA_EXPRESSAO = 19
+NO_CHAMADA_EXPRESSAO = 20
+NO_INDEXACAO_EXPRESSAO = 21
+NO_ATRIBUTO_EXPRESSAO = 22
+NO_LITERAL_EXPRESSAO = 23
+NO_VARIAVEL_EXPRESSAO = 24
+NO_AGRUPAR_EXPRESSAO = 25
+NO_LISTA_EXPRESSAO = 26
+NO_DICIONARIO_EXPRESSAO = 27
+NO_DECLARACAO_VA = 28
+
+class No:
+    """Classe base dos nós da árvore sintática"""
+    __slots__ = ('linha', 'coluna')
+    especie = None
+    campos = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.tipo = cls.__name__
+
+    def filhos(self):
+        """Itera sobre os nós filhos diretos"""
+        for campo in self.campos:
+            valor = getattr(self, campo)
+            if isinstance(valor, No):
+                yield valor
+            elif isinstance(valor, list):
+                for item in valor:
+                    if isinstance(item, No):
+                        yield item
+                    elif isinstance(item, tuple):
+                        # Pares chave/valor de um DicionarioExpressao
+                        yield from item
+
+    def to_dict(self):
+        """Representação em dicionários aninhados, no formato antigo da árvore"""
+        def converter(valor):
+            if isinstance(valor, No):
+                return valor.to_dict()
+            if isinstance(valor, list):
+                return [converter(item) for item in valor]
+            if isinstance(valor, tuple):
+                return {'chave': converter(valor[0]), 'valor': converter(valor[1])}
+            return valor
+
+        resultado = {'tipo': self.tipo}
+        for campo in self.campos:
+            resultado[campo] = converter(getattr(self, campo))
+        return resultado
+
+    def __repr__(self):
+        argumentos = ', '.join(f"{campo}={getattr(self, campo)!r}" for campo in self.campos)
+        return f"{self.tipo}({argumentos})"
+
+    def __reduce__(self):
+        # Serializado pelos campos, recriado pelo construtor: as anotações do
+        # Resolvedor não vão para o cache em disco, mas a posição vai
+        argumentos = tuple(getattr(self, campo) for campo in self.campos)
+        linha = getattr(self, 'linha', None)
+        if linha is None:
+            return (type(self), argumentos)
+        return (type(self), argumentos, (None, {'linha': linha, 'coluna': self.coluna}))
+
+class Programa(No):
+    __slots__ = ('instrucoes',)
+    especie = NO_PROGRAMA
+    campos = ('instrucoes',)
+
+    def __init__(self, instrucoes):
+        self.instrucoes = instrucoes
+
+class DeclaracaoVariavel(No):
+    __slots__ = ('nome', 'valor', 'tipo_dado', 'endereco')
+    especie = NO_DECLARACAO_VARIAVEL
+    campos = ('nome', 'valor', 'tipo_dado')
+
+    def __init__(self, nome, valor, tipo_dado):
+        self.nome = nome
+        self.valor = valor
+        self.tipo_dado = tipo_dado
+        self.endereco = None
+
+class DeclaracaoMostrar(No):
+    __slots__ = ('expressao',)
+    especie = NO_DECLARACAO_MOSTRAR
+    campos = ('expressao',)
+
+    def __init__(self, expressao):
+        self.expressao = expressao
+
+class DeclaracaoPegar(No):
+    __slots__ = ('nome', 'endereco')
+    especie = NO_DECLARACAO_PEGAR
+    campos = ('nome',)
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.endereco = None
+
+class DeclaracaoSe(No):
+    __slots__ = ('condicao', 'bloco_entao', 'bloco_senao')
+    especie = NO_DECLARACAO_SE
+    campos = ('condicao', 'bloco_entao', 'bloco_senao')
+
+    def __init__(self, condicao, bloco_entao, bloco_senao):
+        self.condicao = condicao
+        self.bloco_entao = bloco_entao
+        self.bloco_senao = bloco_senao
+
+class DeclaracaoEnquanto(No):
+    __slots__ = ('condicao', 'corpo')
+    especie = NO_DECLARACAO_ENQUANTO
+    campos = ('condicao', 'corpo')
+
+    def __init__(self, condicao, corpo):
+        self.condicao = condicao
+        self.corpo = corpo
+
+class DeclaracaoPara(No):
+    __slots__ = ('variavel', 'inicio', 'fim', 'passo', 'corpo', 'endereco', 'contador_fixo')
+    especie = NO_DECLARACAO_PARA
+    campos = ('variavel', 'inicio', 'fim', 'passo', 'corpo')
+
+    def __init__(self, variavel, inicio, fim, passo, corpo):
+        self.variavel = variavel
+        self.inicio = inicio
+        self.fim = fim
+        # None quando o laço não tem 'passo' (o incremento é 1)
+        self.passo = passo
+        self.corpo = corpo
+        self.endereco = None
+        # Verdadeiro quando o corpo nunca atribui à variável do laço
+        self.contador_fixo = False
+
+class DeclaracaoParaCada(No):
+    __slots__ = ('variavel', 'colecao', 'corpo', 'endereco')
+    especie = NO_DECLARACAO_PARA_CADA
+    campos = ('variavel', 'colecao', 'corpo')
+
+    def __init__(self, variavel, colecao, corpo):
+        self.variavel = variavel
+        self.colecao = colecao
+        self.corpo = corpo
+        self.endereco = None
+
+class DeclaracaoFuncao(No):
+    __slots__ = ('nome', 'parametros', 'corpo', 'endereco', 'nomes_locais')
+    especie = NO_DECLARACAO_FUNCAO
+    campos = ('nome', 'parametros', 'corpo')
+
+    def __init__(self, nome, parametros, corpo):
+        self.nome = nome
+        self.parametros = parametros
+        self.corpo = corpo
+        self.endereco = None
+        self.nomes_locais = None
+
+class DeclaracaoDevolver(No):
+    __slots__ = ('valor',)
+    especie = NO_DECLARACAO_DEVOLVER
+    campos = ('valor',)
+
+    def __init__(self, valor):
+        self.valor = valor
+
+class DeclaracaoClasse(No):
+    __slots__ = ('nome', 'metodos', 'atributos', 'endereco')
+    especie = NO_DECLARACAO_CLASSE
+    campos = ('nome', 'metodos', 'atributos')
+
+    def __init__(self, nome, metodos, atributos):
+        self.nome = nome
+        self.metodos = metodos
+        self.atributos = atributos
+        self.endereco = None
+
+class DeclaracaoTentar(No):
+    __slots__ = ('bloco_tentar', 'nome_erro', 'bloco_pegar', 'endereco')
+    especie = NO_DECLARACAO_TENTAR
+    campos = ('bloco_tentar', 'nome_erro', 'bloco_pegar')
+
+    def __init__(self, bloco_tentar, nome_erro, bloco_pegar):
+        self.bloco_tentar = bloco_tentar
+        self.nome_erro = nome_erro
+        self.bloco_pegar = bloco_pegar
+        self.endereco = None
+
+class DeclaracaoUsar(No):
+    __slots__ = ('nome', 'membros')
+    especie = NO_DECLARACAO_USAR
+    campos = ('nome', 'membros')
+
+    def __init__(self, nome, membros=None):
+        self.nome = nome
+        # Nomes de 'usar nome com a, b', ou None para importar todos os membros
+        self.membros = membros
+
+class DeclaracaoVa(No):
+    __slots__ = ('chamada',)
+    especie = NO_DECLARACAO_VA
+    campos = ('chamada',)
+
+    def __init__(self, chamada):
+        # Uma ChamadaExpressao, executada em uma nova tarefa
+        self.chamada = chamada
+
+class ExpressaoDeclaracao(No):
+    __slots__ = ('expressao',)
+    especie = NO_EXPRESSAO_DECLARACAO
+    campos = ('expressao',)
+
+    def __init__(self, expressao):
+        self.expressao = expressao
+
+class AtribuicaoExpressao(No):
+    __slots__ = ('nome', 'valor', 'endereco')
+    especie = NO_ATRIBUICAO_EXPRESSAO
+    campos = ('nome', 'valor')
+
+    def __init__(self, nome, valor):
+        self.nome = nome
+        self.valor = valor
+        self.endereco = None
+
+class AtribuicaoIndexacao(No):
+    __slots__ = ('objeto', 'indice', 'valor')
+    especie = NO_ATRIBUICAO_INDEXACAO
+    campos = ('objeto', 'indice', 'valor')
+
+    def __init__(self, objeto, indice, valor):
+        self.objeto = objeto
+        self.indice = indice
+        self.valor = valor
+
+class AtribuicaoAtributo(No):
+    __slots__ = ('objeto', 'nome', 'valor')
+    especie = NO_ATRIBUICAO_ATRIBUTO
+    campos = ('objeto', 'nome', 'valor')
+
+    def __init__(self, objeto, nome, valor):
+        self.objeto = objeto
+        self.nome = nome
+        self.valor = valor
+
+class LogicaExpressao(No):
+    __slots__ = ('operador', 'esquerda', 'direita')
+    especie = NO_LOGICA_EXPRESSAO
+    campos = ('operador', 'esquerda', 'direita')
+
+    def __init__(self, operador, esquerda, direita):
+        self.operador = operador
+        self.esquerda = esquerda
+        self.direita = direita
+
+class BinariaExpressao(No):
+    __slots__ = ('operador', 'esquerda', 'direita')
+    especie = NO_BINARIA_EXPRESSAO
+    campos = ('operador', 'esquerda', 'direita')
+
+    def __init__(self, operador, esquerda, direita):
+        self.operador = operador
+        self.esquerda = esquerda
+        self.direita = direita
+
+class UnariaExpressao(No):
+    __slots__ = ('operador', 'direita')
+    especie = NO_UNARIA_EXPRESSAO
+    campos = ('operador', 'direita')
+
+    def __init__(self, operador, direita):
+        self.operador = operador
+        self.direita = direita
+
+class ChamadaExpressao(No):
+    __slots__ = ('funcao', 'argumentos')
+    especie = NO_CHAMADA_EXPRESSAO
+    campos = ('funcao', 'argumentos')
+
+    def __init__(self, funcao, argumentos):
+        self.funcao = funcao
+        self.argumentos = argumentos
+
+class IndexacaoExpressao(No):
+    __slots__ = ('objeto', 'indice')
+    especie = NO_INDEXACAO_EXPRESSAO
+    campos = ('objeto', 'indice')
+
+    def __init__(self, objeto, indice):
+        self.objeto = objeto
+        self.indice = indice
+
+class AtributoExpressao(No):
+    __slots__ = ('objeto', 'nome', 'cache')
+    especie = NO_ATRIBUTO_EXPRESSAO
+    campos = ('objeto', 'nome')
+
+    def __init__(self, objeto, nome):
+        self.objeto = objeto
+        self.nome = nome
+        self.cache = None
+
+class LiteralExpressao(No):
+    __slots__ = ('valor',)
+    especie = NO_LITERAL_EXPRESSAO
+    campos = ('valor',)
+
+    def __init__(self, valor):
+        self.valor = valor
+
+class VariavelExpressao(No):
+    __slots__ = ('nome', 'endereco')
+    especie = NO_VARIAVEL_EXPRESSAO
+    campos = ('nome',)
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.endereco = None
+
+class AgruparExpressao(No):
+    __slots__ = ('expressao',)
+    especie = NO_AGRUPAR_EXPRESSAO
+    campos = ('expressao',)
+
+    def __init__(self, expressao):
+        self.expressao = expressao
+
+class ListaExpressao(No):
+    __slots__ = ('elementos',)
+    especie = NO_LISTA_EXPRESSAO
+    campos = ('elementos',)
+
+    def __init__(self, elementos):
+        self.elementos = elementos
+
+class DicionarioExpressao(No):
+    """Os pares são tuplas (chave, valor) de nós"""
+    __slots__ = ('pares',)
+    especie = NO_DICIONARIO_EXPRESSAO
+    campos = ('pares',)
+
+    def __init__(self, pares):
+        self.pares = pares
+
 class Parser:
     """Analisador sintático para a linguagem Tupã"""
     def __init__(self, tokens):
-        self.tokens = tokens
-        self.posicao = 0
-        self.token_atual = self.tokens[0]
+        # Aceita uma lista de tokens ou um gerador como Lexer.iter_tokens()
+        self.tokens = iter(tokens)
+        self.token_anterior = None
+        self.token_atual = next(self.tokens)
 
     def avancar(self):
         """Avança para o próximo token"""
-        self.posicao += 1
-        if self.posicao < len(self.tokens):
-            self.token_atual = self.tokens[self.posicao]
+        if self.token_atual.tipo != 'EOF':
+            self.token_anterior = self.token_atual
+            self.token_atual = next(self.tokens)
         return self.token_atual
 
     def consumir(self, tipo):
@@ -283,37 +585,47 @@ class Parser:
         while self.token_atual.tipo != 'EOF':
             instrucoes.append(self.declaracao())
         
-        return {
-            'tipo': 'Programa',
-            'instrucoes': instrucoes
-        }
+        return Programa(instrucoes)
 
     def declaracao(self):
         """Analisa uma declaração"""
+        token = self.token_atual
         if self.token_atual.tipo == 'CRIAR':
-            return self.declaracao_variavel()
+            no = self.declaracao_variavel()
         elif self.token_atual.tipo == 'MOSTRAR':
-            return self.declaracao_mostrar()
-        elif self.token_atual.tipo == 'PEGAR':
-            return self.declaracao_pegar()
+            no = self.declaracao_mostrar()
+        elif self.token_atual.tipo in ('PEGAR', 'PEGAR_ERRO'):
+            # O lexer dá a 'pegar' o tipo do 'pegar' de 'tentar'; fora do bloco
+            # protegido de um 'tentar', que para nele, é a leitura de entrada
+            no = self.declaracao_pegar()
         elif self.token_atual.tipo == 'SE':
-            return self.declaracao_se()
+            no = self.declaracao_se()
         elif self.token_atual.tipo == 'ENQUANTO':
-            return self.declaracao_enquanto()
+            no = self.declaracao_enquanto()
         elif self.token_atual.tipo == 'PARA':
-            return self.declaracao_para()
+            no = self.declaracao_para()
         elif self.token_atual.tipo == 'FUNCAO':
-            return self.declaracao_funcao()
+            no = self.declaracao_funcao()
         elif self.token_atual.tipo == 'DEVOLVER':
-            return self.declaracao_devolver()
+            no = self.declaracao_devolver()
         elif self.token_atual.tipo == 'CLASSE':
-            return self.declaracao_classe()
+            no = self.declaracao_classe()
         elif self.token_atual.tipo == 'TENTAR':
-            return self.declaracao_tentar()
+            no = self.declaracao_tentar()
         elif self.token_atual.tipo == 'USAR':
-            return self.declaracao_usar()
+            no = self.declaracao_usar()
+        elif self.token_atual.tipo == 'VA':
+            no = self.declaracao_va()
         else:
-            return self.expressao_declaracao()
+            no = self.expressao_declaracao()
+        
+        return self.posicionar(no, token)
+
+    def posicionar(self, no, token):
+        """Marca o nó com a posição do token onde ele começa"""
+        no.linha = token.linha
+        no.coluna = token.coluna
+        return no
 
     def declaracao_variavel(self):
         """Analisa uma declaração de variável"""
@@ -329,35 +641,38 @@ class Parser:
             self.avancar()
         
         nome = self.consumir('IDENTIFICADOR').valor
+        
+        # 'vetor' e 'canal' só são palavras reservadas nesta posição, seguidos
+        # do nome da variável; em outros lugares continuam nomes comuns
+        if tipo is None and nome in ('vetor', 'canal') and self.token_atual.tipo == 'IDENTIFICADOR':
+            tipo = nome
+            nome = self.consumir('IDENTIFICADOR').valor
+            if tipo == 'canal' and self.token_atual.tipo != 'ATRIBUICAO':
+                # 'criar canal c' equivale a 'criar canal c = canal()'; a árvore
+                # só tem nós do código-fonte
+                return DeclaracaoVariavel(nome, ChamadaExpressao(VariavelExpressao('canal'), []), tipo)
+        
         self.consumir('ATRIBUICAO')
         valor = self.expressao()
+        if tipo == 'vetor':
+            # 'criar vetor v = [1, 2]' converte o valor inicial, como para_vetor([1, 2])
+            valor = ChamadaExpressao(VariavelExpressao('para_vetor'), [valor])
         
-        return {
-            'tipo': 'DeclaracaoVariavel',
-            'nome': nome,
-            'valor': valor,
-            'tipo_dado': tipo
-        }
+        return DeclaracaoVariavel(nome, valor, tipo)
 
     def declaracao_mostrar(self):
         """Analisa uma declaração de saída"""
         self.consumir('MOSTRAR')
         expressao = self.expressao()
         
-        return {
-            'tipo': 'DeclaracaoMostrar',
-            'expressao': expressao
-        }
+        return DeclaracaoMostrar(expressao)
 
     def declaracao_pegar(self):
         """Analisa uma declaração de entrada"""
-        self.consumir('PEGAR')
+        self.avancar()
         nome = self.consumir('IDENTIFICADOR').valor
         
-        return {
-            'tipo': 'DeclaracaoPegar',
-            'nome': nome
-        }
+        return DeclaracaoPegar(nome)
 
     def declaracao_se(self):
         """Analisa uma estrutura condicional"""
@@ -381,12 +696,7 @@ class Parser:
         
         self.consumir('FIM')
         
-        return {
-            'tipo': 'DeclaracaoSe',
-            'condicao': condicao,
-            'bloco_entao': bloco_entao,
-            'bloco_senao': bloco_senao
-        }
+        return DeclaracaoSe(condicao, bloco_entao, bloco_senao)
 
     def declaracao_enquanto(self):
         """Analisa um laço enquanto"""
@@ -401,11 +711,7 @@ class Parser:
         
         self.consumir('FIM')
         
-        return {
-            'tipo': 'DeclaracaoEnquanto',
-            'condicao': condicao,
-            'corpo': corpo
-        }
+        return DeclaracaoEnquanto(condicao, corpo)
 
     def declaracao_para(self):
         """Analisa um laço para"""
@@ -426,12 +732,7 @@ class Parser:
             
             self.consumir('FIM')
             
-            return {
-                'tipo': 'DeclaracaoParaCada',
-                'variavel': variavel,
-                'colecao': colecao,
-                'corpo': corpo
-            }
+            return DeclaracaoParaCada(variavel, colecao, corpo)
         else:
             # Loop for-range (para de-até)
             self.consumir('DE')
@@ -440,6 +741,12 @@ class Parser:
             self.consumir('ATE')
             fim = self.expressao()
             
+            # 'passo' só é palavra reservada nesta posição
+            passo = None
+            if self.token_atual.tipo == 'IDENTIFICADOR' and self.token_atual.valor == 'passo':
+                self.avancar()
+                passo = self.expressao()
+            
             self.consumir('FAZER')
             corpo = []
             
@@ -448,13 +755,7 @@ class Parser:
             
             self.consumir('FIM')
             
-            return {
-                'tipo': 'DeclaracaoPara',
-                'variavel': variavel,
-                'inicio': inicio,
-                'fim': fim,
-                'corpo': corpo
-            }
+            return DeclaracaoPara(variavel, inicio, fim, passo, corpo)
 
     def declaracao_funcao(self):
         """Analisa uma declaração de função"""
@@ -479,22 +780,14 @@ class Parser:
         
         self.consumir('FIM')
         
-        return {
-            'tipo': 'DeclaracaoFuncao',
-            'nome': nome,
-            'parametros': parametros,
-            'corpo': corpo
-        }
+        return DeclaracaoFuncao(nome, parametros, corpo)
 
     def declaracao_devolver(self):
         """Analisa uma declaração de retorno"""
         self.consumir('DEVOLVER')
         valor = self.expressao()
         
-        return {
-            'tipo': 'DeclaracaoDevolver',
-            'valor': valor
-        }
+        return DeclaracaoDevolver(valor)
 
     def declaracao_classe(self):
         """Analisa uma declaração de classe"""
@@ -505,21 +798,17 @@ class Parser:
         atributos = []
         
         while self.token_atual.tipo != 'FIM' and self.token_atual.tipo != 'EOF':
+            token = self.token_atual
             if self.token_atual.tipo == 'FUNCAO':
-                metodos.append(self.declaracao_funcao())
+                metodos.append(self.posicionar(self.declaracao_funcao(), token))
             elif self.token_atual.tipo == 'CRIAR':
-                atributos.append(self.declaracao_variavel())
+                atributos.append(self.posicionar(self.declaracao_variavel(), token))
             else:
                 raise ErroTupa(f"Declaração inesperada dentro da classe: {self.token_atual.tipo} na linha {self.token_atual.linha}, coluna {self.token_atual.coluna}")
         
         self.consumir('FIM')
         
-        return {
-            'tipo': 'DeclaracaoClasse',
-            'nome': nome,
-            'metodos': metodos,
-            'atributos': atributos
-        }
+        return DeclaracaoClasse(nome, metodos, atributos)
 
     def declaracao_tentar(self):
         """Analisa uma estrutura de tratamento de erros"""
@@ -540,31 +829,40 @@ class Parser:
         
         self.consumir('FIM')
         
-        return {
-            'tipo': 'DeclaracaoTentar',
-            'bloco_tentar': bloco_tentar,
-            'nome_erro': nome_erro,
-            'bloco_pegar': bloco_pegar
-        }
+        return DeclaracaoTentar(bloco_tentar, nome_erro, bloco_pegar)
 
     def declaracao_usar(self):
         """Analisa uma declaração de importação de módulo"""
-        self.consumir('USAR')
+        linha = self.consumir('USAR').linha
         nome = self.consumir('IDENTIFICADOR').valor
         
-        return {
-            'tipo': 'DeclaracaoUsar',
-            'nome': nome
-        }
+        # 'com' só é palavra reservada nesta posição, na mesma linha do 'usar'
+        membros = None
+        if (self.token_atual.tipo == 'IDENTIFICADOR' and self.token_atual.valor == 'com'
+                and self.token_atual.linha == linha):
+            self.avancar()
+            membros = [self.consumir('IDENTIFICADOR').valor]
+            while self.token_atual.tipo == 'VIRGULA':
+                self.avancar()
+                membros.append(self.consumir('IDENTIFICADOR').valor)
+        
+        return DeclaracaoUsar(nome, membros)
+
+    def declaracao_va(self):
+        """Analisa o início de uma tarefa: 'vá funcao(argumentos)'"""
+        token = self.consumir('VA')
+        chamada = self.expressao()
+        
+        if chamada.especie != NO_CHAMADA_EXPRESSAO:
+            raise ErroTupa(f"'vá' espera uma chamada de função na linha {token.linha}, coluna {token.coluna}")
+        
+        return DeclaracaoVa(chamada)
 
     def expressao_declaracao(self):
         """Analisa uma declaração de expressão"""
         expressao = self.expressao()
         
-        return {
-            'tipo': 'ExpressaoDeclaracao',
-            'expressao': expressao
-        }
+        return ExpressaoDeclaracao(expressao)
 
     def expressao(self):
         """Analisa uma expressão"""
@@ -578,28 +876,14 @@ class Parser:
             self.avancar()
             valor = self.expressao()
             
-            if expr['tipo'] == 'VariavelExpressao':
-                return {
-                    'tipo': 'AtribuicaoExpressao',
-                    'nome': expr['nome'],
-                    'valor': valor
-                }
-            elif expr['tipo'] == 'IndexacaoExpressao':
-                return {
-                    'tipo': 'AtribuicaoIndexacao',
-                    'objeto': expr['objeto'],
-                    'indice': expr['indice'],
-                    'valor': valor
-                }
-            elif expr['tipo'] == 'AtributoExpressao':
-                return {
-                    'tipo': 'AtribuicaoAtributo',
-                    'objeto': expr['objeto'],
-                    'nome': expr['nome'],
-                    'valor': valor
-                }
+            if expr.especie == NO_VARIAVEL_EXPRESSAO:
+                return AtribuicaoExpressao(expr.nome, valor)
+            elif expr.especie == NO_INDEXACAO_EXPRESSAO:
+                return AtribuicaoIndexacao(expr.objeto, expr.indice, valor)
+            elif expr.especie == NO_ATRIBUTO_EXPRESSAO:
+                return AtribuicaoAtributo(expr.objeto, expr.nome, valor)
             else:
-                raise ErroTupa(f"Alvo inválido para atribuição na linha {self.tokens[self.posicao-1].linha}")
+                raise ErroTupa(f"Alvo inválido para atribuição na linha {self.token_anterior.linha}")
         
         return expr
 
@@ -611,12 +895,7 @@ class Parser:
             operador = self.avancar()
             direita = self.e()
             
-            expr = {
-                'tipo': 'LogicaExpressao',
-                'operador': 'ou',
-                'esquerda': expr,
-                'direita': direita
-            }
+            expr = LogicaExpressao('ou', expr, direita)
         
         return expr
 
@@ -628,12 +907,7 @@ class Parser:
             operador = self.avancar()
             direita = self.igualdade()
             
-            expr = {
-                'tipo': 'LogicaExpressao',
-                'operador': 'e',
-                'esquerda': expr,
-                'direita': direita
-            }
+            expr = LogicaExpressao('e', expr, direita)
         
         return expr
 
@@ -646,12 +920,7 @@ class Parser:
             self.avancar()
             direita = self.comparacao()
             
-            expr = {
-                'tipo': 'BinariaExpressao',
-                'operador': '==' if operador == 'IGUAL' else '!=',
-                'esquerda': expr,
-                'direita': direita
-            }
+            expr = BinariaExpressao('==' if operador == 'IGUAL' else '!=', expr, direita)
         
         return expr
 
@@ -664,17 +933,13 @@ class Parser:
             self.avancar()
             direita = self.adicao()
             
-            expr = {
-                'tipo': 'BinariaExpressao',
-                'operador': {
-                    'MENOR': '<',
-                    'MENOR_IGUAL': '<=',
-                    'MAIOR': '>',
-                    'MAIOR_IGUAL': '>='
-                }[operador],
-                'esquerda': expr,
-                'direita': direita
-            }
+            simbolo = {
+                'MENOR': '<',
+                'MENOR_IGUAL': '<=',
+                'MAIOR': '>',
+                'MAIOR_IGUAL': '>='
+            }[operador]
+            expr = BinariaExpressao(simbolo, expr, direita)
         
         return expr
 
@@ -687,12 +952,7 @@ class Parser:
             self.avancar()
             direita = self.multiplicacao()
             
-            expr = {
-                'tipo': 'BinariaExpressao',
-                'operador': '+' if operador == 'MAIS' else '-',
-                'esquerda': expr,
-                'direita': direita
-            }
+            expr = BinariaExpressao('+' if operador == 'MAIS' else '-', expr, direita)
         
         return expr
 
@@ -705,12 +965,7 @@ class Parser:
             self.avancar()
             direita = self.unario()
             
-            expr = {
-                'tipo': 'BinariaExpressao',
-                'operador': '*' if operador == 'MULTIPLICACAO' else '/',
-                'esquerda': expr,
-                'direita': direita
-            }
+            expr = BinariaExpressao('*' if operador == 'MULTIPLICACAO' else '/', expr, direita)
         
         return expr
 
@@ -721,11 +976,7 @@ class Parser:
             self.avancar()
             direita = self.unario()
             
-            return {
-                'tipo': 'UnariaExpressao',
-                'operador': '-' if operador == 'MENOS' else '!',
-                'direita': direita
-            }
+            return UnariaExpressao('-' if operador == 'MENOS' else '!', direita)
         
         return self.chamada()
 
@@ -735,6 +986,7 @@ class Parser:
         
         while True:
             if self.token_atual.tipo == 'PARENTESE_ESQUERDO':
+                token = self.token_atual
                 self.avancar()
                 argumentos = []
                 
@@ -747,30 +999,19 @@ class Parser:
                 
                 self.consumir('PARENTESE_DIREITO')
                 
-                expr = {
-                    'tipo': 'ChamadaExpressao',
-                    'funcao': expr,
-                    'argumentos': argumentos
-                }
+                # A posição do '(' identifica o ponto de chamada na instrumentação
+                expr = self.posicionar(ChamadaExpressao(expr, argumentos), token)
             elif self.token_atual.tipo == 'COLCHETE_ESQUERDO':
                 self.avancar()
                 indice = self.expressao()
                 self.consumir('COLCHETE_DIREITO')
                 
-                expr = {
-                    'tipo': 'IndexacaoExpressao',
-                    'objeto': expr,
-                    'indice': indice
-                }
+                expr = IndexacaoExpressao(expr, indice)
             elif self.token_atual.tipo == 'PONTO':
                 self.avancar()
                 nome = self.consumir('IDENTIFICADOR').valor
                 
-                expr = {
-                    'tipo': 'AtributoExpressao',
-                    'objeto': expr,
-                    'nome': nome
-                }
+                expr = AtributoExpressao(expr, nome)
             else:
                 break
         
@@ -781,28 +1022,28 @@ class Parser:
         if self.token_atual.tipo == 'NUMERO':
             valor = self.token_atual.valor
             self.avancar()
-            return {'tipo': 'LiteralExpressao', 'valor': valor}
+            return LiteralExpressao(valor)
         
         elif self.token_atual.tipo == 'STRING':
             valor = self.token_atual.valor
             self.avancar()
-            return {'tipo': 'LiteralExpressao', 'valor': valor}
+            return LiteralExpressao(valor)
         
         elif self.token_atual.tipo == 'BOOLEANO':
             valor = self.token_atual.valor
             self.avancar()
-            return {'tipo': 'LiteralExpressao', 'valor': valor}
+            return LiteralExpressao(valor)
         
         elif self.token_atual.tipo == 'IDENTIFICADOR':
             nome = self.token_atual.valor
             self.avancar()
-            return {'tipo': 'VariavelExpressao', 'nome': nome}
+            return VariavelExpressao(nome)
         
         elif self.token_atual.tipo == 'PARENTESE_ESQUERDO':
             self.avancar()
             expr = self.expressao()
             self.consumir('PARENTESE_DIREITO')
-            return {'tipo': 'AgruparExpressao', 'expressao': expr}
+            return AgruparExpressao(expr)
         
         elif self.token_atual.tipo == 'COLCHETE_ESQUERDO':
             self.avancar()
@@ -816,7 +1057,7 @@ class Parser:
                     elementos.append(self.expressao())
             
             self.consumir('COLCHETE_DIREITO')
-            return {'tipo': 'ListaExpressao', 'elementos': elementos}
+            return ListaExpressao(elementos)
         
         elif self.token_atual.tipo == 'CHAVE_ESQUERDA':
             self.avancar()
@@ -826,459 +1067,4001 @@ class Parser:
                 chave = self.expressao()
                 self.consumir('DOIS_PONTOS')
                 valor = self.expressao()
-                pares.append({'chave': chave, 'valor': valor})
+                pares.append((chave, valor))
                 
                 while self.token_atual.tipo == 'VIRGULA':
                     self.avancar()
                     chave = self.expressao()
                     self.consumir('DOIS_PONTOS')
                     valor = self.expressao()
-                    pares.append({'chave': chave, 'valor': valor})
+                    pares.append((chave, valor))
             
             self.consumir('CHAVE_DIREITA')
-            return {'tipo': 'DicionarioExpressao', 'pares': pares}
+            return DicionarioExpressao(pares)
         
         raise ErroTupa(f"Expressão inesperada: {self.token_atual.tipo} na linha {self.token_atual.linha}, coluna {self.token_atual.coluna}")
 
-class Interpretador:
-    """Interpretador para a linguagem Tupã"""
-    def __init__(self):
-        self.escopo_global = {}
-        self.escopo_atual = [self.escopo_global]
-        self.retorno_valor = None
-        
-        # Funções integradas
-        self.escopo_global['tamanho'] = lambda x: len(x)
-        self.escopo_global['tipo'] = lambda x: type(x).__name__
-        self.escopo_global['para_texto'] = lambda x: str(x)
-        self.escopo_global['para_numero'] = lambda x: float(x) if '.' in str(x) else int(x)
-        self.escopo_global['para_lista'] = lambda x: list(x)
-        self.escopo_global['raiz'] = lambda x: math.sqrt(x)
-        
-        # Módulos integrados básicos
-        self.modulos = {
-            'matematica': {
-                'pi': math.pi,
-                'e': math.e,
-                'seno': math.sin,
-                'cosseno': math.cos,
-                'tangente': math.tan,
-                'raiz': math.sqrt,
-                'potencia': math.pow,
-                'absoluto': abs,
-                'teto': math.ceil,
-                'piso': math.floor,
-                'aleatorio': lambda: __import__('random').random(),
-                'aleatorio_entre': lambda min, max: __import__('random').randint(min, max)
-            }
-        }
+# Resolução estática de escopo
+#
+# Depois da análise sintática, o Resolvedor anota cada nó que lê ou escreve uma
+# variável com 'endereco': uma tupla (profundidade, slot). A profundidade 0 é o
+# quadro da função em execução, 1 o da função que a envolve e assim por diante;
+# PROFUNDIDADE_GLOBAL indica a tabela de globais do Interpretador.
+#
+# Um quadro é uma lista com os slots locais seguidos, na última posição, da
+# tupla de quadros envolventes capturada quando a função foi definida.
 
-    def definir(self, nome, valor):
-        """Define uma variável no escopo atual"""
-        self.escopo_atual[-1][nome] = valor
+PROFUNDIDADE_GLOBAL = -1
 
-    def obter(self, nome):
-        """Obtém o valor de uma variável"""
-        for escopo in reversed(self.escopo_atual):
-            if nome in escopo:
-                return escopo[nome]
-        
-        raise ErroTupa(f"Variável não definida: '{nome}'")
+# Valor sentinela para variáveis ainda sem valor e iteradores esgotados
+AUSENTE = object()
+
+# Valor sentinela em Interpretador.modulos para um módulo em execução, que
+# denuncia importações circulares
+EM_CARGA = object()
 
-    def iniciar_escopo(self):
-        """Inicia um novo escopo"""
-        self.escopo_atual.append({})
+def montar_quadro(tamanho, quantidade_parametros, args, envolventes):
+    """Monta o quadro de uma chamada: parâmetros, demais locais e envolventes"""
+    if len(args) == quantidade_parametros:
+        quadro = list(args)
+    elif len(args) > quantidade_parametros:
+        quadro = list(args[:quantidade_parametros])
+    else:
+        quadro = list(args) + [None] * (quantidade_parametros - len(args))
 
-    def encerrar_escopo(self):
-        """Encerra o escopo atual"""
-        self.escopo_atual.pop()
+    quadro.extend([AUSENTE] * (tamanho - quantidade_parametros))
+    quadro.append(envolventes)
+    return quadro
 
-    def interpretar(self, arvore):
-        """Interpreta a árvore sintática"""
+class InstanciaTupa:
+    """Base das instâncias de classes Tupã
+
+    Cada ClasseTupa gera uma subclasse com um slot por atributo declarado com
+    'criar', de modo que a leitura e a escrita desses atributos são feitas
+    diretamente pelo Python, em posições fixas. Atributos criados depois, por
+    atribuição, ficam no __dict__ da instância. Os métodos são descritores da
+    subclasse e não podem ser encobertos por atribuição.
+    """
+    __slots__ = ()
+
+    def __getattr__(self, nome):
+        metodo = self.__tupa__.metodos.get(nome)
+        if metodo is not None:
+            return MethodType(metodo, self)
+
+        raise ErroTupa(f"Atributo não definido: '{nome}'")
+
+    def __repr__(self):
+        return f"<instância de {self.__tupa__.nome}>"
+
+class MetodoTupa:
+    """Descritor de um método no tipo gerado por uma ClasseTupa"""
+    __slots__ = ('nome', 'funcao')
+
+    def __init__(self, nome, funcao):
+        self.nome = nome
+        self.funcao = funcao
+
+    def __get__(self, instancia, dono=None):
+        if instancia is None:
+            return self
+        return MethodType(self.funcao, instancia)
+
+    def __set__(self, instancia, valor):
+        raise ErroTupa(f"Não é possível atribuir ao método '{self.nome}'")
+
+class ClasseTupa:
+    """Classe Tupã em tempo de execução
+
+    'atributos' é a lista ordenada de (nome, valor, inicializar): quando
+    'inicializar' é None o valor inicial é a constante 'valor', avaliada uma
+    única vez na declaração; caso contrário, inicializar() é chamado a cada
+    nova instância. 'metodos' associa nomes a funções que recebem a instância
+    como primeiro argumento.
+    """
+    def __init__(self, nome, atributos, metodos):
+        self.nome = nome
+        self.atributos = atributos
+        campos = tuple(dict.fromkeys(nome_atributo for nome_atributo, _, _ in atributos))
+        self.campos = campos
+
+        # Atributos têm precedência sobre métodos de mesmo nome
+        self.metodos = {nome_metodo: metodo for nome_metodo, metodo in metodos.items() if nome_metodo not in campos}
+
+        # Caches em linha com entradas para esta classe, esvaziados por invalidar()
+        self.caches = []
+
+        namespace = {'__slots__': campos + ('__dict__',), '__tupa__': self}
+        for nome_metodo, metodo in self.metodos.items():
+            # Nomes especiais ficam só na tabela, para não alterar o protocolo do Python
+            if not (nome_metodo.startswith('__') and nome_metodo.endswith('__')):
+                namespace[nome_metodo] = MetodoTupa(nome_metodo, metodo)
+        self.tipo = type(nome, (InstanciaTupa,), namespace)
+
+    def __call__(self):
+        """Cria uma nova instância"""
+        instancia = self.tipo()
+        for nome, valor, inicializar in self.atributos:
+            setattr(instancia, nome, valor if inicializar is None else inicializar())
+        return instancia
+
+    def invalidar(self):
+        """Remove esta classe dos caches em linha que a conhecem"""
+        for cache in self.caches:
+            cache.esquecer(self.tipo)
+        self.caches = []
+
+    def __repr__(self):
+        return f"<classe {self.nome}>"
+
+# Caches em linha
+#
+# Cada ponto do programa que lê 'objeto.nome' ou chama 'objeto.nome(...)' tem
+# seu próprio CacheEmLinha. A entrada principal (tipo, metodo) guarda o tipo do
+# último receptor visto e o que o nome resolve nele: o método, ou None quando é
+# um atributo, lido diretamente do slot por getattr. Os motores testam a
+# entrada principal no próprio laço e só chamam resolver() quando ela falha.
+
+POLIMORFISMO_MAXIMO = 4
+
+class CacheEmLinha:
+    """Cache em linha do acesso a um nome de atributo ou método"""
+    __slots__ = ('nome', 'tipo', 'metodo', 'entradas', 'acertos', 'falhas')
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.tipo = None
+        self.metodo = None
+        # Até POLIMORFISMO_MAXIMO tipos de receptor já resolvidos
+        self.entradas = {}
+        self.acertos = 0
+        self.falhas = 0
+
+    def resolver(self, objeto):
+        """Caminho lento: devolve o método de uma instância Tupã para o nome, ou None"""
+        tipo = type(objeto)
+        entradas = self.entradas
+        if tipo in entradas:
+            self.acertos += 1
+            metodo = entradas[tipo]
+        else:
+            self.falhas += 1
+            classe = tipo.__tupa__
+            metodo = None if self.nome in classe.campos else classe.metodos.get(self.nome)
+
+            # Pontos megamórficos deixam de guardar tipos novos
+            if len(entradas) >= POLIMORFISMO_MAXIMO:
+                return metodo
+            entradas[tipo] = metodo
+            classe.caches.append(self)
+
+        self.tipo = tipo
+        self.metodo = metodo
+        return metodo
+
+    def esquecer(self, tipo):
+        """Descarta as entradas de um tipo"""
+        self.entradas.pop(tipo, None)
+        if self.tipo is tipo:
+            self.tipo = None
+            self.metodo = None
+
+def ler_atributo(objeto, cache):
+    """Lê 'objeto.nome' passando pelo cache em linha do ponto de acesso"""
+    if type(objeto) is cache.tipo:
+        cache.acertos += 1
+        metodo = cache.metodo
+    elif isinstance(objeto, InstanciaTupa):
+        metodo = cache.resolver(objeto)
+    else:
+        metodo = None
+
+    if metodo is not None:
+        return MethodType(metodo, objeto)
+    try:
+        return getattr(objeto, cache.nome)
+    except AttributeError:
+        raise ErroTupa(f"Atributo não encontrado: '{cache.nome}'")
+
+class Resolvedor:
+    """Atribui a cada variável um endereço (profundidade, slot)
+
+    Nomes atribuídos dentro de uma função (parâmetros, 'criar', atribuições,
+    'pegar', variáveis de laço, 'tentar ... pegar', funções e classes aninhadas)
+    são locais a ela em todo o seu corpo. Os demais vêm da função envolvente mais
+    próxima que os declara ou, não havendo nenhuma, da tabela de globais.
+    """
+    def __init__(self, interpretador):
+        self.interpretador = interpretador
+        self.funcoes = []
+        # Laços 'para ... de ... até' em andamento na função atual
+        self.lacos = []
+
+    def resolver(self, arvore):
+        """Anota a árvore de um Programa e a devolve"""
+        for instrucao in arvore.instrucoes:
+            self.visitar(instrucao)
+        return arvore
+
+    def declarar(self, nome):
+        """Endereço de um nome declarado no escopo atual"""
+        if self.funcoes:
+            endereco = (0, self.funcoes[-1][nome])
+        else:
+            endereco = (PROFUNDIDADE_GLOBAL, self.interpretador.indice_global(nome))
+
+        # Atribuir à variável de um laço em andamento impede o caminho rápido dele
+        for laco in self.lacos:
+            if laco.endereco == endereco:
+                laco.contador_fixo = False
+        return endereco
+
+    def buscar(self, nome):
+        """Endereço de um nome lido no escopo atual"""
+        for profundidade, slots in enumerate(reversed(self.funcoes)):
+            if nome in slots:
+                return (profundidade, slots[nome])
+        return (PROFUNDIDADE_GLOBAL, self.interpretador.indice_global(nome))
+
+    def coletar(self, no, nomes):
+        """Coleta os nomes declarados em um corpo, sem entrar em funções aninhadas"""
+        especie = no.especie
+
+        if especie in (NO_DECLARACAO_VARIAVEL, NO_ATRIBUICAO_EXPRESSAO, NO_DECLARACAO_PEGAR):
+            nomes.append(no.nome)
+        elif especie in (NO_DECLARACAO_PARA, NO_DECLARACAO_PARA_CADA):
+            nomes.append(no.variavel)
+        elif especie == NO_DECLARACAO_TENTAR:
+            nomes.append(no.nome_erro)
+        elif especie == NO_DECLARACAO_FUNCAO:
+            nomes.append(no.nome)
+            return
+        elif especie == NO_DECLARACAO_CLASSE:
+            nomes.append(no.nome)
+            for atributo in no.atributos:
+                self.coletar(atributo.valor, nomes)
+            return
+
+        for filho in no.filhos():
+            self.coletar(filho, nomes)
+
+    def funcao(self, no, com_self):
+        """Resolve o corpo de uma função ou método em um novo quadro"""
+        slots = {'self': 0} if com_self else {}
+        for param in no.parametros:
+            if param in slots:
+                raise ErroTupa(f"Parâmetro duplicado '{param}' na função '{no.nome}'")
+            slots[param] = len(slots)
+
+        declarados = []
+        for instrucao in no.corpo:
+            self.coletar(instrucao, declarados)
+        for nome in declarados:
+            if nome not in slots:
+                slots[nome] = len(slots)
+
+        # Funções aninhadas não alteram variáveis de quem as envolve
+        lacos = self.lacos
+        self.funcoes.append(slots)
+        self.lacos = []
         try:
-            self.executar(arvore)
-        except ErroTupa as e:
-            print(f"Erro: {e}")
-        except Exception as e:
-            print(f"Erro interno: {e}")
+            for instrucao in no.corpo:
+                self.visitar(instrucao)
+        finally:
+            self.funcoes.pop()
+            self.lacos = lacos
 
-    def executar(self, no):
-        """Executa um nó da árvore sintática"""
-        tipo = no['tipo']
-        
-        # Programa
-        if tipo == 'Programa':
-            for instrucao in no['instrucoes']:
-                self.executar(instrucao)
-        
-        # Declarações
-        elif tipo == 'DeclaracaoVariavel':
-            valor = self.avaliar(no['valor'])
-            self.definir(no['nome'], valor)
-        
-        elif tipo == 'DeclaracaoMostrar':
-            valor = self.avaliar(no['expressao'])
-            print(valor)
-        
-        elif tipo == 'DeclaracaoPegar':
-            valor = input()
+        no.nomes_locais = list(slots)
+
+    def visitar(self, no):
+        """Anota um nó e seus filhos"""
+        especie = no.especie
+
+        if especie == NO_VARIAVEL_EXPRESSAO:
+            no.endereco = self.buscar(no.nome)
+            return
+
+        if especie == NO_DECLARACAO_FUNCAO:
+            no.endereco = self.declarar(no.nome)
+            self.funcao(no, False)
+            return
+
+        if especie == NO_DECLARACAO_CLASSE:
+            no.endereco = self.declarar(no.nome)
+            # Os valores iniciais dos atributos são avaliados no escopo da classe
+            for atributo in no.atributos:
+                self.visitar(atributo.valor)
+            for metodo in no.metodos:
+                self.funcao(metodo, True)
+            return
+
+        if especie == NO_DECLARACAO_PARA:
+            no.endereco = self.declarar(no.variavel)
+            for limite in (no.inicio, no.fim, no.passo):
+                if limite is not None:
+                    self.visitar(limite)
+
+            no.contador_fixo = True
+            self.lacos.append(no)
             try:
-                # Tenta converter para número se possível
-                if '.' in valor:
-                    valor = float(valor)
-                else:
-                    valor = int(valor)
-            except ValueError:
-                # Mantém como string se não for um número
-                pass
-            
-            self.definir(no['nome'], valor)
-        
-        elif tipo == 'DeclaracaoSe':
-            if self.avaliar(no['condicao']):
-                for instrucao in no['bloco_entao']:
-                    self.executar(instrucao)
-            else:
-                for instrucao in no['bloco_senao']:
+                for instrucao in no.corpo:
+                    self.visitar(instrucao)
+            finally:
+                self.lacos.pop()
+            return
+
+        if especie in (NO_DECLARACAO_VARIAVEL, NO_ATRIBUICAO_EXPRESSAO, NO_DECLARACAO_PEGAR):
+            no.endereco = self.declarar(no.nome)
+        elif especie == NO_DECLARACAO_PARA_CADA:
+            no.endereco = self.declarar(no.variavel)
+        elif especie == NO_DECLARACAO_TENTAR:
+            no.endereco = self.declarar(no.nome_erro)
+
+        for filho in no.filhos():
+            self.visitar(filho)
+
+# Otimização da árvore sintática
+#
+# O Otimizador roda depois do Resolvedor, sobre a árvore já anotada: assim,
+# remover um ramo que nunca executa não muda quais nomes são locais. Ele
+# substitui nós por versões mais simples e nunca altera o resultado de um
+# programa; expressões cuja avaliação falharia (como '1 / 0') são mantidas
+# para que o erro aconteça durante a execução.
+
+# Campos que guardam listas de declarações, onde ramos mortos são removidos
+CAMPOS_BLOCO = ('instrucoes', 'corpo', 'bloco_entao', 'bloco_senao', 'bloco_tentar', 'bloco_pegar')
+
+# Operadores binários cujo resultado é sempre um booleano
+OPERADORES_COMPARACAO = ('<', '<=', '>', '>=', '==', '!=')
+
+# Textos maiores que isto, como os de '"ab" * 100000', não são dobrados
+TAMANHO_MAXIMO_CONSTANTE = 4096
+
+class Otimizador:
+    """Dobra constantes e elimina ramos mortos de uma árvore resolvida
+
+    Expressões aritméticas, de comparação e lógicas com operandos literais
+    viram literais; parênteses (AgruparExpressao) são descartados; 'não não x'
+    vira x quando x já é um booleano ou quando só a veracidade importa, como
+    na condição de 'se' e 'enquanto'. Um 'se' de condição constante é trocado
+    pelo bloco escolhido e um 'enquanto' de condição falsa é removido.
+    """
+    def otimizar(self, arvore):
+        """Otimiza um nó Programa e o devolve"""
+        arvore.instrucoes = self.bloco(arvore.instrucoes)
+        return arvore
+
+    def bloco(self, instrucoes):
+        """Otimiza uma lista de declarações, removendo as que nunca executam"""
+        resultado = []
+        for instrucao in instrucoes:
+            instrucao = self.visitar(instrucao)
+            especie = instrucao.especie
+
+            if especie == NO_DECLARACAO_SE and instrucao.condicao.especie == NO_LITERAL_EXPRESSAO:
+                resultado.extend(instrucao.bloco_entao if instrucao.condicao.valor else instrucao.bloco_senao)
+            elif (especie == NO_DECLARACAO_ENQUANTO and instrucao.condicao.especie == NO_LITERAL_EXPRESSAO
+                  and not instrucao.condicao.valor):
+                continue
+            else:
+                resultado.append(instrucao)
+        return resultado
+
+    def visitar(self, no):
+        """Otimiza um nó depois dos seus filhos e devolve o nó que o substitui"""
+        for campo in no.campos:
+            valor = getattr(no, campo)
+            if isinstance(valor, No):
+                setattr(no, campo, self.visitar(valor))
+            elif isinstance(valor, list):
+                if campo in CAMPOS_BLOCO:
+                    setattr(no, campo, self.bloco(valor))
+                else:
+                    setattr(no, campo, [self.visitar(item) if isinstance(item, No) else
+                                        tuple(self.visitar(parte) for parte in item) if isinstance(item, tuple) else
+                                        item for item in valor])
+
+        especie = no.especie
+
+        if especie == NO_AGRUPAR_EXPRESSAO:
+            return no.expressao
+
+        if especie in (NO_DECLARACAO_SE, NO_DECLARACAO_ENQUANTO):
+            no.condicao = self.veracidade(no.condicao)
+            return no
+
+        if especie == NO_UNARIA_EXPRESSAO:
+            direita = no.direita
+            if direita.especie == NO_LITERAL_EXPRESSAO:
+                return self.dobrar(no, lambda: -direita.valor if no.operador == '-' else not direita.valor)
+            if no.operador == '!' and direita.especie == NO_UNARIA_EXPRESSAO and direita.operador == '!' and \
+                    self.booleano(direita.direita):
+                return direita.direita
+            return no
+
+        if especie == NO_BINARIA_EXPRESSAO:
+            esquerda, direita = no.esquerda, no.direita
+            if esquerda.especie == NO_LITERAL_EXPRESSAO and direita.especie == NO_LITERAL_EXPRESSAO:
+                operacao = FUNCOES_BINARIAS[OPERADORES_BINARIOS.index(no.operador)]
+                return self.dobrar(no, lambda: operacao(esquerda.valor, direita.valor))
+            return no
+
+        if especie == NO_LOGICA_EXPRESSAO and no.esquerda.especie == NO_LITERAL_EXPRESSAO:
+            # 'e' devolve o operando esquerdo se ele for falso; 'ou', se for verdadeiro
+            if bool(no.esquerda.valor) == (no.operador == 'ou'):
+                return no.esquerda
+            return no.direita
+
+        return no
+
+    def dobrar(self, no, calcular):
+        """Literal com o valor calculado, ou o próprio nó se o cálculo falhar"""
+        try:
+            valor = calcular()
+        except Exception:
+            return no
+        if isinstance(valor, str) and len(valor) > TAMANHO_MAXIMO_CONSTANTE:
+            return no
+        return LiteralExpressao(valor)
+
+    def veracidade(self, no):
+        """Simplifica uma condição, onde 'não não x' equivale a x"""
+        while (no.especie == NO_UNARIA_EXPRESSAO and no.operador == '!' and
+               no.direita.especie == NO_UNARIA_EXPRESSAO and no.direita.operador == '!'):
+            no = no.direita.direita
+        return no
+
+    def booleano(self, no):
+        """Indica se a expressão sempre produz um booleano"""
+        especie = no.especie
+        if especie == NO_LITERAL_EXPRESSAO:
+            return isinstance(no.valor, bool)
+        if especie == NO_UNARIA_EXPRESSAO:
+            return no.operador == '!'
+        return especie == NO_BINARIA_EXPRESSAO and no.operador in OPERADORES_COMPARACAO
+
+# Motores de execução disponíveis: a máquina virtual de bytecode (padrão),
+# o percurso direto da árvore sintática e a compilação para fechamentos
+MOTORES = ('vm', 'arvore', 'fechamentos')
+MOTOR_PADRAO = 'vm'
+
+def intervalo(inicio, fim, passo):
+    """Valores percorridos por 'para ... de inicio até fim passo passo', com o fim incluído
+
+    Quando o corpo não altera a variável do laço, os motores percorrem este
+    iterador: um range do Python para inteiros e, para outros números, valores
+    acumulados como no caminho geral, em que o corpo pode alterar a variável.
+    """
+    if passo == 0:
+        raise ErroTupa("O passo de 'para' não pode ser zero")
+    if type(inicio) is int and type(fim) is int and type(passo) is int:
+        return iter(range(inicio, fim + 1 if passo > 0 else fim - 1, passo))
+    return gerar_intervalo(inicio, fim, passo)
+
+def gerar_intervalo(inicio, fim, passo):
+    """Gerador do intervalo para valores que não são todos inteiros"""
+    valor = inicio
+    if passo > 0:
+        while valor <= fim:
+            yield valor
+            valor = valor + passo
+    else:
+        while valor >= fim:
+            yield valor
+            valor = valor + passo
+
+def dentro_do_intervalo(valor, fim, passo):
+    """Indica se o laço 'para' continua com a variável valendo 'valor'"""
+    if passo > 0:
+        return valor <= fim
+    if passo < 0:
+        return valor >= fim
+    raise ErroTupa("O passo de 'para' não pode ser zero")
+
+# Vetores numéricos: cada elemento ocupa 8 bytes sem caixa, em vez de um
+# ponteiro para um objeto int/float como nas listas
+TIPOS_VETOR = {'d': 'vetor_real', 'q': 'vetor_inteiro'}
+
+class Vetor(array):
+    """Vetor numérico da linguagem Tupã
+
+    Guarda os números contíguos em um array do Python, que expõe o protocolo
+    de buffer: memoryview, bytes e bibliotecas nativas leem os dados sem cópia.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{TIPOS_VETOR[self.typecode]}({self.tolist()})"
+
+    __repr__ = __str__
+
+def criar_vetor(codigo, valores=0):
+    """Cria um vetor com 'valores' zeros, se for um inteiro, ou com os elementos de 'valores'"""
+    if type(valores) is int:
+        if valores < 0:
+            raise ErroTupa(f"Tamanho de vetor inválido: {valores}")
+        return Vetor(codigo, bytes(8 * valores))
+    try:
+        return Vetor(codigo, valores)
+    except (TypeError, OverflowError):
+        raise ErroTupa(f"Valores inválidos para {TIPOS_VETOR[codigo]}: {valores}")
+
+def para_vetor(valores):
+    """Vetor com os elementos de 'valores': o próprio, se já for um vetor
+
+    Só inteiros dão um vetor_inteiro; com algum real, o vetor é de reais.
+    """
+    if isinstance(valores, Vetor):
+        return valores
+    if type(valores) is int:
+        raise ErroTupa(f"Valores inválidos para um vetor: {valores}; use vetor_real ou vetor_inteiro para criar zeros")
+    try:
+        valores = list(valores)
+    except TypeError:
+        raise ErroTupa(f"Valores inválidos para um vetor: {valores}")
+    codigo = 'q' if all(type(valor) is int for valor in valores) else 'd'
+    return criar_vetor(codigo, valores)
+
+def erro_de_atribuicao(objeto, indice, valor, excecao):
+    """ErroTupa para uma atribuição 'objeto[indice] = valor' que falhou"""
+    if isinstance(excecao, IndexError) or (isinstance(objeto, array) and type(indice) is not int):
+        return ErroTupa(f"Índice inválido: {indice}")
+    if isinstance(objeto, array):
+        return ErroTupa(f"Valor inválido para {TIPOS_VETOR.get(objeto.typecode, 'vetor')}: {valor}")
+    return ErroTupa(f"Objeto não indexável: {objeto}")
+
+# Módulo 'colecoes': operações em lote sobre listas e vetores. Cada uma é um
+# laço nativo do Python (sum, min, map, filter, sorted...), então o elemento
+# não passa pelo interpretador; só uma função Tupã recebida como argumento é
+# chamada uma vez por elemento, e integradas como 'raiz' rodam direto em C.
+
+# Operações que recebem uma função: posição da função, posição da coleção e
+# quantidades de argumentos aceitas
+ASSINATURAS_EM_LOTE = {
+    'mapear': (0, 1, (2,)),
+    'filtrar': (0, 1, (2,)),
+    'reduzir': (0, 1, (2, 3)),
+    'ordenar': (1, 0, (1, 2)),
+}
+
+def em_lote(nome, operacao):
+    """Operação de um módulo nativo que relata argumentos inválidos como ErroTupa
+
+    Sem função entre os argumentos, um TypeError ou ValueError só pode vir
+    deles e é traduzido. Com uma função, os argumentos são validados antes e
+    os erros levantados dentro dela passam sem alteração, apontando onde ela
+    falhou em vez de culpar a operação.
+    """
+    assinatura = ASSINATURAS_EM_LOTE.get(nome)
+
+    def executar(*args):
+        if assinatura is not None:
+            posicao = assinatura[0]
+            if posicao < len(args) and args[posicao] is not None:
+                validar_em_lote(nome, args, assinatura)
+                return operacao(*args)
+        try:
+            return operacao(*args)
+        except (TypeError, ValueError) as e:
+            raise ErroTupa(f"Argumentos inválidos para '{nome}': {e}")
+    executar.__name__ = nome
+    return executar
+
+def validar_em_lote(nome, args, assinatura):
+    """Verifica a quantidade de argumentos, a função e a coleção de uma operação em lote"""
+    posicao_funcao, posicao_colecao, quantidades = assinatura
+    if len(args) not in quantidades:
+        esperados = ' ou '.join(str(quantidade) for quantidade in quantidades)
+        raise ErroTupa(f"Argumentos inválidos para '{nome}': esperados {esperados}, recebidos {len(args)}")
+    if not callable(args[posicao_funcao]):
+        raise ErroTupa(f"Argumentos inválidos para '{nome}': {args[posicao_funcao]} não é uma função")
+    try:
+        iter(args[posicao_colecao])
+    except TypeError:
+        raise ErroTupa(f"Argumentos inválidos para '{nome}': {args[posicao_colecao]} não é uma coleção")
+
+def exigir_elementos(nome, valores):
+    """Rejeita coleções vazias nas operações que precisam de ao menos um elemento"""
+    if not len(valores):
+        raise ErroTupa(f"'{nome}' de uma coleção vazia")
+
+def minimo(valores):
+    exigir_elementos('minimo', valores)
+    return min(valores)
+
+def maximo(valores):
+    exigir_elementos('maximo', valores)
+    return max(valores)
+
+def media(valores):
+    exigir_elementos('media', valores)
+    return sum(valores) / len(valores)
+
+def mapear(funcao, valores):
+    return list(map(funcao, valores))
+
+def filtrar(funcao, valores):
+    """Elementos para os quais 'funcao' é verdadeira; um vetor continua vetor"""
+    if isinstance(valores, array):
+        return Vetor(valores.typecode, filter(funcao, valores))
+    return list(filter(funcao, valores))
+
+def reduzir(funcao, valores, *inicial):
+    """Combina os elementos da esquerda para a direita, partindo de 'inicial' se houver"""
+    if not inicial:
+        exigir_elementos('reduzir', valores)
+    return reduce(funcao, valores, *inicial)
+
+def ordenar(valores, chave=None):
+    """Cópia ordenada, pela 'chave' de cada elemento se houver; um vetor continua vetor"""
+    if isinstance(valores, array):
+        return Vetor(valores.typecode, sorted(valores, key=chave))
+    return sorted(valores, key=chave)
+
+MODULO_COLECOES = {nome: em_lote(nome, operacao) for nome, operacao in (
+    ('soma', sum),
+    ('minimo', minimo),
+    ('maximo', maximo),
+    ('media', media),
+    ('mapear', mapear),
+    ('filtrar', filtrar),
+    ('reduzir', reduzir),
+    ('ordenar', ordenar),
+)}
+
+# Módulo 'matriz': arranjos n-dimensionais do NumPy, carregado só no
+# 'usar matriz' para que o NumPy continue opcional. Os operadores + - * / e as
+# comparações já agem elemento a elemento sobre eles em todos os motores.
+
+@functools.cache
+def carregar_modulo_matriz():
+    """Membros do módulo 'matriz', ou ErroTupa se o NumPy não estiver instalado"""
+    try:
+        import numpy
+    except ImportError:
+        raise ErroTupa("O módulo 'matriz' precisa do NumPy, que não está instalado (pip install numpy)")
+
+    def matriz(valores):
+        """Matriz com os valores de uma lista (de listas) ou, sem cópia, de um vetor"""
+        return numpy.asarray(valores)
+
+    def forma(valores, *dimensoes):
+        """Matriz com os valores reorganizados nas dimensões indicadas"""
+        return numpy.reshape(valores, dimensoes)
+
+    def somar_eixo(valores, eixo=None):
+        """Soma de todos os elementos ou, com 'eixo', ao longo dele (0: colunas, 1: linhas)"""
+        return numpy.sum(valores, axis=eixo)
+
+    def fatia(inicio=None, fim=None, passo=None):
+        """Índice que seleciona 'inicio' até 'fim' (excluído), como em m[fatia(1, 3)]"""
+        return slice(inicio, fim, passo)
+
+    def posicao(*indices):
+        """Índice de várias dimensões, como em m[posicao(0, fatia())] (primeira linha)"""
+        return indices
+
+    membros = {
+        'matriz': matriz,
+        'zeros': lambda *dimensoes: numpy.zeros(dimensoes),
+        'uns': lambda *dimensoes: numpy.ones(dimensoes),
+        'identidade': numpy.identity,
+        'sequencia': numpy.arange,
+        'forma': forma,
+        'dimensoes': lambda valores: list(numpy.shape(valores)),
+        'produto': numpy.matmul,
+        'transpor': numpy.transpose,
+        'somar_eixo': somar_eixo,
+        'fatia': fatia,
+        'posicao': posicao,
+        'para_listas': lambda valores: numpy.asarray(valores).tolist(),
+    }
+    return {nome: em_lote(nome, membro) for nome, membro in membros.items()}
+
+# Canais: filas entre tarefas 'vá', no estilo dos canais de Go
+#
+# Um canal sem buffer (capacidade 0) só entrega um valor quando há alguém
+# recebendo; com buffer, 'enviar' só espera quando ele está cheio. As tarefas
+# que esperam ficam em 'receptores' e 'remetentes' como (tarefa, dado,
+# geracao): a entrada só vale enquanto tarefa.geracao não mudar, o que
+# descarta de uma vez as esperas de um 'selecionar' quando o primeiro canal
+# responde. Fora do escalonador da VM, uma operação que precisaria esperar
+# é um erro.
+
+# Resultado de uma operação que deixou a tarefa esperando
+BLOQUEADA = object()
+
+# Resultado de receber de um canal fechado e vazio
+FECHADO = object()
+
+# Dado de um receptor que, ao ser acordado, repete a leitura ('para ... em')
+REPETIR = object()
+
+class Canal:
+    """Canal da linguagem Tupã, criado por canal(capacidade) ou 'criar canal c'"""
+    __slots__ = ('capacidade', 'buffer', 'fechado', 'receptores', 'remetentes')
+
+    def __init__(self, capacidade=0):
+        if type(capacidade) is not int or capacidade < 0:
+            raise ErroTupa(f"Capacidade de canal inválida: {capacidade}")
+        self.capacidade = capacidade
+        self.buffer = deque()
+        self.fechado = False
+        self.receptores = deque()
+        self.remetentes = deque()
+
+    def tentar_enviar(self, valor):
+        """Entrega o valor a quem espera ou o põe no buffer; falso se for preciso esperar"""
+        if self.fechado:
+            raise ErroTupa("Envio em canal fechado")
+        receptores = self.receptores
+        while receptores:
+            tarefa, dado, geracao = receptores.popleft()
+            if tarefa.geracao != geracao:
+                continue
+            if dado is REPETIR:
+                # Quem repete a leitura encontra o valor no buffer ou em 'remetentes'
+                tarefa.acordar(AUSENTE)
+                break
+            tarefa.acordar(valor if dado is None else [dado, valor])
+            return True
+        if len(self.buffer) < self.capacidade:
+            self.buffer.append(valor)
+            return True
+        return False
+
+    def tentar_receber(self):
+        """Próximo valor, FECHADO se não haverá outros ou BLOQUEADA se for preciso esperar"""
+        remetentes = self.remetentes
+        while remetentes:
+            tarefa, valor, geracao = remetentes.popleft()
+            if tarefa.geracao != geracao:
+                continue
+            tarefa.acordar(None)
+            if self.buffer:
+                # O remetente acordado ocupa a vaga aberta no fim do buffer
+                self.buffer.append(valor)
+                return self.buffer.popleft()
+            return valor
+        if self.buffer:
+            return self.buffer.popleft()
+        return FECHADO if self.fechado else BLOQUEADA
+
+    def esperar_recebimento(self, tarefa, dado=None):
+        """Registra a tarefa para ser acordada pelo próximo envio"""
+        self.receptores.append((tarefa, dado, tarefa.geracao))
+
+    def esperar_envio(self, tarefa, valor):
+        """Registra a tarefa até que alguém receba o valor"""
+        self.remetentes.append((tarefa, valor, tarefa.geracao))
+
+    def enviar(self, valor):
+        if not self.tentar_enviar(valor):
+            raise ErroTupa("'enviar' precisaria esperar: o canal está cheio e não há tarefa recebendo")
+
+    def receber(self):
+        """Próximo valor; um canal fechado e vazio devolve nulo"""
+        valor = self.tentar_receber()
+        if valor is BLOQUEADA:
+            raise ErroTupa("'receber' precisaria esperar: o canal está vazio e não há tarefa enviando")
+        return None if valor is FECHADO else valor
+
+    def fechar(self):
+        """Impede novos envios e acorda quem espera: receptores recebem nulo"""
+        if self.fechado:
+            raise ErroTupa("O canal já está fechado")
+        self.fechado = True
+        while self.receptores:
+            tarefa, dado, geracao = self.receptores.popleft()
+            if tarefa.geracao == geracao:
+                tarefa.acordar(AUSENTE if dado is REPETIR else None if dado is None else [dado, None])
+        while self.remetentes:
+            tarefa, _, geracao = self.remetentes.popleft()
+            if tarefa.geracao == geracao:
+                tarefa.falhar(ErroTupa("Envio em canal fechado"))
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __iter__(self):
+        return LeitorCanal(self, None)
+
+    def __repr__(self):
+        estado = 'fechado' if self.fechado else f"{len(self.buffer)}/{self.capacidade}"
+        return f"<canal {estado}>"
+
+class LeitorCanal:
+    """Iterador de 'para valor em canal': recebe até o canal ser fechado e esvaziado
+
+    Criado pela VM com a tarefa atual, que então espera pelo próximo valor
+    em vez de falhar.
+    """
+    __slots__ = ('canal', 'tarefa')
+
+    def __init__(self, canal, tarefa):
+        self.canal = canal
+        self.tarefa = tarefa
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        valor = self.canal.tentar_receber()
+        if valor is FECHADO:
+            raise StopIteration
+        if valor is BLOQUEADA:
+            if self.tarefa is None:
+                raise ErroTupa("'para ... em' precisaria esperar: o canal está vazio e não há tarefa enviando")
+            self.canal.esperar_recebimento(self.tarefa, REPETIR)
+            raise TrocaDeTarefa(TROCA_REPETIR)
+        return valor
+
+def escolher_canal(tarefa, canais, esperar=True):
+    """[indice, valor] do primeiro canal com valor; a tarefa, se houver, pode esperar"""
+    canais = list(canais)
+    for canal in canais:
+        if type(canal) is not Canal:
+            raise ErroTupa(f"'selecionar' espera uma lista de canais, não {canal}")
+    for indice, canal in enumerate(canais):
+        valor = canal.tentar_receber()
+        if valor is not BLOQUEADA:
+            return [indice, None if valor is FECHADO else valor]
+    if not esperar:
+        return [-1, None]
+    if tarefa is None:
+        raise ErroTupa("'selecionar' precisaria esperar: nenhum canal tem valor")
+    for indice, canal in enumerate(canais):
+        # Esperas antigas de outros 'selecionar' não se acumulam no canal
+        canal.receptores = deque(entrada for entrada in canal.receptores if entrada[0].geracao == entrada[2])
+        canal.esperar_recebimento(tarefa, indice)
+    return BLOQUEADA
+
+def selecionar(canais, esperar=True):
+    """[indice, valor] do primeiro canal da lista com um valor; [-1, nulo] sem esperar"""
+    return escolher_canal(None, canais, esperar)
+
+def operar_canal(funcao, argumentos, tarefa):
+    """Chamada de 'selecionar' ou de um método de canal feita por uma tarefa da VM
+
+    Devolve o resultado ou BLOQUEADA, quando a tarefa ficou registrada para
+    esperar e receberá o resultado ao ser acordada.
+    """
+    if funcao is selecionar:
+        return escolher_canal(tarefa, *argumentos)
+    canal = funcao.__self__
+    nome = funcao.__name__
+    if nome == 'receber' and not argumentos:
+        valor = canal.tentar_receber()
+        if valor is BLOQUEADA:
+            canal.esperar_recebimento(tarefa)
+        elif valor is FECHADO:
+            return None
+        return valor
+    if nome == 'enviar' and len(argumentos) == 1:
+        if canal.tentar_enviar(argumentos[0]):
+            return None
+        canal.esperar_envio(tarefa, argumentos[0])
+        return BLOQUEADA
+    return funcao(*argumentos)
+
+# Execução paralela: paralelo_mapear(f, lista) aplica uma função Tupã aos
+# elementos em processos separados, contornando o GIL. O processo não recebe
+# a função compilada, mas um pacote com a declaração dela (a árvore
+# sintática), a das funções que ela chama e os valores das globais que lê;
+# cada processo monta com ele um interpretador, guardado enquanto chegarem
+# lotes da mesma chamada. Alterações em variáveis externas se perderiam no
+# outro processo, por isso a função não pode fazer nenhuma.
+
+# Métodos de listas, dicionários e conjuntos que alteram o objeto
+METODOS_MUTANTES = frozenset(('append', 'extend', 'insert', 'pop', 'remove', 'clear', 'sort', 'reverse',
+                              'update', 'setdefault', 'popitem', 'add', 'discard'))
+
+# Lotes por processo em cada chamada, para equilibrar elementos lentos
+LOTES_POR_PROCESSO = 4
+
+# ProcessPoolExecutor por quantidade de processos, criados no primeiro uso
+EXECUTORES_PARALELOS = {}
+
+# Identifica os pacotes de cada chamada de paralelo_mapear
+CHAMADAS_PARALELAS = [0]
+
+# Pacote e interpretador do último pacote usado, em cada processo de trabalho
+INTERPRETADOR_PARALELO = [None, None]
+
+def origem_funcao(funcao):
+    """(declaração, quadros envolventes, interpretador) de uma função Tupã, ou None"""
+    if type(funcao) is FuncaoVM:
+        return funcao.codigo.declaracao, funcao.cauda[-1], funcao.vm.interpretador
+    # Os outros motores marcam as funções Python que criam
+    return getattr(funcao, 'origem', None) if type(funcao) is FunctionType else None
+
+def raiz_variavel(no):
+    """Variável de onde parte 'a[i].b', ou None"""
+    while no.especie in (NO_INDEXACAO_EXPRESSAO, NO_ATRIBUTO_EXPRESSAO):
+        no = no.objeto
+    return no if no.especie == NO_VARIAVEL_EXPRESSAO else None
+
+def externas_da_funcao(declaracao):
+    """Nomes globais lidos pela função, rejeitando as que alteram variáveis externas
+
+    Atribuições a nomes são sempre locais; só alterações no objeto guardado
+    em uma global ('xs[i] = v', 'o.campo = v', 'xs.append(v)') a modificam.
+    """
+    lidas = {}
+    pendentes = list(declaracao.corpo)
+    while pendentes:
+        no = pendentes.pop()
+        especie = no.especie
+        alvo = None
+        if especie == NO_VARIAVEL_EXPRESSAO:
+            if no.endereco[0] == PROFUNDIDADE_GLOBAL:
+                lidas[no.nome] = None
+        elif especie in (NO_ATRIBUICAO_INDEXACAO, NO_ATRIBUICAO_ATRIBUTO):
+            alvo = raiz_variavel(no.objeto)
+        elif (especie == NO_CHAMADA_EXPRESSAO and no.funcao.especie == NO_ATRIBUTO_EXPRESSAO
+              and no.funcao.nome in METODOS_MUTANTES):
+            alvo = raiz_variavel(no.funcao.objeto)
+
+        if alvo is not None and alvo.endereco[0] == PROFUNDIDADE_GLOBAL:
+            raise ErroTupa(f"'paralelo_mapear': a função '{declaracao.nome}' altera a variável externa "
+                           f"'{alvo.nome}', o que não teria efeito fora do outro processo")
+        pendentes.extend(no.filhos())
+    return lidas
+
+def pacote_paralelo(funcao):
+    """Pacote que recria a função e o que ela usa em outro processo
+
+    É uma tupla (nome, motor, otimizar, declarações, globais, módulos):
+    'declarações' associa nomes globais a declarações de funções; 'globais',
+    a valores; e 'módulos', nomes importados a seus módulos integrados.
+    """
+    origem = origem_funcao(funcao)
+    if origem is None or origem[0] is None:
+        raise ErroTupa(f"'paralelo_mapear' espera uma função Tupã, não {funcao}")
+    nome = origem[0].nome
+    motor, otimizar = origem[2].motor, origem[2].otimizar
+
+    declaracoes, globais, modulos = {}, {}, {}
+    pendentes = [(nome, funcao)]
+    while pendentes:
+        nome_global, valor = pendentes.pop()
+        declaracao, envolventes, interpretador = origem_funcao(valor)
+        if envolventes:
+            raise ErroTupa(f"'paralelo_mapear' só aceita funções declaradas no nível principal, "
+                           f"não '{declaracao.nome}'")
+        declaracoes[nome_global] = declaracao
+
+        for externa in externas_da_funcao(declaracao):
+            if externa in declaracoes or externa in globais or externa in modulos:
+                continue
+            indice = interpretador.indices_globais.get(externa)
+            valor = AUSENTE if indice is None else interpretador.globais[indice]
+            if valor is AUSENTE or FUNCOES_INTEGRADAS.get(externa) is valor:
+                # O outro processo tem as mesmas integradas
+                continue
+            origem = origem_funcao(valor)
+            if origem is not None and origem[0] is not None:
+                pendentes.append((externa, valor))
+                continue
+            for nome_modulo in MODULOS_INTEGRADOS:
+                membros = interpretador.modulos.get(nome_modulo)
+                if isinstance(membros, dict) and membros.get(externa) is valor:
+                    modulos[externa] = nome_modulo
+                    break
+            else:
+                globais[externa] = valor
+
+    import pickle
+    pacote = (nome, motor, otimizar, declaracoes, globais, modulos)
+    try:
+        return pickle.dumps(pacote)
+    except Exception:
+        for externa, valor in globais.items():
+            try:
+                pickle.dumps(valor)
+            except Exception:
+                raise ErroTupa(f"'paralelo_mapear': o valor de '{externa}' não pode ser enviado a outro processo")
+        raise
+
+def executar_lote_paralelo(chave, pacote, lote):
+    """Executado no processo de trabalho: aplica a função do pacote a um lote
+
+    Devolve os resultados e o texto que 'mostrar' escreveu.
+    """
+    if INTERPRETADOR_PARALELO[0] != chave:
+        import pickle
+        nome, motor, otimizar, declaracoes, globais, modulos = pickle.loads(pacote)
+        interpretador = Interpretador(motor, otimizar)
+        for nome_global, valor in globais.items():
+            interpretador.definir(nome_global, valor)
+        for nome_global, nome_modulo in modulos.items():
+            interpretador.importar_modulo(nome_modulo, [nome_global])
+        interpretador.executar_programa(Programa(list(declaracoes.values())))
+        for nome_global, declaracao in declaracoes.items():
+            if declaracao.nome != nome_global:
+                interpretador.definir(nome_global, interpretador.obter(declaracao.nome))
+        # 'pegar' não tem de onde ler em um processo de trabalho
+        interpretador.entradas = iter(())
+        INTERPRETADOR_PARALELO[:] = [chave, (interpretador, interpretador.obter(nome))]
+
+    interpretador, funcao = INTERPRETADOR_PARALELO[1]
+    capturada = io.StringIO()
+    interpretador.saida = SaidaTupa(capturada)
+    resultados = [funcao(valor) for valor in lote]
+    interpretador.saida.descarregar()
+    return resultados, capturada.getvalue()
+
+def executor_paralelo(processos):
+    """ProcessPoolExecutor com a quantidade de processos indicada, mantido entre chamadas"""
+    executor = EXECUTORES_PARALELOS.get(processos)
+    if executor is None:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = EXECUTORES_PARALELOS[processos] = ProcessPoolExecutor(processos)
+    return executor
+
+def paralelo_mapear(funcao, valores, processos=None):
+    """Lista de funcao(x) para cada x, calculada em 'processos' processos (padrão: um por núcleo)
+
+    Os resultados e o que 'mostrar' escreveu nos outros processos chegam na
+    ordem dos elementos.
+    """
+    if processos is None:
+        processos = os.cpu_count() or 1
+    if type(processos) is not int or processos < 1:
+        raise ErroTupa(f"Quantidade de processos inválida: {processos}")
+    pacote = pacote_paralelo(funcao)
+    valores = list(valores)
+    if processos == 1 or len(valores) < 2:
+        return [funcao(valor) for valor in valores]
+
+    tamanho_lote = -(-len(valores) // (processos * LOTES_POR_PROCESSO))
+    lotes = [valores[inicio:inicio + tamanho_lote] for inicio in range(0, len(valores), tamanho_lote)]
+    CHAMADAS_PARALELAS[0] += 1
+    chave = (os.getpid(), CHAMADAS_PARALELAS[0])
+
+    saida = origem_funcao(funcao)[2].saida
+    resultados = []
+    try:
+        partes = executor_paralelo(processos).map(executar_lote_paralelo, [chave] * len(lotes),
+                                                  [pacote] * len(lotes), lotes)
+        for parte, texto in partes:
+            resultados.extend(parte)
+            for linha in texto.split('\n')[:-1]:
+                saida.escrever(linha)
+    except ErroTupa:
+        raise
+    except Exception as e:
+        raise ErroTupa(f"Erro em 'paralelo_mapear': {e}")
+    return resultados
+
+# Só a VM guarda o estado de execução fora da pilha do Python, o que permite
+# suspender uma tarefa no meio e retomá-la depois
+ERRO_VA_SEM_VM = "Tarefas 'vá' só estão disponíveis no motor 'vm'"
+
+# Variável de ambiente com diretórios extras de módulos, separados como no PATH
+VARIAVEL_CAMINHOS_MODULOS = 'TUPA_CAMINHO'
+
+def caminhos_modulos(diretorio_programa=None):
+    """Diretórios de busca de módulos: o do programa, os de TUPA_CAMINHO e o atual"""
+    caminhos = [] if diretorio_programa is None else [diretorio_programa]
+    caminhos += [caminho for caminho in os.environ.get(VARIAVEL_CAMINHOS_MODULOS, '').split(os.pathsep) if caminho]
+    caminhos.append(os.getcwd())
+    return caminhos
+
+# Tabelas compartilhadas por todos os interpretadores do processo, montadas uma
+# vez na importação. Nenhum interpretador as altera: cada um copia as integradas
+# para o início das suas globais e a tabela de módulos para self.modulos.
+# As funções integradas que são do próprio Python rodam sem camada extra em 'colecoes'
+FUNCOES_INTEGRADAS = {
+    'tamanho': len,
+    'tipo': lambda x: type(x).__name__,
+    'para_texto': str,
+    'para_numero': lambda x: float(x) if '.' in str(x) else int(x),
+    'para_lista': list,
+    'raiz': math.sqrt,
+    'vetor_real': lambda x=0: criar_vetor('d', x),
+    'vetor_inteiro': lambda x=0: criar_vetor('q', x),
+    'para_vetor': para_vetor,
+    'canal': Canal,
+    'selecionar': selecionar,
+    'paralelo_mapear': paralelo_mapear,
+}
+INDICES_INTEGRADAS = {nome: indice for indice, nome in enumerate(FUNCOES_INTEGRADAS)}
+
+MODULOS_INTEGRADOS = {
+    'matematica': {
+        'pi': math.pi,
+        'e': math.e,
+        'seno': math.sin,
+        'cosseno': math.cos,
+        'tangente': math.tan,
+        'raiz': math.sqrt,
+        'potencia': math.pow,
+        'absoluto': abs,
+        'teto': math.ceil,
+        'piso': math.floor,
+        'aleatorio': lambda: __import__('random').random(),
+        'aleatorio_entre': lambda min, max: __import__('random').randint(min, max)
+    },
+    'colecoes': MODULO_COLECOES,
+    # Carregado (uma vez por processo) só no primeiro 'usar matriz'
+    'matriz': carregar_modulo_matriz
+}
+
+def converter_entrada(valor):
+    """Converte a entrada do usuário para número quando possível"""
+    try:
+        if '.' in valor:
+            return float(valor)
+        return int(valor)
+    except ValueError:
+        # Mantém como string se não for um número
+        return valor
+
+# Instrumentação
+#
+# Ganchos de entrada e saída de funções, de declarações e de erros, e
+# contadores de execuções por espécie de nó e por ponto de chamada. Nada disso
+# fica no caminho rápido: sem instrumentação, os motores rodam o mesmo código
+# de sempre. Com ela, o percurso da árvore troca executar(), executar_corpo()
+# e avaliar() por versões instrumentadas; a VM compila o programa com
+# instruções OP_GANCHO e os fechamentos, com funções que envolvem as
+# compiladas. Funções e métodos são envolvidos quando definidos. Por isso a
+# instrumentação vale para o que for compilado ou definido depois de ativada.
+
+# Eventos de Interpretador.registrar_gancho e os argumentos de cada gancho:
+#   'entrada'     (nome, argumentos)   ao entrar em uma função ou método Tupã;
+#                                      em métodos, a instância vem primeiro
+#   'saida'       (nome, valor, erro)  ao sair dela; 'erro' é a exceção que a
+#                                      encerrou, ou None
+#   'declaracao'  (no)                 antes de executar cada declaração
+#   'excecao'     (erro, linha)        quando um erro surge, uma única vez, na
+#                                      linha da declaração mais interna
+EVENTOS_GANCHO = ('entrada', 'saida', 'declaracao', 'excecao')
+
+# Tipos de gancho nas constantes (tipo, nó, quantidade) de OP_GANCHO
+GANCHO_DECLARACAO = 0
+GANCHO_EXPRESSAO = 1
+GANCHO_ENTRADA = 2
+GANCHO_SAIDA = 3
+
+def rotulo_chamada(no):
+    """Rótulo 'nome@linha:coluna' do ponto de chamada de um ChamadaExpressao"""
+    funcao = no.funcao
+    if funcao.especie == NO_VARIAVEL_EXPRESSAO:
+        nome = funcao.nome
+    elif funcao.especie == NO_ATRIBUTO_EXPRESSAO:
+        nome = '.' + funcao.nome
+    else:
+        nome = '<expressão>'
+    return f"{nome}@{getattr(no, 'linha', None)}:{getattr(no, 'coluna', None)}"
+
+def funcao_instrumentada(instrumentacao, nome, funcao):
+    """Envolve uma função ou método Tupã dos motores Python com os ganchos de entrada e saída"""
+    def instrumentada(*args):
+        instrumentacao.entrada(nome, args)
+        try:
+            valor = funcao(*args)
+        except Exception as erro:
+            instrumentacao.saida(nome, None, erro)
+            raise
+        instrumentacao.saida(nome, valor, None)
+        return valor
+
+    if hasattr(funcao, 'origem'):
+        instrumentada.origem = funcao.origem
+    return instrumentada
+
+class Instrumentacao:
+    """Ganchos e contadores de execução de um Interpretador
+
+    Criada por Interpretador.instrumentar(). 'por_especie' conta as
+    execuções por nome de classe do nó e 'por_chamada', por ChamadaExpressao.
+    Os nós que um motor funde a outro, como o operando constante de 'i + 1'
+    na VM ou o atributo de uma chamada de método, não são contados à parte.
+    Com 'rastrear', a entrada e a saída de cada função vão para 'eventos',
+    no formato de rastro do Chrome.
+    """
+    def __init__(self, contar=False, rastrear=False):
+        from time import perf_counter
+        self.relogio = perf_counter
+        self.ganchos = {evento: [] for evento in EVENTOS_GANCHO}
+        self.contar = contar
+        self.rastrear = rastrear
+        self.por_especie = {}
+        self.por_chamada = {}
+        self.eventos = []
+        # O mesmo erro atravessa várias declarações até ser tratado
+        self.ultimo_erro = None
+
+    def declaracao(self, no):
+        """Uma declaração vai ser executada"""
+        if self.contar:
+            self.contar_no(no)
+        for gancho in self.ganchos['declaracao']:
+            gancho(no)
+
+    def contar_no(self, no):
+        """Conta uma execução do nó"""
+        nome = type(no).__name__
+        self.por_especie[nome] = self.por_especie.get(nome, 0) + 1
+        if no.especie == NO_CHAMADA_EXPRESSAO:
+            self.por_chamada[no] = self.por_chamada.get(no, 0) + 1
+
+    def entrada(self, nome, argumentos):
+        """Uma função Tupã começou"""
+        if self.rastrear:
+            self.eventos.append({'name': nome, 'ph': 'B', 'ts': self.relogio() * 1e6})
+        for gancho in self.ganchos['entrada']:
+            gancho(nome, argumentos)
+
+    def saida(self, nome, valor, erro):
+        """Uma função Tupã terminou, devolvendo 'valor' ou com 'erro'"""
+        if self.rastrear:
+            self.eventos.append({'name': nome, 'ph': 'E', 'ts': self.relogio() * 1e6})
+        for gancho in self.ganchos['saida']:
+            gancho(nome, valor, erro)
+
+    def excecao(self, erro, linha):
+        """Um erro surgiu na declaração da linha 'linha'"""
+        if erro is self.ultimo_erro or isinstance(erro, (BreakException, ContinueException, ReturnException,
+                                                           TrocaDeTarefa)):
+            return
+        self.ultimo_erro = erro
+        for gancho in self.ganchos['excecao']:
+            gancho(erro, linha)
+
+    def gancho_vm(self, constante, quadro, pilha):
+        """Executa a instrução OP_GANCHO da constante (tipo, nó, quantidade)"""
+        tipo, no, quantidade = constante
+        if tipo == GANCHO_DECLARACAO:
+            self.declaracao(no)
+        elif tipo == GANCHO_EXPRESSAO:
+            self.contar_no(no)
+        elif tipo == GANCHO_ENTRADA:
+            self.entrada(no.nome, tuple(quadro[:quantidade]))
+        else:
+            # O valor devolvido está no topo da pilha, logo antes de OP_DEVOLVER
+            self.saida(no.nome, pilha[-1], None)
+
+    def contagens(self):
+        """Contadores em um dicionário pronto para JSON, do mais executado ao menos"""
+        por_rotulo = {}
+        for no, quantidade in self.por_chamada.items():
+            rotulo = rotulo_chamada(no)
+            por_rotulo[rotulo] = por_rotulo.get(rotulo, 0) + quantidade
+        return {
+            'especies': dict(sorted(self.por_especie.items(), key=lambda item: item[1], reverse=True)),
+            'chamadas': dict(sorted(por_rotulo.items(), key=lambda item: item[1], reverse=True)),
+        }
+
+    def rastro_chrome(self):
+        """Rastro no formato de eventos do Chrome (chrome://tracing, Perfetto)
+
+        Cada entrada e saída de função é um evento 'B' ou 'E'; os contadores
+        vão ao final como eventos 'C'.
+        """
+        processo = os.getpid()
+        eventos = [dict(evento, pid=processo, tid=0) for evento in self.eventos]
+        instante = self.eventos[-1]['ts'] if self.eventos else self.relogio() * 1e6
+        contagens = self.contagens()
+        for nome, valores in (('nós', contagens['especies']), ('chamadas', contagens['chamadas'])):
+            if valores:
+                eventos.append({'name': nome, 'ph': 'C', 'ts': instante, 'pid': processo, 'tid': 0,
+                                'args': valores})
+        return {'traceEvents': eventos, 'displayTimeUnit': 'ms'}
+
+    def exportar_json(self, caminho):
+        """Grava contagens() em 'caminho'"""
+        import json
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump(self.contagens(), arquivo, ensure_ascii=False, indent=2)
+
+    def exportar_rastro(self, caminho):
+        """Grava rastro_chrome() em 'caminho'"""
+        import json
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump(self.rastro_chrome(), arquivo, ensure_ascii=False)
+
+class Interpretador:
+    """Interpretador para a linguagem Tupã"""
+    def __init__(self, motor=MOTOR_PADRAO, otimizar=True):
+        if motor not in MOTORES:
+            raise ErroTupa(f"Motor de execução desconhecido: '{motor}'")
+
+        self.motor = motor
+        self.otimizar = otimizar
+        # Se os módulos importados de arquivos usam o cache em disco de árvores
+        self.usar_cache = True
+        self.maquina_virtual = MaquinaVirtual(self)
+        # Globais ficam em uma tabela indexada; o Resolvedor converte nomes em índices.
+        # As funções integradas ocupam o início, copiado das tabelas do módulo
+        self.globais = list(FUNCOES_INTEGRADAS.values())
+        self.nomes_globais = list(FUNCOES_INTEGRADAS)
+        self.indices_globais = dict(INDICES_INTEGRADAS)
+        # Quadro da função em execução no percurso da árvore (None no nível principal)
+        self.quadro = None
+        # Caches em linha de todos os motores e última classe declarada com cada nome
+        self.caches = []
+        self.classes = {}
+        
+        # Módulos disponíveis, com os carregados de arquivos acrescentados na primeira importação
+        self.modulos = dict(MODULOS_INTEGRADOS)
+        # Diretórios onde 'usar nome' procura 'nome.tupa', depois dos módulos
+        # integrados; calculados na primeira busca se ninguém os definir antes
+        self.caminhos_modulos = None
+        # Globais que não vão para os membros quando este interpretador executa um
+        # módulo: as integradas e as trazidas por 'usar'
+        self.quantidade_integradas = len(FUNCOES_INTEGRADAS)
+        self.importados = set()
+        # Destino de 'mostrar' e valores de 'pegar' (None: o teclado)
+        self.saida = SaidaTupa()
+        self.entradas = None
+        # Ganchos e contadores; None mantém os motores sem instrumentação
+        self.instrumentacao = None
+
+    def indice_global(self, nome):
+        """Índice de uma variável global, reservando-o se ainda não existir"""
+        indice = self.indices_globais.get(nome)
+        if indice is None:
+            indice = len(self.globais)
+            self.globais.append(AUSENTE)
+            self.nomes_globais.append(nome)
+            self.indices_globais[nome] = indice
+        return indice
+
+    def definir(self, nome, valor):
+        """Define uma variável global"""
+        self.globais[self.indice_global(nome)] = valor
+
+    def obter(self, nome):
+        """Obtém o valor de uma variável global"""
+        indice = self.indices_globais.get(nome)
+        if indice is None or self.globais[indice] is AUSENTE:
+            raise ErroTupa(f"Variável não definida: '{nome}'")
+        return self.globais[indice]
+
+    def importar_modulo(self, nome, membros=None):
+        """Define como globais os membros do módulo de 'usar nome' (ou só os de 'membros')
+
+        Cada módulo é carregado uma única vez, na primeira importação, e fica em
+        self.modulos: um módulo registrado como função só então é chamado, o que
+        permite depender de bibliotecas opcionais como o NumPy, e um arquivo
+        'nome.tupa' só então é executado.
+        """
+        modulo = self.modulos.get(nome)
+        if modulo is None:
+            modulo = self.carregar_arquivo_modulo(nome)
+        elif modulo is EM_CARGA:
+            raise ErroTupa(f"Importação circular do módulo '{nome}'")
+        elif callable(modulo):
+            modulo = self.modulos[nome] = modulo()
+
+        if membros is None:
+            membros = modulo.keys()
+        for nome_membro in membros:
+            if nome_membro not in modulo:
+                raise ErroTupa(f"O módulo '{nome}' não tem o membro '{nome_membro}'")
+            self.definir(nome_membro, modulo[nome_membro])
+            self.importados.add(nome_membro)
+
+    def carregar_arquivo_modulo(self, nome):
+        """Executa o arquivo 'nome.tupa' em um interpretador próprio e devolve seus membros"""
+        if self.caminhos_modulos is None:
+            self.caminhos_modulos = caminhos_modulos()
+        for diretorio in self.caminhos_modulos:
+            caminho = os.path.join(diretorio, nome + '.tupa')
+            if os.path.isfile(caminho):
+                break
+        else:
+            raise ErroTupa(f"Módulo não encontrado: '{nome}'")
+
+        with open(caminho, 'r', encoding='utf-8') as arquivo:
+            codigo = arquivo.read()
+
+        # O módulo tem globais próprias, mas compartilha com quem o importa a
+        # tabela de módulos carregados, os caches em linha e a saída
+        modulo = Interpretador(self.motor, self.otimizar)
+        modulo.modulos = self.modulos
+        modulo.caches = self.caches
+        modulo.saida = self.saida
+        modulo.usar_cache = self.usar_cache
+        modulo.caminhos_modulos = [os.path.dirname(os.path.abspath(caminho))] + self.caminhos_modulos
+
+        self.modulos[nome] = EM_CARGA
+        try:
+            modulo.executar_programa(analisar_arquivo(caminho, codigo, self.usar_cache))
+        except BaseException:
+            del self.modulos[nome]
+            raise
+
+        membros = self.modulos[nome] = modulo.membros()
+        return membros
+
+    def membros(self):
+        """Globais definidas pelo programa executado, sem as integradas e as importadas"""
+        return {nome: valor for nome, valor in zip(self.nomes_globais[self.quantidade_integradas:],
+                                                   self.globais[self.quantidade_integradas:])
+                if valor is not AUSENTE and nome not in self.importados}
+
+    def carregar(self, endereco, nome):
+        """Lê a variável de um endereço resolvido"""
+        profundidade, slot = endereco
+        if profundidade == 0:
+            valor = self.quadro[slot]
+        elif profundidade > 0:
+            valor = self.quadro[-1][profundidade - 1][slot]
+        else:
+            valor = self.globais[slot]
+
+        if valor is AUSENTE:
+            raise ErroTupa(f"Variável não definida: '{nome}'")
+        return valor
+
+    def armazenar(self, endereco, valor):
+        """Escreve em uma variável local ou global já resolvida"""
+        profundidade, slot = endereco
+        if profundidade == 0:
+            self.quadro[slot] = valor
+        else:
+            self.globais[slot] = valor
+
+    def novo_cache(self, nome):
+        """Cria e registra o cache em linha de um ponto de acesso a 'nome'"""
+        cache = CacheEmLinha(nome)
+        self.caches.append(cache)
+        return cache
+
+    def registrar_classe(self, classe):
+        """Registra uma classe recém-declarada, invalidando a anterior de mesmo nome"""
+        anterior = self.classes.get(classe.nome)
+        if anterior is not None:
+            anterior.invalidar()
+        self.classes[classe.nome] = classe
+        return classe
+
+    def estatisticas_caches(self):
+        """Acertos e falhas dos caches em linha, no total e por nome"""
+        por_nome = {}
+        for cache in self.caches:
+            contagem = por_nome.setdefault(cache.nome, [0, 0])
+            contagem[0] += cache.acertos
+            contagem[1] += cache.falhas
+        return {
+            'pontos': len(self.caches),
+            'acertos': sum(acertos for acertos, _ in por_nome.values()),
+            'falhas': sum(falhas for _, falhas in por_nome.values()),
+            'por_nome': {nome: tuple(contagem) for nome, contagem in por_nome.items()},
+        }
+
+    def relatorio_caches(self):
+        """Texto com as taxas de acerto dos caches em linha"""
+        estatisticas = self.estatisticas_caches()
+        linhas = [f"Caches em linha: {estatisticas['pontos']} pontos de acesso"]
+        for nome, (acertos, falhas) in sorted(estatisticas['por_nome'].items()):
+            total = acertos + falhas
+            if total:
+                linhas.append(f"  {nome:<20} {acertos:>10} acertos {falhas:>6} falhas ({100 * acertos / total:.1f}%)")
+        total = estatisticas['acertos'] + estatisticas['falhas']
+        if total:
+            linhas.append(f"  {'total':<20} {estatisticas['acertos']:>10} acertos {estatisticas['falhas']:>6} falhas "
+                          f"({100 * estatisticas['acertos'] / total:.1f}%)")
+        return '\n'.join(linhas)
+
+    def cache_de(self, no):
+        """Cache em linha de um AtributoExpressao, criado na primeira avaliação"""
+        cache = no.cache
+        if cache is None:
+            cache = no.cache = self.novo_cache(no.nome)
+        return cache
+
+    def preparar(self, arvore):
+        """Resolve os escopos da árvore e, se habilitado, a otimiza"""
+        Resolvedor(self).resolver(arvore)
+        if self.otimizar:
+            Otimizador().otimizar(arvore)
+        return arvore
+
+    def executar_programa(self, arvore):
+        """Prepara e executa a árvore sintática no motor escolhido, sem tratar erros
+
+        Devolve o valor de um 'devolver' no nível principal, ou None. Ao
+        final, mesmo com erro, descarrega o que 'mostrar' deixou na saída.
+        """
+        self.preparar(arvore)
+        try:
+            if self.motor == 'vm':
+                codigo = Compilador(self.caches, self.instrumentacao).compilar(arvore)
+                try:
+                    return self.maquina_virtual.executar(codigo, None, escalonar=True)
+                finally:
+                    self.maquina_virtual.encerrar_tarefas()
+            elif self.motor == 'fechamentos':
+                programa = CompiladorFechamentos(self).compilar(arvore)
+                return programa()
+            else:
+                return self.executar(arvore)
+        finally:
+            self.saida.descarregar()
+
+    def executar_fonte(self, codigo, entradas=None, globais=None):
+        """Executa um trecho de código Tupã para quem embute o interpretador
+
+        'globais' é um dicionário de variáveis definidas antes da execução e
+        'entradas', uma sequência de valores lidos por 'pegar' no lugar do
+        teclado. Devolve um ResultadoExecucao com o valor de um 'devolver' no
+        nível principal e tudo o que 'mostrar' escreveu. Qualquer erro é
+        levantado como ErroTupa, com o que foi mostrado até ele em 'saida'.
+        As variáveis criadas continuam definidas para o próximo trecho;
+        redefinir() ou restaurar() as descartam. Os caches em linha do trecho
+        saem de 'caches' ao final, para que um interpretador que atende muitos
+        trechos não acumule um por ponto de acesso de cada um deles; as
+        funções definidas no trecho continuam usando os seus.
+        """
+        quantidade_caches = len(self.caches)
+        saida_anterior, entradas_anteriores = self.saida, self.entradas
+        capturada = io.StringIO()
+        self.saida = SaidaTupa(capturada)
+        self.entradas = None if entradas is None else iter(entradas)
+        try:
+            arvore = Parser(Lexer(codigo).iter_tokens()).analisar()
+            if globais:
+                for nome, valor in globais.items():
+                    self.definir(nome, valor)
+            valor = self.executar_programa(arvore)
+        except Exception as e:
+            # Como em interpretar(): erros do Python viram erros da linguagem
+            if isinstance(e, ErroTupa):
+                erro = e
+            elif isinstance(e, RecursionError):
+                erro = ErroTupa(f"Limite de recursão do motor '{self.motor}' excedido; "
+                                "use o motor 'vm' para recursões profundas")
+            else:
+                erro = ErroTupa(str(e))
+            erro.saida = capturada.getvalue()
+            if erro is e:
+                raise
+            raise erro from e
+        finally:
+            self.saida, self.entradas = saida_anterior, entradas_anteriores
+            del self.caches[quantidade_caches:]
+        return ResultadoExecucao(valor, capturada.getvalue())
+
+    def ler_entrada(self):
+        """Valor lido por 'pegar': a próxima das entradas dadas ou uma linha do teclado"""
+        if self.entradas is None:
+            # Quem digita precisa ver antes o que foi mostrado
+            self.saida.descarregar()
+            return converter_entrada(input())
+        valor = next(self.entradas, AUSENTE)
+        if valor is AUSENTE:
+            raise ErroTupa("Não há mais entradas para 'pegar'")
+        return converter_entrada(valor) if isinstance(valor, str) else valor
+
+    def instantaneo(self):
+        """Cópia do estado global (variáveis, classes e caches) para restaurar() depois"""
+        return (list(self.globais), list(self.nomes_globais), dict(self.indices_globais),
+                set(self.importados), dict(self.classes), len(self.caches))
+
+    def restaurar(self, instantaneo):
+        """Volta o estado global ao de um instantaneo()
+
+        As tabelas são alteradas no lugar, pois motores e funções já compiladas
+        guardam referências a elas; os caches em linha criados depois do
+        instantâneo são descartados. Os módulos carregados continuam em memória.
+        """
+        globais, nomes_globais, indices_globais, importados, classes, quantidade_caches = instantaneo
+        self.globais[:] = globais
+        self.nomes_globais[:] = nomes_globais
+        self.indices_globais.clear()
+        self.indices_globais.update(indices_globais)
+        self.importados.clear()
+        self.importados.update(importados)
+        self.classes.clear()
+        self.classes.update(classes)
+        del self.caches[quantidade_caches:]
+
+    def redefinir(self):
+        """Volta o estado global ao de um interpretador recém-criado, mantendo os módulos carregados"""
+        self.globais[:] = FUNCOES_INTEGRADAS.values()
+        self.nomes_globais[:] = FUNCOES_INTEGRADAS
+        self.indices_globais.clear()
+        self.indices_globais.update(INDICES_INTEGRADAS)
+        self.importados.clear()
+        self.classes.clear()
+        self.caches.clear()
+        self.quadro = None
+
+    def instrumentar(self, contar=True, rastrear=False):
+        """Ativa a instrumentação e devolve a Instrumentacao com os contadores
+
+        Com 'contar', conta as execuções de cada espécie de nó e de cada ponto
+        de chamada; com 'rastrear', guarda a entrada e a saída das funções para
+        o rastro do Chrome. Vale para o que for compilado ou definido depois.
+        """
+        if self.instrumentacao is None:
+            self.instrumentacao = Instrumentacao()
+        self.instrumentacao.contar = contar
+        self.instrumentacao.rastrear = rastrear
+        self.trocar_despacho()
+        return self.instrumentacao
+
+    def desinstrumentar(self):
+        """Desativa a instrumentação e devolve a Instrumentacao usada até aqui, ou None"""
+        instrumentacao, self.instrumentacao = self.instrumentacao, None
+        self.trocar_despacho()
+        return instrumentacao
+
+    def registrar_gancho(self, evento, gancho):
+        """Chama 'gancho' a cada 'evento' de EVENTOS_GANCHO, ativando a instrumentação"""
+        if evento not in EVENTOS_GANCHO:
+            raise ErroTupa(f"Evento de instrumentação desconhecido: '{evento}'")
+        if self.instrumentacao is None:
+            self.instrumentar(contar=False)
+        self.instrumentacao.ganchos[evento].append(gancho)
+
+    def remover_gancho(self, evento, gancho):
+        """Deixa de chamar 'gancho' a cada 'evento'; a instrumentação continua ativa"""
+        if self.instrumentacao is not None and gancho in self.instrumentacao.ganchos.get(evento, ()):
+            self.instrumentacao.ganchos[evento].remove(gancho)
+
+    def trocar_despacho(self):
+        """Põe ou tira as versões instrumentadas do percurso da árvore
+
+        Atributos da instância escondem os métodos da classe; sem eles, as
+        chamadas self.executar() e self.avaliar() vão direto aos originais.
+        """
+        instrumentacao = self.instrumentacao
+        if instrumentacao is None:
+            for nome in ('executar', 'executar_corpo', 'avaliar'):
+                self.__dict__.pop(nome, None)
+            return
+        self.executar = self.executar_instrumentado
+        self.executar_corpo = self.executar_corpo_instrumentado
+        if instrumentacao.contar:
+            self.avaliar = self.avaliar_contado
+        else:
+            self.__dict__.pop('avaliar', None)
+
+    def executar_instrumentado(self, no):
+        """executar() com os ganchos de declaração e de erro"""
+        instrumentacao = self.instrumentacao
+        if no.especie != NO_PROGRAMA:
+            instrumentacao.declaracao(no)
+        try:
+            return Interpretador.executar(self, no)
+        except Exception as erro:
+            instrumentacao.excecao(erro, getattr(no, 'linha', None))
+            raise
+
+    def executar_corpo_instrumentado(self, instrucoes):
+        """executar_corpo() que passa também o 'devolver' do corpo por executar()"""
+        try:
+            for instrucao in instrucoes:
+                self.executar(instrucao)
+        except ReturnException as retorno:
+            return retorno.valor
+        return None
+
+    def avaliar_contado(self, no):
+        """avaliar() que conta cada nó avaliado"""
+        self.instrumentacao.contar_no(no)
+        return Interpretador.avaliar(self, no)
+
+    def interpretar(self, arvore):
+        """Interpreta a árvore sintática"""
+        try:
+            self.executar_programa(arvore)
+        except ErroTupa as e:
+            print(f"Erro: {e}")
+        except RecursionError:
+            # Só a VM tem pilha de chamadas própria; os outros motores usam a do Python
+            print(f"Erro: Limite de recursão do motor '{self.motor}' excedido; use o motor 'vm' para recursões profundas")
+        except Exception as e:
+            print(f"Erro interno: {e}")
+
+    def executar(self, no):
+        """Executa um nó da árvore sintática"""
+        especie = no.especie
+        
+        # Programa
+        if especie == NO_PROGRAMA:
+            try:
+                for instrucao in no.instrucoes:
+                    self.executar(instrucao)
+            except ReturnException as retorno:
+                # 'devolver' fora de uma função encerra o programa, como na VM
+                return retorno.valor
+        
+        # Declarações
+        elif especie == NO_DECLARACAO_VARIAVEL:
+            valor = self.avaliar(no.valor)
+            self.armazenar(no.endereco, valor)
+        
+        elif especie == NO_DECLARACAO_MOSTRAR:
+            valor = self.avaliar(no.expressao)
+            self.saida.escrever(valor)
+        
+        elif especie == NO_DECLARACAO_PEGAR:
+            self.armazenar(no.endereco, self.ler_entrada())
+        
+        elif especie == NO_DECLARACAO_SE:
+            if self.avaliar(no.condicao):
+                for instrucao in no.bloco_entao:
+                    self.executar(instrucao)
+            else:
+                for instrucao in no.bloco_senao:
                     self.executar(instrucao)
         
-        elif tipo == 'DeclaracaoEnquanto':
-            while self.avaliar(no['condicao']):
+        elif especie == NO_DECLARACAO_ENQUANTO:
+            while self.avaliar(no.condicao):
+                try:
+                    for instrucao in no.corpo:
+                        self.executar(instrucao)
+                except BreakException:
+                    break
+                except ContinueException:
+                    continue
+        
+        elif especie == NO_DECLARACAO_PARA:
+            inicio = self.avaliar(no.inicio)
+            self.armazenar(no.endereco, inicio)
+            fim = self.avaliar(no.fim)
+            passo = 1 if no.passo is None else self.avaliar(no.passo)
+            
+            if no.contador_fixo:
+                # Caminho rápido: o corpo não altera a variável, que vai direto ao slot
+                profundidade, slot = no.endereco
+                variaveis = self.quadro if profundidade == 0 else self.globais
+                corpo = no.corpo
+                executar = self.executar
+                for valor in intervalo(inicio, fim, passo):
+                    variaveis[slot] = valor
+                    for instrucao in corpo:
+                        executar(instrucao)
+            else:
+                # O corpo pode alterar a variável; a volta seguinte parte do valor alterado
+                valor = inicio
+                while dentro_do_intervalo(valor, fim, passo):
+                    try:
+                        for instrucao in no.corpo:
+                            self.executar(instrucao)
+                    except BreakException:
+                        break
+                    except ContinueException:
+                        pass
+                    
+                    valor = self.carregar(no.endereco, no.variavel) + passo
+                    if not dentro_do_intervalo(valor, fim, passo):
+                        break
+                    self.armazenar(no.endereco, valor)
+        
+        elif especie == NO_DECLARACAO_PARA_CADA:
+            colecao = self.avaliar(no.colecao)
+            
+            for item in colecao:
+                self.armazenar(no.endereco, item)
+                
                 try:
-                    for instrucao in no['corpo']:
+                    for instrucao in no.corpo:
                         self.executar(instrucao)
                 except BreakException:
                     break
                 except ContinueException:
                     continue
         
-        elif tipo == 'DeclaracaoPara':
-            self.iniciar_escopo()
-            inicio = self.avaliar(no['inicio'])
-            fim = self.avaliar(no['fim'])
+        elif especie == NO_DECLARACAO_FUNCAO:
+            # Quadros envolventes capturados na definição (escopo léxico)
+            envolventes = () if self.quadro is None else (self.quadro,) + self.quadro[-1]
+            tamanho = len(no.nomes_locais)
+            quantidade_parametros = len(no.parametros)
+            
+            def funcao(*args):
+                quadro_anterior = self.quadro
+                self.quadro = montar_quadro(tamanho, quantidade_parametros, args, envolventes)
+                
+                try:
+                    return self.executar_corpo(no.corpo)
+                finally:
+                    self.quadro = quadro_anterior
+            
+            # Usada por paralelo_mapear para recriar a função em outro processo
+            funcao.origem = (no, envolventes, self)
+            if self.instrumentacao is not None:
+                funcao = funcao_instrumentada(self.instrumentacao, no.nome, funcao)
+            self.armazenar(no.endereco, funcao)
+        
+        elif especie == NO_DECLARACAO_DEVOLVER:
+            # Só chega aqui o 'devolver' aninhado em outro bloco; o do nível
+            # do corpo é tratado por executar_corpo() sem exceção
+            raise ReturnException(self.avaliar(no.valor))
+        
+        elif especie == NO_DECLARACAO_CLASSE:
+            # Atributos e métodos enxergam o escopo onde a classe foi declarada
+            quadro_definicao = self.quadro
+            envolventes = () if quadro_definicao is None else (quadro_definicao,) + quadro_definicao[-1]
+            
+            interpretador = self
+            
+            def criar_metodo(metodo):
+                tamanho = len(metodo.nomes_locais)
+                quantidade = len(metodo.parametros) + 1
+                
+                def executar_metodo(instancia, *args):
+                    # O 'self' ocupa o primeiro slot do quadro do método
+                    quadro_anterior = interpretador.quadro
+                    interpretador.quadro = montar_quadro(tamanho, quantidade, (instancia,) + args, envolventes)
+                    
+                    try:
+                        return interpretador.executar_corpo(metodo.corpo)
+                    finally:
+                        interpretador.quadro = quadro_anterior
+                
+                return executar_metodo
+            
+            # Os métodos são criados uma única vez por classe e compartilhados
+            # pelas instâncias
+            metodos = {metodo.nome: criar_metodo(metodo) for metodo in no.metodos}
+            if self.instrumentacao is not None:
+                metodos = {nome: funcao_instrumentada(self.instrumentacao, nome, metodo)
+                           for nome, metodo in metodos.items()}
+            
+            def criar_inicializador(expressao):
+                def inicializar():
+                    # Valores iniciais são avaliados no escopo onde a classe foi declarada
+                    quadro_anterior = interpretador.quadro
+                    interpretador.quadro = quadro_definicao
+                    try:
+                        return interpretador.avaliar(expressao)
+                    finally:
+                        interpretador.quadro = quadro_anterior
+                
+                return inicializar
+            
+            atributos = []
+            for atributo in no.atributos:
+                if atributo.valor.especie == NO_LITERAL_EXPRESSAO:
+                    atributos.append((atributo.nome, atributo.valor.valor, None))
+                else:
+                    atributos.append((atributo.nome, None, criar_inicializador(atributo.valor)))
+            
+            self.armazenar(no.endereco, self.registrar_classe(ClasseTupa(no.nome, atributos, metodos)))
+        
+        elif especie == NO_DECLARACAO_TENTAR:
+            try:
+                for instrucao in no.bloco_tentar:
+                    self.executar(instrucao)
+            except ReturnException:
+                raise
+            except Exception as e:
+                self.armazenar(no.endereco, str(e))
+                
+                for instrucao in no.bloco_pegar:
+                    self.executar(instrucao)
+        
+        elif especie == NO_DECLARACAO_USAR:
+            self.importar_modulo(no.nome, no.membros)
+        
+        elif especie == NO_DECLARACAO_VA:
+            raise ErroTupa(ERRO_VA_SEM_VM)
+        
+        elif especie == NO_EXPRESSAO_DECLARACAO:
+            self.avaliar(no.expressao)
+        
+        else:
+            raise ErroTupa(f"Tipo de nó desconhecido: {no.tipo}")
+
+    def executar_corpo(self, instrucoes):
+        """Executa o corpo de uma função ou método e devolve o valor de 'devolver' (ou None)"""
+        try:
+            for instrucao in instrucoes:
+                if instrucao.especie == NO_DECLARACAO_DEVOLVER:
+                    return self.avaliar(instrucao.valor)
+                self.executar(instrucao)
+        except ReturnException as retorno:
+            return retorno.valor
+        return None
+
+    def avaliar(self, no):
+        """Avalia uma expressão"""
+        especie = no.especie
+        
+        # Expressões
+        if especie == NO_LITERAL_EXPRESSAO:
+            return no.valor
+        
+        elif especie == NO_VARIAVEL_EXPRESSAO:
+            return self.carregar(no.endereco, no.nome)
+        
+        elif especie == NO_AGRUPAR_EXPRESSAO:
+            return self.avaliar(no.expressao)
+        
+        elif especie == NO_UNARIA_EXPRESSAO:
+            direita = self.avaliar(no.direita)
+            
+            if no.operador == '-':
+                return -direita
+            elif no.operador == '!':
+                return not direita
+        
+        elif especie == NO_BINARIA_EXPRESSAO:
+            esquerda = self.avaliar(no.esquerda)
+            direita = self.avaliar(no.direita)
+            
+            if no.operador == '+':
+                return esquerda + direita
+            elif no.operador == '-':
+                return esquerda - direita
+            elif no.operador == '*':
+                return esquerda * direita
+            elif no.operador == '/':
+                return esquerda / direita
+            elif no.operador == '==':
+                return esquerda == direita
+            elif no.operador == '!=':
+                return esquerda != direita
+            elif no.operador == '<':
+                return esquerda < direita
+            elif no.operador == '<=':
+                return esquerda <= direita
+            elif no.operador == '>':
+                return esquerda > direita
+            elif no.operador == '>=':
+                return esquerda >= direita
+        
+        elif especie == NO_LOGICA_EXPRESSAO:
+            esquerda = self.avaliar(no.esquerda)
+            
+            if no.operador == 'e':
+                return esquerda and self.avaliar(no.direita)
+            elif no.operador == 'ou':
+                return esquerda or self.avaliar(no.direita)
+        
+        elif especie == NO_ATRIBUICAO_EXPRESSAO:
+            valor = self.avaliar(no.valor)
+            self.armazenar(no.endereco, valor)
+            return valor
+        
+        elif especie == NO_ATRIBUICAO_INDEXACAO:
+            objeto = self.avaliar(no.objeto)
+            indice = self.avaliar(no.indice)
+            valor = self.avaliar(no.valor)
+            
+            try:
+                objeto[indice] = valor
+            except (IndexError, TypeError, OverflowError) as e:
+                raise erro_de_atribuicao(objeto, indice, valor, e)
+            return valor
+        
+        elif especie == NO_ATRIBUICAO_ATRIBUTO:
+            objeto = self.avaliar(no.objeto)
+            valor = self.avaliar(no.valor)
+            
+            setattr(objeto, no.nome, valor)
+            return valor
+        
+        elif especie == NO_CHAMADA_EXPRESSAO:
+            if no.funcao.especie == NO_ATRIBUTO_EXPRESSAO:
+                # Métodos de instâncias Tupã são chamados direto da função
+                # guardada no cache em linha, sem criar um método vinculado
+                objeto = self.avaliar(no.funcao.objeto)
+                cache = no.funcao.cache or self.cache_de(no.funcao)
+                if type(objeto) is cache.tipo:
+                    cache.acertos += 1
+                    metodo = cache.metodo
+                elif isinstance(objeto, InstanciaTupa):
+                    metodo = cache.resolver(objeto)
+                else:
+                    metodo = None
+                if metodo is not None:
+                    return metodo(objeto, *[self.avaliar(arg) for arg in no.argumentos])
+                try:
+                    funcao = getattr(objeto, cache.nome)
+                except AttributeError:
+                    raise ErroTupa(f"Atributo não encontrado: '{cache.nome}'")
+            else:
+                funcao = self.avaliar(no.funcao)
+            argumentos = [self.avaliar(arg) for arg in no.argumentos]
+            
+            if not callable(funcao):
+                raise ErroTupa(f"Não é possível chamar um não-callable: {funcao}")
             
-            self.definir(no['variavel'], inicio)
+            return funcao(*argumentos)
+        
+        elif especie == NO_INDEXACAO_EXPRESSAO:
+            objeto = self.avaliar(no.objeto)
+            indice = self.avaliar(no.indice)
             
             try:
-                while self.obter(no['variavel']) <= fim:
+                return objeto[indice]
+            except (IndexError, KeyError):
+                raise ErroTupa(f"Índice inválido: {indice}")
+            except TypeError:
+                raise ErroTupa(f"Objeto não indexável: {objeto}")
+        
+        elif especie == NO_ATRIBUTO_EXPRESSAO:
+            objeto = self.avaliar(no.objeto)
+            cache = no.cache or self.cache_de(no)
+            if type(objeto) is cache.tipo and cache.metodo is None:
+                # Atributo: o slot é lido direto pelo Python
+                cache.acertos += 1
+                return getattr(objeto, no.nome)
+            return ler_atributo(objeto, cache)
+        
+        elif especie == NO_LISTA_EXPRESSAO:
+            elementos = [self.avaliar(elem) for elem in no.elementos]
+            return elementos
+        
+        elif especie == NO_DICIONARIO_EXPRESSAO:
+            dicionario = {}
+            for chave_no, valor_no in no.pares:
+                chave = self.avaliar(chave_no)
+                valor = self.avaliar(valor_no)
+                dicionario[chave] = valor
+            return dicionario
+        
+        else:
+            raise ErroTupa(f"Tipo de expressão desconhecido: {no.tipo}")
+
+# Linhas de 'mostrar' acumuladas antes de cada escrita no destino
+LINHAS_BUFFER_SAIDA = 8192
+
+class SaidaTupa:
+    """Destino das linhas de 'mostrar', com buffer
+
+    As linhas se acumulam em uma lista e vão para o destino em uma única
+    escrita a cada 'limite' linhas, quando o programa termina, antes de
+    'pegar' ler do teclado ou quando descarregar() é chamado. Sem destino,
+    escreve no sys.stdout do momento da escrita; em um terminal, o padrão é
+    escrever cada linha assim que mostrada, como o print.
+    """
+    __slots__ = ('destino', 'limite', 'linhas')
+
+    def __init__(self, destino=None, limite=None):
+        if limite is None:
+            limite = 1 if destino is None and terminal(sys.stdout) else LINHAS_BUFFER_SAIDA
+        self.destino = destino
+        self.limite = limite
+        self.linhas = []
+
+    def escrever(self, valor):
+        """Acrescenta uma linha com o valor, como 'mostrar'"""
+        linhas = self.linhas
+        linhas.append(str(valor))
+        if len(linhas) >= self.limite:
+            self.descarregar()
+
+    def descarregar(self):
+        """Escreve no destino as linhas acumuladas"""
+        if self.linhas:
+            texto = '\n'.join(self.linhas) + '\n'
+            self.linhas.clear()
+            (self.destino or sys.stdout).write(texto)
+
+def terminal(arquivo):
+    """Indica se o arquivo é um terminal interativo"""
+    try:
+        return arquivo.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+class ResultadoExecucao:
+    """Resultado de Interpretador.executar_fonte: valor devolvido e saída de 'mostrar'"""
+    __slots__ = ('valor', 'saida')
+
+    def __init__(self, valor, saida):
+        self.valor = valor
+        self.saida = saida
+
+    def __repr__(self):
+        return f"ResultadoExecucao(valor={self.valor!r}, saida={self.saida!r})"
+
+class ReservatorioInterpretadores:
+    """Reservatório de interpretadores prontos, compartilhado entre threads
+
+    Cada interpretador atende a uma thread por vez. Ao ser devolvido, ele tem
+    o estado global redefinido, mas continua com os módulos já carregados,
+    então o próximo trecho não paga a criação nem as importações.
+    """
+    def __init__(self, tamanho=4, motor=MOTOR_PADRAO, otimizar=True):
+        import queue
+        if tamanho < 1:
+            raise ErroTupa(f"Tamanho de reservatório inválido: {tamanho}")
+        self.tamanho = tamanho
+        self.vazio = queue.Empty
+        # Pilha: o interpretador usado por último, com caches mais quentes, sai primeiro
+        self.livres = queue.LifoQueue()
+        for _ in range(tamanho):
+            self.livres.put(Interpretador(motor, otimizar))
+
+    def obter(self, tempo_limite=None):
+        """Retira um interpretador livre, esperando até 'tempo_limite' segundos se preciso"""
+        try:
+            return self.livres.get(timeout=tempo_limite)
+        except self.vazio:
+            raise ErroTupa("Nenhum interpretador livre no reservatório")
+
+    def devolver(self, interpretador):
+        """Redefine o interpretador e o põe de volta à disposição"""
+        interpretador.redefinir()
+        self.livres.put(interpretador)
+
+    def executar_fonte(self, codigo, entradas=None, globais=None, tempo_limite=None):
+        """Executa um trecho em um interpretador livre; veja Interpretador.executar_fonte"""
+        interpretador = self.obter(tempo_limite)
+        try:
+            return interpretador.executar_fonte(codigo, entradas, globais)
+        finally:
+            self.devolver(interpretador)
+
+class BreakException(Exception):
+    """Exceção usada para implementar o comando 'break'"""
+    pass
+
+class ContinueException(Exception):
+    """Exceção usada para implementar o comando 'continue'"""
+    pass
+
+class ReturnException(Exception):
+    """Exceção usada para implementar o comando 'devolver' dentro de blocos aninhados"""
+    def __init__(self, valor):
+        super().__init__()
+        self.valor = valor
+
+# Motivos de uma TrocaDeTarefa: a fatia de tempo acabou, a tarefa espera um
+# canal (e recebe o resultado ao acordar), espera e depois repete a instrução
+# atual, ou terminou
+TROCA_FATIA = 0
+TROCA_BLOQUEIO = 1
+TROCA_REPETIR = 2
+TROCA_FIM = 3
+
+class TrocaDeTarefa(Exception):
+    """Exceção usada pela VM para suspender a tarefa atual e executar outra"""
+    def __init__(self, motivo):
+        super().__init__()
+        self.motivo = motivo
+
+# Compilador de bytecode e máquina virtual de pilha
+#
+# O compilador percorre a árvore produzida pelo Parser uma única vez e gera uma
+# sequência plana de inteiros no formato [opcode, argumento, opcode, argumento, ...].
+# Constantes e nomes ficam em tabelas separadas, referenciadas pelo argumento;
+# variáveis locais e globais são acessadas pelo slot definido pelo Resolvedor.
+# OP_OBTER_ATRIBUTO e OP_CHAMAR_METODO referenciam o cache em linha do ponto de
+# acesso, na tabela 'caches' do objeto de código, que guarda também o nome.
+# Os opcodes estão numerados (e testados na máquina virtual) em ordem aproximada
+# de frequência, já que o despacho é uma cadeia de comparações.
+
+OP_CARREGAR_LOCAL = 0
+OP_CARREGAR_GLOBAL = 1
+OP_CONSTANTE = 2
+OP_DEFINIR_LOCAL = 3
+OP_DEFINIR_GLOBAL = 4
+OP_BINARIO = 5
+OP_BINARIO_CONSTANTE = 6
+OP_CARREGAR_LOCAL_BINARIO_CONSTANTE = 7
+OP_CARREGAR_GLOBAL_BINARIO_CONSTANTE = 8
+OP_SALTAR_SE_FALSO = 9
+OP_SALTAR = 10
+OP_CHAMAR = 11
+OP_CHAMAR_METODO = 12
+OP_DEVOLVER = 13
+OP_DESCARTAR = 14
+OP_INDEXAR = 15
+OP_OBTER_ATRIBUTO = 16
+OP_SALTAR_SE_FORA_DO_INTERVALO = 17
+OP_PROXIMO = 18
+OP_CARREGAR_EXTERNO = 19
+OP_DUPLICAR = 20
+OP_ATRIBUIR_INDICE = 21
+OP_ATRIBUIR_ATRIBUTO = 22
+OP_SALTAR_SE_FALSO_OU_MANTER = 23
+OP_SALTAR_SE_VERDADEIRO_OU_MANTER = 24
+OP_NEGATIVO = 25
+OP_NAO = 26
+OP_CRIAR_LISTA = 27
+OP_CRIAR_DICIONARIO = 28
+OP_MOSTRAR = 29
+OP_OBTER_ITERADOR = 30
+OP_DEFINIR_FUNCAO = 31
+OP_DEFINIR_CLASSE = 32
+OP_INICIAR_TENTAR = 33
+OP_ENCERRAR_TENTAR = 34
+OP_PEGAR = 35
+OP_USAR = 36
+OP_AVANCAR_CONTADOR = 37
+OP_INTERVALO = 38
+OP_VA = 39
+# Só no código compilado com instrumentação; veja Instrumentacao.gancho_vm
+OP_GANCHO = 40
+
+NOMES_OPCODES = {valor: nome[3:] for nome, valor in list(globals().items()) if nome.startswith('OP_')}
+
+# Operadores binários: o argumento de OP_BINARIO é o índice nesta tabela
+OPERADORES_BINARIOS = ['+', '-', '*', '/', '<', '<=', '>', '>=', '==', '!=']
+FUNCOES_BINARIAS = [
+    operator.add, operator.sub, operator.mul, operator.truediv,
+    operator.lt, operator.le, operator.gt, operator.ge,
+    operator.eq, operator.ne
+]
+
+class CodigoObjeto:
+    """Bytecode de um programa, função ou expressão, com suas tabelas"""
+    def __init__(self, nome, quantidade_parametros=0, nomes_locais=None):
+        self.nome = nome
+        self.quantidade_parametros = quantidade_parametros
+        self.nomes_locais = nomes_locais or []
+        self.instrucoes = []
+        self.constantes = []
+        self.nomes = []
+        self.caches = []
+        # DeclaracaoFuncao de origem, usada por paralelo_mapear
+        self.declaracao = None
+        # Tabela de linhas: a partir de pcs_linhas[i], as instruções vêm da linha linhas[i]
+        self.pcs_linhas = []
+        self.linhas = []
+        # Instrumentacao com que o código foi compilado, ou None
+        self.instrumentacao = None
+
+    def linha(self, pc):
+        """Linha do código-fonte da instrução em 'pc', ou None"""
+        from bisect import bisect_right
+        indice = bisect_right(self.pcs_linhas, pc) - 1
+        return self.linhas[indice] if indice >= 0 else None
+
+    def desmontar(self):
+        """Retorna uma representação legível do bytecode"""
+        linhas = []
+        for pc in range(0, len(self.instrucoes), 2):
+            op = self.instrucoes[pc]
+            arg = self.instrucoes[pc + 1]
+            if op in (OP_CARREGAR_LOCAL, OP_DEFINIR_LOCAL):
+                detalhe = self.nomes_locais[arg]
+            elif op == OP_ATRIBUIR_ATRIBUTO:
+                detalhe = self.nomes[arg]
+            elif op == OP_OBTER_ATRIBUTO:
+                detalhe = self.caches[arg].nome
+            elif op == OP_CHAMAR_METODO:
+                detalhe = f"{self.caches[arg >> 8].nome} ({arg & 255} argumentos)"
+            elif op == OP_BINARIO:
+                detalhe = OPERADORES_BINARIOS[arg]
+            elif op == OP_BINARIO_CONSTANTE:
+                detalhe = f"{OPERADORES_BINARIOS[arg & 15]} {self.constantes[arg >> 4]!r}"
+            elif op in (OP_CARREGAR_LOCAL_BINARIO_CONSTANTE, OP_CARREGAR_GLOBAL_BINARIO_CONSTANTE):
+                slot, valor, operacao = self.constantes[arg]
+                detalhe = f"[{slot}] {OPERADORES_BINARIOS[FUNCOES_BINARIAS.index(operacao)]} {valor!r}"
+            elif op in (OP_CONSTANTE, OP_CARREGAR_EXTERNO, OP_DEFINIR_FUNCAO, OP_DEFINIR_CLASSE, OP_USAR):
+                detalhe = repr(self.constantes[arg])
+            elif op == OP_GANCHO:
+                tipo, no, _ = self.constantes[arg]
+                detalhe = f"{('declaração', 'expressão', 'entrada', 'saída')[tipo]} {type(no).__name__}"
+            else:
+                detalhe = arg
+            linhas.append(f"{pc:5d} {NOMES_OPCODES[op]:<36} {detalhe}")
+        return '\n'.join(linhas)
+
+    def __repr__(self):
+        return f"<código {self.nome}>"
+
+class ClasseCompilada:
+    """Descrição compilada de uma classe: atributos (nome, constante, código) e métodos"""
+    def __init__(self, nome, atributos, metodos):
+        self.nome = nome
+        self.atributos = atributos
+        self.metodos = metodos
+
+    def __repr__(self):
+        return f"<classe {self.nome}>"
+
+class Compilador:
+    """Compila a árvore sintática (já resolvida) para bytecode
+
+    Os caches em linha criados são acrescentados também a 'caches', quando
+    informada, para que o Interpretador possa relatar seus acertos e falhas.
+    Com 'instrumentacao', emite OP_GANCHO antes de cada declaração, na
+    entrada e na saída das funções e, se ela conta, antes de cada expressão.
+    """
+    def __init__(self, caches=None, instrumentacao=None):
+        self.caches = [] if caches is None else caches
+        self.instrumentacao = instrumentacao
+        self.codigo = None
+        self.indices_constantes = {}
+        self.indices_nomes = {}
+
+    def compilar(self, arvore):
+        """Compila um nó Programa"""
+        return self.compilar_corpo(CodigoObjeto('<programa>'), arvore.instrucoes)
+
+    def compilar_funcao(self, no, com_self):
+        """Compila uma função ou método; o 'self' conta como primeiro parâmetro"""
+        quantidade = len(no.parametros) + (1 if com_self else 0)
+        codigo = CodigoObjeto(no.nome, quantidade, no.nomes_locais)
+        codigo.declaracao = no
+        return self.compilar_corpo(codigo, no.corpo)
+
+    def compilar_corpo(self, codigo, instrucoes):
+        """Compila uma lista de declarações no objeto de código indicado"""
+        anterior = (self.codigo, self.indices_constantes, self.indices_nomes)
+        self.codigo = codigo
+        self.indices_constantes = {}
+        self.indices_nomes = {}
+        try:
+            if self.instrumentacao is not None:
+                codigo.instrumentacao = self.instrumentacao
+                if codigo.declaracao is not None:
+                    self.gancho(GANCHO_ENTRADA, codigo.declaracao, codigo.quantidade_parametros)
+            self.bloco(instrucoes)
+            # Todo código termina devolvendo nulo caso não encontre 'devolver'
+            self.emitir(OP_CONSTANTE, self.constante(None))
+            self.devolver()
+            return self.codigo
+        finally:
+            self.codigo, self.indices_constantes, self.indices_nomes = anterior
+
+    def compilar_expressao_isolada(self, nome, expressao):
+        """Compila uma expressão que devolve o seu próprio valor no quadro atual"""
+        anterior = (self.codigo, self.indices_constantes, self.indices_nomes)
+        self.codigo = CodigoObjeto(nome, 0, anterior[0].nomes_locais)
+        self.codigo.instrumentacao = self.instrumentacao
+        self.indices_constantes = {}
+        self.indices_nomes = {}
+        try:
+            self.expressao(expressao)
+            self.emitir(OP_DEVOLVER)
+            return self.codigo
+        finally:
+            self.codigo, self.indices_constantes, self.indices_nomes = anterior
+
+    def emitir(self, op, arg=0):
+        """Acrescenta uma instrução e devolve sua posição"""
+        instrucoes = self.codigo.instrucoes
+        instrucoes.append(op)
+        instrucoes.append(arg)
+        return len(instrucoes) - 2
+
+    def gancho(self, tipo, no, quantidade=0):
+        """Emite um OP_GANCHO da instrumentação"""
+        self.emitir(OP_GANCHO, self.constante((tipo, no, quantidade)))
+
+    def devolver(self):
+        """Emite OP_DEVOLVER, precedido do gancho de saída nas funções instrumentadas
+
+        Com o gancho entre eles, uma chamada seguida de 'devolver' deixa de
+        ser de cauda, e toda entrada tem a sua saída.
+        """
+        if self.instrumentacao is not None and self.codigo.declaracao is not None:
+            self.gancho(GANCHO_SAIDA, self.codigo.declaracao)
+        self.emitir(OP_DEVOLVER)
+
+    def corrigir_salto(self, posicao, alvo=None):
+        """Ajusta o destino de um salto emitido anteriormente"""
+        self.codigo.instrucoes[posicao + 1] = len(self.codigo.instrucoes) if alvo is None else alvo
+
+    def constante(self, valor):
+        """Índice de uma constante na tabela"""
+        # O tipo faz parte da chave para que 1, 1.0 e verdadeiro não se misturem
+        chave = (type(valor), valor) if isinstance(valor, (int, float, str, bool, type(None))) else id(valor)
+        indice = self.indices_constantes.get(chave)
+        if indice is None:
+            indice = len(self.codigo.constantes)
+            self.codigo.constantes.append(valor)
+            self.indices_constantes[chave] = indice
+        return indice
+
+    def nome(self, nome):
+        """Índice de um nome na tabela"""
+        indice = self.indices_nomes.get(nome)
+        if indice is None:
+            indice = len(self.codigo.nomes)
+            self.codigo.nomes.append(nome)
+            self.indices_nomes[nome] = indice
+        return indice
+
+    def cache(self, nome):
+        """Índice de um novo cache em linha para um acesso a 'nome'"""
+        cache = CacheEmLinha(nome)
+        self.caches.append(cache)
+        self.codigo.caches.append(cache)
+        return len(self.codigo.caches) - 1
+
+    def carregar(self, endereco, nome):
+        """Emite a leitura de uma variável resolvida"""
+        profundidade, slot = endereco
+        if profundidade == 0:
+            self.emitir(OP_CARREGAR_LOCAL, slot)
+        elif profundidade == PROFUNDIDADE_GLOBAL:
+            self.emitir(OP_CARREGAR_GLOBAL, slot)
+        else:
+            self.emitir(OP_CARREGAR_EXTERNO, self.constante((profundidade, slot, nome)))
+
+    def armazenar(self, endereco):
+        """Emite a escrita do topo da pilha em uma variável resolvida"""
+        profundidade, slot = endereco
+        if profundidade == 0:
+            self.emitir(OP_DEFINIR_LOCAL, slot)
+        else:
+            self.emitir(OP_DEFINIR_GLOBAL, slot)
+
+    def bloco(self, instrucoes):
+        """Compila uma sequência de declarações"""
+        for instrucao in instrucoes:
+            self.declaracao(instrucao)
+
+    def declaracao(self, no):
+        """Compila uma declaração"""
+        especie = no.especie
+
+        linha = getattr(no, 'linha', None)
+        if linha is not None:
+            # Cada instrução pertence à última declaração iniciada antes dela
+            linhas = self.codigo.linhas
+            if not linhas or linhas[-1] != linha:
+                self.codigo.pcs_linhas.append(len(self.codigo.instrucoes))
+                linhas.append(linha)
+        if self.instrumentacao is not None:
+            self.gancho(GANCHO_DECLARACAO, no)
+
+        if especie == NO_EXPRESSAO_DECLARACAO:
+            expressao = no.expressao
+            if expressao.especie == NO_ATRIBUICAO_EXPRESSAO:
+                # Em posição de declaração o valor da atribuição não é usado
+                self.expressao(expressao.valor)
+                self.armazenar(expressao.endereco)
+            else:
+                self.expressao(expressao)
+                self.emitir(OP_DESCARTAR)
+
+        elif especie == NO_DECLARACAO_VARIAVEL:
+            self.expressao(no.valor)
+            self.armazenar(no.endereco)
+
+        elif especie == NO_DECLARACAO_MOSTRAR:
+            self.expressao(no.expressao)
+            self.emitir(OP_MOSTRAR)
+
+        elif especie == NO_DECLARACAO_PEGAR:
+            self.emitir(OP_PEGAR)
+            self.armazenar(no.endereco)
+
+        elif especie == NO_DECLARACAO_SE:
+            self.expressao(no.condicao)
+            salto_senao = self.emitir(OP_SALTAR_SE_FALSO)
+            self.bloco(no.bloco_entao)
+            if no.bloco_senao:
+                salto_fim = self.emitir(OP_SALTAR)
+                self.corrigir_salto(salto_senao)
+                self.bloco(no.bloco_senao)
+                self.corrigir_salto(salto_fim)
+            else:
+                self.corrigir_salto(salto_senao)
+
+        elif especie == NO_DECLARACAO_ENQUANTO:
+            inicio = len(self.codigo.instrucoes)
+            self.expressao(no.condicao)
+            salto_fim = self.emitir(OP_SALTAR_SE_FALSO)
+            self.bloco(no.corpo)
+            self.emitir(OP_SALTAR, inicio)
+            self.corrigir_salto(salto_fim)
+
+        elif especie == NO_DECLARACAO_PARA:
+            endereco = no.endereco
+            self.expressao(no.inicio)
+            if no.contador_fixo:
+                # O início fica na pilha para OP_INTERVALO
+                self.emitir(OP_DUPLICAR)
+            self.armazenar(endereco)
+            self.expressao(no.fim)
+            if no.passo is None:
+                self.emitir(OP_CONSTANTE, self.constante(1))
+            else:
+                self.expressao(no.passo)
+
+            if no.contador_fixo:
+                # Caminho rápido: percorre o iterador de intervalo(), como 'para ... em'
+                self.emitir(OP_INTERVALO)
+                inicio = self.emitir(OP_PROXIMO)
+                self.armazenar(endereco)
+                self.bloco(no.corpo)
+                self.emitir(OP_SALTAR, inicio)
+                self.corrigir_salto(inicio)
+            else:
+                # O limite e o passo ficam na pilha durante todo o laço; o corpo
+                # pode alterar a variável, e a volta seguinte parte do valor alterado
+                self.carregar(endereco, no.variavel)
+                salto_fim = self.emitir(OP_SALTAR_SE_FORA_DO_INTERVALO)
+                inicio = len(self.codigo.instrucoes)
+                self.bloco(no.corpo)
+                self.carregar(endereco, no.variavel)
+                salto_saida = self.emitir(OP_AVANCAR_CONTADOR)
+                self.armazenar(endereco)
+                self.emitir(OP_SALTAR, inicio)
+                self.corrigir_salto(salto_saida)
+                self.corrigir_salto(salto_fim)
+                self.emitir(OP_DESCARTAR)
+                self.emitir(OP_DESCARTAR)
+
+        elif especie == NO_DECLARACAO_PARA_CADA:
+            self.expressao(no.colecao)
+            self.emitir(OP_OBTER_ITERADOR)
+            inicio = self.emitir(OP_PROXIMO)
+            self.armazenar(no.endereco)
+            self.bloco(no.corpo)
+            self.emitir(OP_SALTAR, inicio)
+            self.corrigir_salto(inicio)
+
+        elif especie == NO_DECLARACAO_FUNCAO:
+            codigo = self.compilar_funcao(no, False)
+            self.emitir(OP_DEFINIR_FUNCAO, self.constante(codigo))
+            self.armazenar(no.endereco)
+
+        elif especie == NO_DECLARACAO_DEVOLVER:
+            self.expressao(no.valor)
+            self.devolver()
+
+        elif especie == NO_DECLARACAO_CLASSE:
+            # Valores iniciais constantes não precisam de código próprio
+            atributos = [(atributo.nome, atributo.valor.valor, None)
+                         if atributo.valor.especie == NO_LITERAL_EXPRESSAO else
+                         (atributo.nome, None, self.compilar_expressao_isolada(atributo.nome, atributo.valor))
+                         for atributo in no.atributos]
+            metodos = {metodo.nome: self.compilar_funcao(metodo, True) for metodo in no.metodos}
+            classe = ClasseCompilada(no.nome, atributos, metodos)
+            self.emitir(OP_DEFINIR_CLASSE, self.constante(classe))
+            self.armazenar(no.endereco)
+
+        elif especie == NO_DECLARACAO_TENTAR:
+            inicio_tentar = self.emitir(OP_INICIAR_TENTAR)
+            self.bloco(no.bloco_tentar)
+            self.emitir(OP_ENCERRAR_TENTAR)
+            salto_fim = self.emitir(OP_SALTAR)
+            # O tratador começa com a mensagem de erro no topo da pilha
+            self.corrigir_salto(inicio_tentar)
+            self.armazenar(no.endereco)
+            self.bloco(no.bloco_pegar)
+            self.corrigir_salto(salto_fim)
+
+        elif especie == NO_DECLARACAO_USAR:
+            membros = None if no.membros is None else tuple(no.membros)
+            self.emitir(OP_USAR, self.constante((no.nome, membros)))
+
+        elif especie == NO_DECLARACAO_VA:
+            # Como uma chamada, mas OP_VA cria a tarefa em vez de chamar
+            chamada = no.chamada
+            self.expressao(chamada.funcao)
+            for argumento in chamada.argumentos:
+                self.expressao(argumento)
+            self.emitir(OP_VA, len(chamada.argumentos))
+
+        else:
+            raise ErroTupa(f"Tipo de nó desconhecido: {no.tipo}")
+
+    def expressao(self, no):
+        """Compila uma expressão, deixando seu valor no topo da pilha"""
+        especie = no.especie
+        if self.instrumentacao is not None and self.instrumentacao.contar:
+            self.gancho(GANCHO_EXPRESSAO, no)
+
+        if especie == NO_LITERAL_EXPRESSAO:
+            self.emitir(OP_CONSTANTE, self.constante(no.valor))
+
+        elif especie == NO_VARIAVEL_EXPRESSAO:
+            self.carregar(no.endereco, no.nome)
+
+        elif especie == NO_AGRUPAR_EXPRESSAO:
+            self.expressao(no.expressao)
+
+        elif especie == NO_UNARIA_EXPRESSAO:
+            self.expressao(no.direita)
+            self.emitir(OP_NEGATIVO if no.operador == '-' else OP_NAO)
+
+        elif especie == NO_BINARIA_EXPRESSAO:
+            operador = OPERADORES_BINARIOS.index(no.operador)
+            esquerda = no.esquerda
+            direita = no.direita
+
+            # Operandos constantes e variáveis simples usam instruções combinadas,
+            # reduzindo o número de despachos em expressões como 'i + 1'
+            if direita.especie == NO_LITERAL_EXPRESSAO:
+                profundidade = esquerda.endereco[0] if esquerda.especie == NO_VARIAVEL_EXPRESSAO else None
+                if profundidade == 0 or profundidade == PROFUNDIDADE_GLOBAL:
+                    operando = (esquerda.endereco[1], direita.valor, FUNCOES_BINARIAS[operador])
+                    op = OP_CARREGAR_LOCAL_BINARIO_CONSTANTE if profundidade == 0 else OP_CARREGAR_GLOBAL_BINARIO_CONSTANTE
+                    self.emitir(op, self.constante(operando))
+                else:
+                    self.expressao(esquerda)
+                    self.emitir(OP_BINARIO_CONSTANTE, self.constante(direita.valor) << 4 | operador)
+            else:
+                self.expressao(esquerda)
+                self.expressao(direita)
+                self.emitir(OP_BINARIO, operador)
+
+        elif especie == NO_LOGICA_EXPRESSAO:
+            self.expressao(no.esquerda)
+            if no.operador == 'e':
+                salto = self.emitir(OP_SALTAR_SE_FALSO_OU_MANTER)
+            else:
+                salto = self.emitir(OP_SALTAR_SE_VERDADEIRO_OU_MANTER)
+            self.expressao(no.direita)
+            self.corrigir_salto(salto)
+
+        elif especie == NO_ATRIBUICAO_EXPRESSAO:
+            self.expressao(no.valor)
+            self.emitir(OP_DUPLICAR)
+            self.armazenar(no.endereco)
+
+        elif especie == NO_ATRIBUICAO_INDEXACAO:
+            self.expressao(no.objeto)
+            self.expressao(no.indice)
+            self.expressao(no.valor)
+            self.emitir(OP_ATRIBUIR_INDICE)
+
+        elif especie == NO_ATRIBUICAO_ATRIBUTO:
+            self.expressao(no.objeto)
+            self.expressao(no.valor)
+            self.emitir(OP_ATRIBUIR_ATRIBUTO, self.nome(no.nome))
+
+        elif especie == NO_CHAMADA_EXPRESSAO:
+            funcao = no.funcao
+            quantidade = len(no.argumentos)
+            if funcao.especie == NO_ATRIBUTO_EXPRESSAO and quantidade < 256:
+                # Chamadas 'objeto.metodo(...)' dispensam o método vinculado
+                self.expressao(funcao.objeto)
+                for argumento in no.argumentos:
+                    self.expressao(argumento)
+                self.emitir(OP_CHAMAR_METODO, self.cache(funcao.nome) << 8 | quantidade)
+            else:
+                self.expressao(funcao)
+                for argumento in no.argumentos:
+                    self.expressao(argumento)
+                self.emitir(OP_CHAMAR, quantidade)
+
+        elif especie == NO_INDEXACAO_EXPRESSAO:
+            self.expressao(no.objeto)
+            self.expressao(no.indice)
+            self.emitir(OP_INDEXAR)
+
+        elif especie == NO_ATRIBUTO_EXPRESSAO:
+            self.expressao(no.objeto)
+            self.emitir(OP_OBTER_ATRIBUTO, self.cache(no.nome))
+
+        elif especie == NO_LISTA_EXPRESSAO:
+            for elemento in no.elementos:
+                self.expressao(elemento)
+            self.emitir(OP_CRIAR_LISTA, len(no.elementos))
+
+        elif especie == NO_DICIONARIO_EXPRESSAO:
+            for chave, valor in no.pares:
+                self.expressao(chave)
+                self.expressao(valor)
+            self.emitir(OP_CRIAR_DICIONARIO, len(no.pares))
+
+        else:
+            raise ErroTupa(f"Tipo de expressão desconhecido: {no.tipo}")
+
+class FuncaoVM:
+    """Função Tupã compilada, executada pela máquina virtual"""
+    def __init__(self, vm, codigo, envolventes):
+        self.vm = vm
+        self.codigo = codigo
+        self.quantidade_parametros = codigo.quantidade_parametros
+        # Parte final de todo quadro desta função: locais vazios e envolventes
+        self.cauda = [AUSENTE] * (len(codigo.nomes_locais) - codigo.quantidade_parametros) + [envolventes]
+
+    def montar_quadro(self, args):
+        """Quadro de uma chamada com os argumentos dados"""
+        if len(args) == self.quantidade_parametros:
+            return list(args) + self.cauda
+        return montar_quadro(len(self.codigo.nomes_locais), self.quantidade_parametros, args, self.cauda[-1])
+
+    def __call__(self, *args):
+        return self.vm.executar(self.codigo, self.montar_quadro(args))
+
+    def __repr__(self):
+        return f"<função {self.codigo.nome}>"
+
+# Máximo de chamadas aninhadas, sem contar as de cauda, em uma execução da VM
+LIMITE_CHAMADAS = 2000000
+
+# Saltos (voltas de laço, em geral) que uma tarefa executa antes de ceder a
+# vez, quando há outras prontas
+FATIA_TAREFA = 100
+
+class Tarefa:
+    """Tarefa criada por 'vá', escalonada cooperativamente pela MaquinaVirtual
+
+    Guarda o estado de execução da tarefa (código, quadro, pilha de
+    operandos, tratadores, pc e chamadas) enquanto outra roda. 'geracao'
+    muda a cada vez que a tarefa é acordada, o que invalida as esperas
+    que ela deixou em outros canais.
+    """
+    __slots__ = ('codigo', 'quadro', 'pilha', 'tratadores', 'pc', 'chamadas',
+                 'entrega', 'erro', 'geracao', 'prontas')
+
+    def __init__(self, prontas, codigo=None, quadro=None):
+        self.prontas = prontas
+        self.codigo = codigo
+        self.quadro = quadro
+        self.pilha = []
+        self.tratadores = ()
+        self.pc = 0
+        self.chamadas = []
+        # Resultado da operação que a tarefa esperava, empilhado ao retomar
+        self.entrega = AUSENTE
+        # Erro levantado na tarefa ao retomar
+        self.erro = None
+        self.geracao = 0
+
+    def acordar(self, valor):
+        """Põe a tarefa na fila de prontas; 'valor', salvo AUSENTE, é o resultado da espera"""
+        self.entrega = valor
+        self.geracao += 1
+        self.prontas.append(self)
+
+    def falhar(self, erro):
+        """Põe a tarefa na fila de prontas para levantar 'erro' onde ela esperava"""
+        self.erro = erro
+        self.geracao += 1
+        self.prontas.append(self)
+
+class MaquinaVirtual:
+    """Máquina virtual de pilha que executa o bytecode gerado pelo Compilador"""
+    def __init__(self, interpretador):
+        self.interpretador = interpretador
+        # Tarefas 'vá' prontas para executar, na ordem em que serão retomadas
+        self.prontas = deque()
+        # Tarefas criadas que ainda não terminaram
+        self.tarefas = set()
+        self.escalonando = False
+
+    def iniciar_tarefa(self, funcao, argumentos):
+        """Cria a tarefa de 'vá funcao(argumentos)' no fim da fila de prontas"""
+        if not self.escalonando:
+            raise ErroTupa("'vá' só pode ser usado durante a execução de um programa")
+        if type(funcao) is MethodType and type(funcao.__func__) is FuncaoVM:
+            argumentos = (funcao.__self__,) + argumentos
+            funcao = funcao.__func__
+
+        if type(funcao) is FuncaoVM and funcao.vm is self:
+            tarefa = Tarefa(self.prontas, funcao.codigo, funcao.montar_quadro(argumentos))
+        else:
+            if not callable(funcao):
+                raise ErroTupa(f"Não é possível chamar um não-callable: {funcao}")
+            # Demais funções são chamadas por um código de uma única chamada
+            codigo = CodigoObjeto(f"<vá {funcao}>")
+            codigo.constantes = [funcao, *argumentos]
+            for indice in range(len(codigo.constantes)):
+                codigo.instrucoes += [OP_CONSTANTE, indice]
+            codigo.instrucoes += [OP_CHAMAR, len(argumentos), OP_DEVOLVER, 0]
+            tarefa = Tarefa(self.prontas, codigo)
+
+        self.tarefas.add(tarefa)
+        self.prontas.append(tarefa)
+
+    def encerrar_tarefas(self):
+        """Abandona as tarefas que não terminaram junto com o programa principal"""
+        for tarefa in self.tarefas:
+            # Invalida as esperas que elas deixaram nos canais
+            tarefa.geracao += 1
+        self.tarefas.clear()
+        self.prontas.clear()
+        self.escalonando = False
+
+    def criar_classe(self, classe, quadro):
+        """Cria a classe em tempo de execução declarada no quadro indicado"""
+        envolventes = () if quadro is None else (quadro,) + quadro[-1]
+        metodos = {nome: FuncaoVM(self, codigo, envolventes) for nome, codigo in classe.metodos.items()}
+
+        # Valores iniciais não constantes são avaliados no escopo da declaração
+        atributos = [(nome, valor, None if codigo is None else (lambda codigo=codigo: self.executar(codigo, quadro)))
+                     for nome, valor, codigo in classe.atributos]
+        return self.interpretador.registrar_classe(ClasseTupa(classe.nome, atributos, metodos))
+
+    def executar(self, codigo, quadro=None, escalonar=False):
+        """Executa um objeto de código e devolve o valor de 'devolver' (ou None)
+
+        Chamadas de uma FuncaoVM feitas pelo bytecode não usam a pilha do
+        Python: o estado de quem chamou (código, quadro, pilha de operandos,
+        tratadores e pc) é guardado em 'chamadas' e restaurado por
+        OP_DEVOLVER. Uma chamada seguida diretamente de OP_DEVOLVER, fora de
+        'tentar', é de cauda e reaproveita o lugar do quadro atual.
+
+        Com 'escalonar', usado para o programa principal, este laço é também
+        o escalonador das tarefas 'vá': todo o estado acima é local, então
+        trocar de tarefa é guardá-lo na Tarefa atual e carregar o da próxima.
+        A troca acontece quando a tarefa espera por um canal, termina ou
+        gasta FATIA_TAREFA saltos com outras prontas. O programa termina
+        quando a tarefa principal termina, como em Go.
+        """
+        interpretador = self.interpretador
+        globais = interpretador.globais
+        instrucoes = codigo.instrucoes
+        constantes = codigo.constantes
+        nomes = codigo.nomes
+        caches = codigo.caches
+        funcoes_binarias = FUNCOES_BINARIAS
+        chamadas = []
+        pilha = []
+        empilhar = pilha.append
+        desempilhar = pilha.pop
+        tratadores = ()
+        pc = 0
+
+        # Só o programa principal escalona; em execuções aninhadas, como as de
+        # uma função chamada por 'mapear', operações de canal não esperam
+        prontas = self.prontas
+        if escalonar:
+            self.escalonando = True
+            principal = atual = Tarefa(prontas)
+        else:
+            principal = atual = None
+        fatia = FATIA_TAREFA
+        pendente = None
+
+        while True:
+            try:
+                if pendente is not None:
+                    # Erro entregue a uma tarefa enquanto ela esperava
+                    erro, pendente = pendente, None
+                    raise erro
+                while True:
+                    op = instrucoes[pc]
+                    arg = instrucoes[pc + 1]
+                    pc += 2
+
+                    if op == OP_CARREGAR_LOCAL:
+                        valor = quadro[arg]
+                        if valor is AUSENTE:
+                            raise ErroTupa(f"Variável não definida: '{codigo.nomes_locais[arg]}'")
+                        empilhar(valor)
+                    elif op == OP_CARREGAR_GLOBAL:
+                        valor = globais[arg]
+                        if valor is AUSENTE:
+                            raise ErroTupa(f"Variável não definida: '{interpretador.nomes_globais[arg]}'")
+                        empilhar(valor)
+                    elif op == OP_CONSTANTE:
+                        empilhar(constantes[arg])
+                    elif op == OP_DEFINIR_LOCAL:
+                        quadro[arg] = desempilhar()
+                    elif op == OP_DEFINIR_GLOBAL:
+                        globais[arg] = desempilhar()
+                    elif op == OP_BINARIO:
+                        direita = desempilhar()
+                        pilha[-1] = funcoes_binarias[arg](pilha[-1], direita)
+                    elif op == OP_BINARIO_CONSTANTE:
+                        pilha[-1] = funcoes_binarias[arg & 15](pilha[-1], constantes[arg >> 4])
+                    elif op == OP_CARREGAR_LOCAL_BINARIO_CONSTANTE:
+                        slot, valor, operacao = constantes[arg]
+                        esquerda = quadro[slot]
+                        if esquerda is AUSENTE:
+                            raise ErroTupa(f"Variável não definida: '{codigo.nomes_locais[slot]}'")
+                        empilhar(operacao(esquerda, valor))
+                    elif op == OP_CARREGAR_GLOBAL_BINARIO_CONSTANTE:
+                        slot, valor, operacao = constantes[arg]
+                        esquerda = globais[slot]
+                        if esquerda is AUSENTE:
+                            raise ErroTupa(f"Variável não definida: '{interpretador.nomes_globais[slot]}'")
+                        empilhar(operacao(esquerda, valor))
+                    elif op == OP_SALTAR_SE_FALSO:
+                        if not desempilhar():
+                            pc = arg
+                    elif op == OP_SALTAR:
+                        pc = arg
+                        if prontas and atual is not None:
+                            fatia -= 1
+                            if not fatia:
+                                raise TrocaDeTarefa(TROCA_FATIA)
+                    elif op == OP_CHAMAR:
+                        funcao = pilha[-arg - 1]
+                        if type(funcao) is FuncaoVM and arg == funcao.quantidade_parametros and funcao.vm is self:
+                            # Chamada direta, sem passar por FuncaoVM.__call__; funções
+                            # de outro módulo rodam na VM dele, com as globais dele
+                            novo_quadro = pilha[-arg:] + funcao.cauda if arg else funcao.cauda[:]
+                            if instrucoes[pc] != OP_DEVOLVER or tratadores:
+                                if len(chamadas) >= LIMITE_CHAMADAS:
+                                    raise ErroTupa("Limite de chamadas aninhadas excedido")
+                                del pilha[-arg - 1:]
+                                chamadas.append((codigo, quadro, pilha, tratadores, pc))
+                                tratadores = ()
+                            quadro = novo_quadro
+                            codigo = funcao.codigo
+                            instrucoes = codigo.instrucoes
+                            constantes = codigo.constantes
+                            nomes = codigo.nomes
+                            caches = codigo.caches
+                            pilha = []
+                            empilhar = pilha.append
+                            desempilhar = pilha.pop
+                            pc = 0
+                        else:
+                            if arg:
+                                argumentos = pilha[-arg:]
+                                del pilha[-arg:]
+                            else:
+                                argumentos = ()
+                            if not callable(funcao):
+                                raise ErroTupa(f"Não é possível chamar um não-callable: {funcao}")
+                            if atual is not None and (funcao is selecionar or
+                                                      type(funcao) is MethodType and type(funcao.__self__) is Canal):
+                                resultado = operar_canal(funcao, argumentos, atual)
+                                if resultado is BLOQUEADA:
+                                    desempilhar()
+                                    raise TrocaDeTarefa(TROCA_BLOQUEIO)
+                                pilha[-1] = resultado
+                            else:
+                                pilha[-1] = funcao(*argumentos)
+                    elif op == OP_CHAMAR_METODO:
+                        quantidade = arg & 255
+                        cache = caches[arg >> 8]
+                        objeto = pilha[-quantidade - 1]
+                        if type(objeto) is cache.tipo:
+                            cache.acertos += 1
+                            metodo = cache.metodo
+                        elif isinstance(objeto, InstanciaTupa):
+                            metodo = cache.resolver(objeto)
+                        else:
+                            metodo = None
+                        if (type(metodo) is FuncaoVM and metodo.quantidade_parametros == quantidade + 1
+                                and metodo.vm is self):
+                            # A instância já está na pilha, logo abaixo dos argumentos:
+                            # ela ocupa o slot do 'self' no quadro do método
+                            novo_quadro = pilha[-quantidade - 1:] + metodo.cauda
+                            if instrucoes[pc] != OP_DEVOLVER or tratadores:
+                                if len(chamadas) >= LIMITE_CHAMADAS:
+                                    raise ErroTupa("Limite de chamadas aninhadas excedido")
+                                del pilha[-quantidade - 1:]
+                                chamadas.append((codigo, quadro, pilha, tratadores, pc))
+                                tratadores = ()
+                            quadro = novo_quadro
+                            codigo = metodo.codigo
+                            instrucoes = codigo.instrucoes
+                            constantes = codigo.constantes
+                            nomes = codigo.nomes
+                            caches = codigo.caches
+                            pilha = []
+                            empilhar = pilha.append
+                            desempilhar = pilha.pop
+                            pc = 0
+                        else:
+                            if metodo is not None:
+                                funcao = MethodType(metodo, objeto)
+                            else:
+                                try:
+                                    funcao = getattr(objeto, cache.nome)
+                                except AttributeError:
+                                    raise ErroTupa(f"Atributo não encontrado: '{cache.nome}'")
+                            if not callable(funcao):
+                                raise ErroTupa(f"Não é possível chamar um não-callable: {funcao}")
+                            argumentos = pilha[-quantidade:] if quantidade else ()
+                            del pilha[-quantidade - 1:]
+                            if atual is not None and type(objeto) is Canal:
+                                resultado = operar_canal(funcao, argumentos, atual)
+                                if resultado is BLOQUEADA:
+                                    raise TrocaDeTarefa(TROCA_BLOQUEIO)
+                                empilhar(resultado)
+                            else:
+                                empilhar(funcao(*argumentos))
+                    elif op == OP_DEVOLVER:
+                        valor = desempilhar()
+                        if not chamadas:
+                            if atual is principal:
+                                return valor
+                            raise TrocaDeTarefa(TROCA_FIM)
+                        codigo, quadro, pilha, tratadores, pc = chamadas.pop()
+                        instrucoes = codigo.instrucoes
+                        constantes = codigo.constantes
+                        nomes = codigo.nomes
+                        caches = codigo.caches
+                        empilhar = pilha.append
+                        desempilhar = pilha.pop
+                        empilhar(valor)
+                    elif op == OP_DESCARTAR:
+                        desempilhar()
+                    elif op == OP_INDEXAR:
+                        indice = desempilhar()
+                        objeto = pilha[-1]
+                        try:
+                            pilha[-1] = objeto[indice]
+                        except (IndexError, KeyError):
+                            raise ErroTupa(f"Índice inválido: {indice}")
+                        except TypeError:
+                            raise ErroTupa(f"Objeto não indexável: {objeto}")
+                    elif op == OP_OBTER_ATRIBUTO:
+                        objeto = pilha[-1]
+                        cache = caches[arg]
+                        if type(objeto) is cache.tipo and cache.metodo is None:
+                            # Atributo: o slot é lido direto pelo Python
+                            cache.acertos += 1
+                            pilha[-1] = getattr(objeto, cache.nome)
+                        else:
+                            pilha[-1] = ler_atributo(objeto, cache)
+                    elif op == OP_SALTAR_SE_FORA_DO_INTERVALO:
+                        # O valor da variável do laço está sobre o limite e o passo
+                        if not dentro_do_intervalo(desempilhar(), pilha[-2], pilha[-1]):
+                            pc = arg
+                    elif op == OP_PROXIMO:
+                        item = next(pilha[-1], AUSENTE)
+                        if item is AUSENTE:
+                            desempilhar()
+                            pc = arg
+                        else:
+                            empilhar(item)
+                    elif op == OP_CARREGAR_EXTERNO:
+                        profundidade, slot, nome = constantes[arg]
+                        valor = quadro[-1][profundidade - 1][slot]
+                        if valor is AUSENTE:
+                            raise ErroTupa(f"Variável não definida: '{nome}'")
+                        empilhar(valor)
+                    elif op == OP_DUPLICAR:
+                        empilhar(pilha[-1])
+                    elif op == OP_ATRIBUIR_INDICE:
+                        valor = desempilhar()
+                        indice = desempilhar()
+                        try:
+                            pilha[-1][indice] = valor
+                        except (IndexError, TypeError, OverflowError) as e:
+                            raise erro_de_atribuicao(pilha[-1], indice, valor, e)
+                        pilha[-1] = valor
+                    elif op == OP_ATRIBUIR_ATRIBUTO:
+                        valor = desempilhar()
+                        setattr(pilha[-1], nomes[arg], valor)
+                        pilha[-1] = valor
+                    elif op == OP_SALTAR_SE_FALSO_OU_MANTER:
+                        if pilha[-1]:
+                            desempilhar()
+                        else:
+                            pc = arg
+                    elif op == OP_SALTAR_SE_VERDADEIRO_OU_MANTER:
+                        if pilha[-1]:
+                            pc = arg
+                        else:
+                            desempilhar()
+                    elif op == OP_NEGATIVO:
+                        pilha[-1] = -pilha[-1]
+                    elif op == OP_NAO:
+                        pilha[-1] = not pilha[-1]
+                    elif op == OP_CRIAR_LISTA:
+                        if arg:
+                            elementos = pilha[-arg:]
+                            del pilha[-arg:]
+                        else:
+                            elementos = []
+                        empilhar(elementos)
+                    elif op == OP_CRIAR_DICIONARIO:
+                        dicionario = {}
+                        if arg:
+                            valores = pilha[-2 * arg:]
+                            del pilha[-2 * arg:]
+                            for i in range(0, len(valores), 2):
+                                dicionario[valores[i]] = valores[i + 1]
+                        empilhar(dicionario)
+                    elif op == OP_MOSTRAR:
+                        interpretador.saida.escrever(desempilhar())
+                    elif op == OP_OBTER_ITERADOR:
+                        objeto = pilha[-1]
+                        # Percorrer um canal numa tarefa espera pelos valores
+                        pilha[-1] = LeitorCanal(objeto, atual) if type(objeto) is Canal else iter(objeto)
+                    elif op == OP_DEFINIR_FUNCAO:
+                        envolventes = () if quadro is None else (quadro,) + quadro[-1]
+                        empilhar(FuncaoVM(self, constantes[arg], envolventes))
+                    elif op == OP_DEFINIR_CLASSE:
+                        empilhar(self.criar_classe(constantes[arg], quadro))
+                    elif op == OP_INICIAR_TENTAR:
+                        if not tratadores:
+                            # Quadros sem 'tentar' compartilham a tupla vazia
+                            tratadores = []
+                        tratadores.append((arg, len(pilha)))
+                    elif op == OP_ENCERRAR_TENTAR:
+                        tratadores.pop()
+                    elif op == OP_PEGAR:
+                        empilhar(interpretador.ler_entrada())
+                    elif op == OP_USAR:
+                        interpretador.importar_modulo(*constantes[arg])
+                    elif op == OP_AVANCAR_CONTADOR:
+                        # Pilha: limite, passo, valor da variável; sai do laço sem
+                        # atualizar a variável quando o próximo valor passa do limite
+                        valor = pilha[-1] + pilha[-2]
+                        if dentro_do_intervalo(valor, pilha[-3], pilha[-2]):
+                            pilha[-1] = valor
+                        else:
+                            desempilhar()
+                            pc = arg
+                    elif op == OP_INTERVALO:
+                        passo = desempilhar()
+                        fim = desempilhar()
+                        pilha[-1] = intervalo(pilha[-1], fim, passo)
+                    elif op == OP_VA:
+                        argumentos = tuple(pilha[-arg:]) if arg else ()
+                        funcao = pilha[-arg - 1]
+                        del pilha[-arg - 1:]
+                        self.iniciar_tarefa(funcao, argumentos)
+                    elif op == OP_GANCHO:
+                        codigo.instrumentacao.gancho_vm(constantes[arg], quadro, pilha)
+                    else:
+                        raise ErroTupa(f"Opcode desconhecido: {op}")
+            except TrocaDeTarefa as troca:
+                motivo = troca.motivo
+                if motivo == TROCA_FIM:
+                    self.tarefas.discard(atual)
+                else:
+                    if motivo == TROCA_REPETIR:
+                        pc -= 2
+                    atual.codigo = codigo
+                    atual.quadro = quadro
+                    atual.pilha = pilha
+                    atual.tratadores = tratadores
+                    atual.pc = pc
+                    atual.chamadas = chamadas
+                    if motivo == TROCA_FATIA:
+                        prontas.append(atual)
+                if not prontas:
+                    raise ErroTupa("Impasse: todas as tarefas estão esperando por canais")
+
+                atual = prontas.popleft()
+                codigo = atual.codigo
+                quadro = atual.quadro
+                pilha = atual.pilha
+                tratadores = atual.tratadores
+                pc = atual.pc
+                chamadas = atual.chamadas
+                instrucoes = codigo.instrucoes
+                constantes = codigo.constantes
+                nomes = codigo.nomes
+                caches = codigo.caches
+                empilhar = pilha.append
+                desempilhar = pilha.pop
+                fatia = FATIA_TAREFA
+                if atual.erro is not None:
+                    pendente, atual.erro = atual.erro, None
+                elif atual.entrega is not AUSENTE:
+                    empilhar(atual.entrega)
+                    atual.entrega = AUSENTE
+            except Exception as e:
+                if codigo.instrumentacao is not None:
+                    codigo.instrumentacao.excecao(e, codigo.linha(max(pc - 2, 0)))
+                # Desempilha as chamadas até a mais interna que está em um 'tentar'
+                while not tratadores:
+                    if codigo.instrumentacao is not None and codigo.declaracao is not None:
+                        codigo.instrumentacao.saida(codigo.declaracao.nome, None, e)
+                    if not chamadas:
+                        raise
+                    codigo, quadro, pilha, tratadores, pc = chamadas.pop()
+                instrucoes = codigo.instrucoes
+                constantes = codigo.constantes
+                nomes = codigo.nomes
+                caches = codigo.caches
+                empilhar = pilha.append
+                desempilhar = pilha.pop
+
+                # Desvia para o bloco 'pegar' mais interno
+                pc, altura_pilha = tratadores.pop()
+                del pilha[altura_pilha:]
+                empilhar(str(e))
+
+# Compilação para fechamentos (closures)
+#
+# Alternativa ao percurso da árvore: cada nó é visitado uma única vez e vira uma
+# função Python aninhada que chama as funções dos seus filhos. Em tempo de
+# execução não há consulta a no.especie nem comparação de operadores.
+#
+# Toda função compilada recebe o quadro atual 'q' (None no nível do programa),
+# onde as variáveis locais ocupam os slots definidos pelo Resolvedor.
+# Declarações compiladas devolvem None ao terminar normalmente; 'devolver'
+# produz uma tupla (valor,) que cada bloco repassa até o corpo da função.
+
+FABRICAS_BINARIAS = {
+    '+': lambda a, b: lambda q: a(q) + b(q),
+    '-': lambda a, b: lambda q: a(q) - b(q),
+    '*': lambda a, b: lambda q: a(q) * b(q),
+    '/': lambda a, b: lambda q: a(q) / b(q),
+    '<': lambda a, b: lambda q: a(q) < b(q),
+    '<=': lambda a, b: lambda q: a(q) <= b(q),
+    '>': lambda a, b: lambda q: a(q) > b(q),
+    '>=': lambda a, b: lambda q: a(q) >= b(q),
+    '==': lambda a, b: lambda q: a(q) == b(q),
+    '!=': lambda a, b: lambda q: a(q) != b(q)
+}
+
+# Variantes com o operando direito constante, como em 'i + 1' ou 'n < 2'
+FABRICAS_BINARIAS_CONSTANTE = {
+    '+': lambda a, k: lambda q: a(q) + k,
+    '-': lambda a, k: lambda q: a(q) - k,
+    '*': lambda a, k: lambda q: a(q) * k,
+    '/': lambda a, k: lambda q: a(q) / k,
+    '<': lambda a, k: lambda q: a(q) < k,
+    '<=': lambda a, k: lambda q: a(q) <= k,
+    '>': lambda a, k: lambda q: a(q) > k,
+    '>=': lambda a, k: lambda q: a(q) >= k,
+    '==': lambda a, k: lambda q: a(q) == k,
+    '!=': lambda a, k: lambda q: a(q) != k
+}
+
+class CompiladorFechamentos:
+    """Compila a árvore sintática (já resolvida) para funções Python aninhadas"""
+    def __init__(self, interpretador):
+        self.interpretador = interpretador
+        self.globais = interpretador.globais
+        instrumentacao = interpretador.instrumentacao
+        if instrumentacao is not None:
+            self.declaracao = self.declaracao_instrumentada
+            if instrumentacao.contar:
+                self.expressao = self.expressao_contada
+
+    def compilar(self, arvore):
+        """Compila um nó Programa em uma função sem argumentos"""
+        corpo = self.bloco(arvore.instrucoes)
+
+        def programa():
+            retorno = corpo(None)
+            return None if retorno is None else retorno[0]
+
+        return programa
+
+    def leitor(self, endereco, nome):
+        """Função que lê uma variável resolvida a partir do quadro"""
+        profundidade, slot = endereco
+
+        if profundidade == 0:
+            def carregar(q):
+                valor = q[slot]
+                if valor is AUSENTE:
+                    raise ErroTupa(f"Variável não definida: '{nome}'")
+                return valor
+
+        elif profundidade == PROFUNDIDADE_GLOBAL:
+            globais = self.globais
+
+            def carregar(q):
+                valor = globais[slot]
+                if valor is AUSENTE:
+                    raise ErroTupa(f"Variável não definida: '{nome}'")
+                return valor
+
+        else:
+            indice = profundidade - 1
+
+            def carregar(q):
+                valor = q[-1][indice][slot]
+                if valor is AUSENTE:
+                    raise ErroTupa(f"Variável não definida: '{nome}'")
+                return valor
+
+        return carregar
+
+    def atribuicao(self, endereco, valor, devolver_valor):
+        """Compila a escrita de valor(q) em uma variável resolvida"""
+        profundidade, slot = endereco
+        alvo = None if profundidade == 0 else self.globais
+
+        if devolver_valor:
+            if alvo is None:
+                def atribuir(q):
+                    resultado = q[slot] = valor(q)
+                    return resultado
+            else:
+                def atribuir(q):
+                    resultado = alvo[slot] = valor(q)
+                    return resultado
+
+        elif alvo is None:
+            def atribuir(q):
+                q[slot] = valor(q)
+        else:
+            def atribuir(q):
+                alvo[slot] = valor(q)
+
+        return atribuir
+
+    def bloco(self, instrucoes):
+        """Compila uma sequência de declarações"""
+        compiladas = tuple(self.declaracao(instrucao) for instrucao in instrucoes)
+
+        if not compiladas:
+            return lambda q: None
+        if len(compiladas) == 1:
+            return compiladas[0]
+
+        def executar_bloco(q):
+            for instrucao in compiladas:
+                retorno = instrucao(q)
+                if retorno is not None:
+                    return retorno
+
+        return executar_bloco
+
+    def corpo_funcao(self, no, com_self):
+        """Compila o corpo de uma função ou método
+
+        Devolve uma fábrica que, dado o quadro onde a declaração é executada,
+        cria a função Python correspondente. Em métodos, o primeiro argumento
+        é a instância.
+        """
+        corpo = self.bloco(no.corpo)
+        tamanho = len(no.nomes_locais)
+        quantidade = len(no.parametros) + (1 if com_self else 0)
+        interpretador = self.interpretador
+        instrumentacao = interpretador.instrumentacao
+
+        def criar(q):
+            envolventes = () if q is None else (q,) + q[-1]
+            cauda = [AUSENTE] * (tamanho - quantidade) + [envolventes]
+
+            def funcao(*args):
+                if len(args) == quantidade:
+                    quadro = list(args) + cauda
+                else:
+                    quadro = montar_quadro(tamanho, quantidade, args, envolventes)
+                retorno = corpo(quadro)
+                return None if retorno is None else retorno[0]
+
+            # Usada por paralelo_mapear para recriar a função em outro processo
+            funcao.origem = (no, envolventes, interpretador)
+            if instrumentacao is not None:
+                return funcao_instrumentada(instrumentacao, no.nome, funcao)
+            return funcao
+
+        return criar
+
+    def declaracao_instrumentada(self, no):
+        """declaracao() com os ganchos de declaração e de erro"""
+        compilada = CompiladorFechamentos.declaracao(self, no)
+        instrumentacao = self.interpretador.instrumentacao
+        linha = getattr(no, 'linha', None)
+
+        def declaracao(q):
+            instrumentacao.declaracao(no)
+            try:
+                return compilada(q)
+            except Exception as erro:
+                instrumentacao.excecao(erro, linha)
+                raise
+
+        return declaracao
+
+    def expressao_contada(self, no):
+        """expressao() que conta cada avaliação do nó"""
+        compilada = CompiladorFechamentos.expressao(self, no)
+        contar_no = self.interpretador.instrumentacao.contar_no
+
+        def contada(q):
+            contar_no(no)
+            return compilada(q)
+
+        return contada
+
+    def declaracao(self, no):
+        """Compila uma declaração"""
+        especie = no.especie
+
+        if especie == NO_EXPRESSAO_DECLARACAO:
+            expressao_no = no.expressao
+            if expressao_no.especie == NO_ATRIBUICAO_EXPRESSAO:
+                # Em posição de declaração o valor da atribuição não é usado
+                return self.atribuicao(expressao_no.endereco, self.expressao(expressao_no.valor), False)
+
+            expressao = self.expressao(expressao_no)
+
+            def avaliar_expressao(q):
+                expressao(q)
+
+            return avaliar_expressao
+
+        elif especie == NO_DECLARACAO_VARIAVEL:
+            return self.atribuicao(no.endereco, self.expressao(no.valor), False)
+
+        elif especie == NO_DECLARACAO_MOSTRAR:
+            expressao = self.expressao(no.expressao)
+            interpretador = self.interpretador
+
+            def mostrar(q):
+                interpretador.saida.escrever(expressao(q))
+
+            return mostrar
+
+        elif especie == NO_DECLARACAO_PEGAR:
+            return self.atribuicao(no.endereco, lambda q: self.interpretador.ler_entrada(), False)
+
+        elif especie == NO_DECLARACAO_SE:
+            condicao = self.expressao(no.condicao)
+            entao = self.bloco(no.bloco_entao)
+            senao = self.bloco(no.bloco_senao)
+
+            def se(q):
+                if condicao(q):
+                    return entao(q)
+                return senao(q)
+
+            return se
+
+        elif especie == NO_DECLARACAO_ENQUANTO:
+            condicao = self.expressao(no.condicao)
+            corpo = self.bloco(no.corpo)
+
+            def enquanto(q):
+                while condicao(q):
+                    retorno = corpo(q)
+                    if retorno is not None:
+                        return retorno
+
+            return enquanto
+
+        elif especie == NO_DECLARACAO_PARA:
+            profundidade, slot = no.endereco
+            inicio = self.expressao(no.inicio)
+            fim = self.expressao(no.fim)
+            passo = (lambda q: 1) if no.passo is None else self.expressao(no.passo)
+            corpo = self.bloco(no.corpo)
+            alvo = None if profundidade == 0 else self.globais
+
+            if no.contador_fixo:
+                # Caminho rápido: o corpo não altera a variável, que vai direto ao slot
+                def para(q):
+                    variaveis = q if alvo is None else alvo
+                    variaveis[slot] = valor = inicio(q)
+                    for valor in intervalo(valor, fim(q), passo(q)):
+                        variaveis[slot] = valor
+                        retorno = corpo(q)
+                        if retorno is not None:
+                            return retorno
+
+            else:
+                # O corpo pode alterar a variável, por isso ela é relida a cada volta
+                def para(q):
+                    variaveis = q if alvo is None else alvo
+                    variaveis[slot] = valor = inicio(q)
+                    limite = fim(q)
+                    incremento = passo(q)
+                    while dentro_do_intervalo(valor, limite, incremento):
+                        retorno = corpo(q)
+                        if retorno is not None:
+                            return retorno
+                        valor = variaveis[slot] + incremento
+                        if not dentro_do_intervalo(valor, limite, incremento):
+                            break
+                        variaveis[slot] = valor
+
+            return para
+
+        elif especie == NO_DECLARACAO_PARA_CADA:
+            profundidade, slot = no.endereco
+            colecao = self.expressao(no.colecao)
+            corpo = self.bloco(no.corpo)
+            alvo = None if profundidade == 0 else self.globais
+
+            def para_cada(q):
+                variaveis = q if alvo is None else alvo
+                for item in colecao(q):
+                    variaveis[slot] = item
+                    retorno = corpo(q)
+                    if retorno is not None:
+                        return retorno
+
+            return para_cada
+
+        elif especie == NO_DECLARACAO_FUNCAO:
+            return self.atribuicao(no.endereco, self.corpo_funcao(no, False), False)
+
+        elif especie == NO_DECLARACAO_DEVOLVER:
+            valor = self.expressao(no.valor)
+
+            def devolver(q):
+                return (valor(q),)
+
+            return devolver
+
+        elif especie == NO_DECLARACAO_CLASSE:
+            # Valores iniciais constantes são guardados diretamente
+            atributos = tuple((atributo.nome, atributo.valor.valor, None)
+                              if atributo.valor.especie == NO_LITERAL_EXPRESSAO else
+                              (atributo.nome, None, self.expressao(atributo.valor))
+                              for atributo in no.atributos)
+            fabricas = {metodo.nome: self.corpo_funcao(metodo, True) for metodo in no.metodos}
+            registrar_classe = self.interpretador.registrar_classe
+
+            def declarar_classe(q):
+                # Os métodos são criados uma vez por declaração e compartilhados
+                # pelas instâncias; o acesso apenas os vincula à instância
+                metodos = {nome: criar(q) for nome, criar in fabricas.items()}
+
+                # Valores iniciais não constantes são avaliados no escopo da declaração
+                inicializacao = [(nome, valor, None if expressao is None else (lambda expressao=expressao: expressao(q)))
+                                 for nome, valor, expressao in atributos]
+                return registrar_classe(ClasseTupa(no.nome, inicializacao, metodos))
+
+            return self.atribuicao(no.endereco, declarar_classe, False)
+
+        elif especie == NO_DECLARACAO_TENTAR:
+            bloco_tentar = self.bloco(no.bloco_tentar)
+            bloco_pegar = self.bloco(no.bloco_pegar)
+            profundidade, slot = no.endereco
+            if profundidade == 0:
+                def tentar(q):
                     try:
-                        for instrucao in no['corpo']:
-                            self.executar(instrucao)
-                    except BreakException:
-                        break
-                    except ContinueException:
-                        continue
-                    
-                    self.definir(no['variavel'], self.obter(no['variavel']) + 1)
-            finally:
-                self.encerrar_escopo()
-        
-        elif tipo == 'DeclaracaoParaCada':
-            self.iniciar_escopo()
-            colecao = self.avaliar(no['colecao'])
-            
-            try:
-                for item in colecao:
-                    self.definir(no['variavel'], item)
-                    
+                        return bloco_tentar(q)
+                    except Exception as e:
+                        q[slot] = str(e)
+                        return bloco_pegar(q)
+            else:
+                globais = self.globais
+
+                def tentar(q):
                     try:
-                        for instrucao in no['corpo']:
-                            self.executar(instrucao)
-                    except BreakException:
-                        break
-                    except ContinueException:
-                        continue
-            finally:
-                self.encerrar_escopo()
-        
-        elif tipo == 'DeclaracaoFuncao':
-            def funcao(*args):
-                self.iniciar_escopo()
-                
-                # Define os parâmetros
-                for i, param in enumerate(no['parametros']):
-                    valor = args[i] if i < len(args) else None
-                    self.definir(param, valor)
-                
-                # Salva o valor de retorno anterior
-                retorno_anterior = self.retorno_valor
-                self.retorno_valor = None
-                
+                        return bloco_tentar(q)
+                    except Exception as e:
+                        globais[slot] = str(e)
+                        return bloco_pegar(q)
+
+            return tentar
+
+        elif especie == NO_DECLARACAO_USAR:
+            nome = no.nome
+            interpretador = self.interpretador
+
+            membros = no.membros
+
+            def usar(q):
+                interpretador.importar_modulo(nome, membros)
+
+            return usar
+
+        elif especie == NO_DECLARACAO_VA:
+            def va(q):
+                raise ErroTupa(ERRO_VA_SEM_VM)
+
+            return va
+
+        else:
+            raise ErroTupa(f"Tipo de nó desconhecido: {no.tipo}")
+
+    def expressao(self, no):
+        """Compila uma expressão em uma função que devolve o seu valor"""
+        especie = no.especie
+
+        if especie == NO_LITERAL_EXPRESSAO:
+            valor = no.valor
+            return lambda q: valor
+
+        elif especie == NO_VARIAVEL_EXPRESSAO:
+            return self.leitor(no.endereco, no.nome)
+
+        elif especie == NO_AGRUPAR_EXPRESSAO:
+            return self.expressao(no.expressao)
+
+        elif especie == NO_UNARIA_EXPRESSAO:
+            direita = self.expressao(no.direita)
+            if no.operador == '-':
+                return lambda q: -direita(q)
+            return lambda q: not direita(q)
+
+        elif especie == NO_BINARIA_EXPRESSAO:
+            esquerda = self.expressao(no.esquerda)
+            if no.direita.especie == NO_LITERAL_EXPRESSAO:
+                return FABRICAS_BINARIAS_CONSTANTE[no.operador](esquerda, no.direita.valor)
+            direita = self.expressao(no.direita)
+            return FABRICAS_BINARIAS[no.operador](esquerda, direita)
+
+        elif especie == NO_LOGICA_EXPRESSAO:
+            esquerda = self.expressao(no.esquerda)
+            direita = self.expressao(no.direita)
+            if no.operador == 'e':
+                return lambda q: esquerda(q) and direita(q)
+            return lambda q: esquerda(q) or direita(q)
+
+        elif especie == NO_ATRIBUICAO_EXPRESSAO:
+            return self.atribuicao(no.endereco, self.expressao(no.valor), True)
+
+        elif especie == NO_ATRIBUICAO_INDEXACAO:
+            objeto = self.expressao(no.objeto)
+            indice = self.expressao(no.indice)
+            valor = self.expressao(no.valor)
+
+            def atribuir_indice(q):
+                alvo = objeto(q)
+                chave = indice(q)
+                resultado = valor(q)
                 try:
-                    # Executa o corpo da função
-                    for instrucao in no['corpo']:
-                        self.executar(instrucao)
-                        if self.retorno_valor is not None:
-                            break
-                    
-                    # Retorna o valor
-                    return self.retorno_valor
-                finally:
-                    # Restaura o valor de retorno anterior
-                    valor_retorno = self.retorno_valor
-                    self.retorno_valor = retorno_anterior
-                    self.encerrar_escopo()
-                    return valor_retorno
-            
-            self.definir(no['nome'], funcao)
-        
-        elif tipo == 'DeclaracaoDevolver':
-            self.retorno_valor = self.avaliar(no['valor'])
-        
-        elif tipo == 'DeclaracaoClasse':
-            class Classe:
-                def __init__(self, interpretador, classe_no):
-                    self.interpretador = interpretador
-                    self.classe_no = classe_no
-                    self.atributos = {}
-                    
-                    # Inicializa os atributos
-                    for atributo in classe_no['atributos']:
-                        valor = interpretador.avaliar(atributo['valor'])
-                        self.atributos[atributo['nome']] = valor
-                    
-                    # Inicializa os métodos
-                    self.metodos = {}
-                    for metodo in classe_no['metodos']:
-                        self.metodos[metodo['nome']] = metodo
-                
-                def __getattr__(self, nome):
-                    if nome in self.atributos:
-                        return self.atributos[nome]
-                    
-                    if nome in self.metodos:
-                        metodo = self.metodos[nome]
-                        
-                        def metodo_wrapper(*args):
-                            self.interpretador.iniciar_escopo()
-                            
-                            # Define o 'self' para o método
-                            self.interpretador.definir('self', self)
-                            
-                            # Define os parâmetros
-                            for i, param in enumerate(metodo['parametros']):
-                                valor = args[i] if i < len(args) else None
-                                self.interpretador.definir(param, valor)
-                            
-                            # Salva o valor de retorno anterior
-                            retorno_anterior = self.interpretador.retorno_valor
-                            self.interpretador.retorno_valor = None
-                            
-                            try:
-                                # Executa o corpo do método
-                                for instrucao in metodo['corpo']:
-                                    self.interpretador.executar(instrucao)
-                                    if self.interpretador.retorno_valor is not None:
-                                        break
-                                
-                                # Retorna o valor
-                                return self.interpretador.retorno_valor
-                            finally:
-                                # Restaura o valor de retorno anterior
-                                valor_retorno = self.interpretador.retorno_valor
-                                self.interpretador.retorno_valor = retorno_anterior
-                                self.interpretador.encerrar_escopo()
-                                return valor_retorno
-                        
-                        return metodo_wrapper
-                    
-                    raise ErroTupa(f"Atributo não definido: '{nome}'")
-                
-                def __setattr__(self, nome, valor):
-                    if nome in ['interpretador', 'classe_no', 'atributos', 'metodos']:
-                        super().__setattr__(nome, valor)
-                    else:
-                        self.atributos[nome] = valor
-            
-            def construtor():
-                return Classe(self, no)
-            
-            self.definir(no['nome'], construtor)
-        
-        elif tipo == 'DeclaracaoTentar':
-            try:
-                for instrucao in no['bloco_tentar']:
-                    self.executar(instrucao)
-            except Exception as e:
-                self.iniciar_escopo()
-                self.definir(no['nome_erro'], str(e))
-                
+                    alvo[chave] = resultado
+                except (IndexError, TypeError, OverflowError) as e:
+                    raise erro_de_atribuicao(alvo, chave, resultado, e)
+                return resultado
+
+            return atribuir_indice
+
+        elif especie == NO_ATRIBUICAO_ATRIBUTO:
+            objeto = self.expressao(no.objeto)
+            nome = no.nome
+            valor = self.expressao(no.valor)
+
+            def atribuir_atributo(q):
+                alvo = objeto(q)
+                resultado = valor(q)
+                setattr(alvo, nome, resultado)
+                return resultado
+
+            return atribuir_atributo
+
+        elif especie == NO_CHAMADA_EXPRESSAO:
+            return self.chamada(no)
+
+        elif especie == NO_INDEXACAO_EXPRESSAO:
+            objeto = self.expressao(no.objeto)
+            indice = self.expressao(no.indice)
+
+            def indexar(q):
+                alvo = objeto(q)
+                chave = indice(q)
                 try:
-                    for instrucao in no['bloco_pegar']:
-                        self.executar(instrucao)
-                finally:
-                    self.encerrar_escopo()
-        
-        elif tipo == 'DeclaracaoUsar':
-            nome = no['nome']
-            if nome in self.modulos:
-                modulo = self.modulos[nome]
-                for nome_funcao, funcao in modulo.items():
-                    self.definir(nome_funcao, funcao)
-            else:
-                raise ErroTupa(f"Módulo não encontrado: '{nome}'")
-        
-        elif tipo == 'ExpressaoDeclaracao':
-            self.avaliar(no['expressao'])
-        
+                    return alvo[chave]
+                except (IndexError, KeyError):
+                    raise ErroTupa(f"Índice inválido: {chave}")
+                except TypeError:
+                    raise ErroTupa(f"Objeto não indexável: {alvo}")
+
+            return indexar
+
+        elif especie == NO_ATRIBUTO_EXPRESSAO:
+            objeto = self.expressao(no.objeto)
+            cache = self.interpretador.novo_cache(no.nome)
+            nome = no.nome
+
+            def obter_atributo(q):
+                alvo = objeto(q)
+                if type(alvo) is cache.tipo and cache.metodo is None:
+                    # Atributo: o slot é lido direto pelo Python
+                    cache.acertos += 1
+                    return getattr(alvo, nome)
+                return ler_atributo(alvo, cache)
+
+            return obter_atributo
+
+        elif especie == NO_LISTA_EXPRESSAO:
+            elementos = tuple(self.expressao(elemento) for elemento in no.elementos)
+            return lambda q: [elemento(q) for elemento in elementos]
+
+        elif especie == NO_DICIONARIO_EXPRESSAO:
+            pares = tuple((self.expressao(chave), self.expressao(valor)) for chave, valor in no.pares)
+            return lambda q: {chave(q): valor(q) for chave, valor in pares}
+
         else:
-            raise ErroTupa(f"Tipo de nó desconhecido: {tipo}")
+            raise ErroTupa(f"Tipo de expressão desconhecido: {no.tipo}")
+
+    def chamada(self, no):
+        """Compila uma chamada, com variantes para zero, um e dois argumentos"""
+        argumentos = tuple(self.expressao(argumento) for argumento in no.argumentos)
+        if no.funcao.especie == NO_ATRIBUTO_EXPRESSAO:
+            return self.chamada_metodo(no.funcao, argumentos)
+
+        funcao = self.expressao(no.funcao)
+
+        if len(argumentos) == 0:
+            def chamar(q):
+                alvo = funcao(q)
+                if not callable(alvo):
+                    raise ErroTupa(f"Não é possível chamar um não-callable: {alvo}")
+                return alvo()
+
+        elif len(argumentos) == 1:
+            primeiro, = argumentos
+
+            def chamar(q):
+                alvo = funcao(q)
+                if not callable(alvo):
+                    raise ErroTupa(f"Não é possível chamar um não-callable: {alvo}")
+                return alvo(primeiro(q))
+
+        elif len(argumentos) == 2:
+            primeiro, segundo = argumentos
+
+            def chamar(q):
+                alvo = funcao(q)
+                if not callable(alvo):
+                    raise ErroTupa(f"Não é possível chamar um não-callable: {alvo}")
+                return alvo(primeiro(q), segundo(q))
+
+        else:
+            def chamar(q):
+                alvo = funcao(q)
+                if not callable(alvo):
+                    raise ErroTupa(f"Não é possível chamar um não-callable: {alvo}")
+                return alvo(*[argumento(q) for argumento in argumentos])
+
+        return chamar
+
+    def chamada_metodo(self, no, argumentos):
+        """Compila 'objeto.nome(...)', chamando métodos Tupã direto do cache em linha"""
+        objeto = self.expressao(no.objeto)
+        cache = self.interpretador.novo_cache(no.nome)
+        nome = no.nome
+
+        def chamar_metodo(q):
+            alvo = objeto(q)
+            if type(alvo) is cache.tipo:
+                cache.acertos += 1
+                metodo = cache.metodo
+            elif isinstance(alvo, InstanciaTupa):
+                metodo = cache.resolver(alvo)
+            else:
+                metodo = None
+            if metodo is not None:
+                return metodo(alvo, *[argumento(q) for argumento in argumentos])
 
-    def avaliar(self, no):
-        """Avalia uma expressão"""
-        tipo = no['tipo']
-        
-        # Expressões
-        if tipo == 'LiteralExpressao':
-            return no['valor']
-        
-        elif tipo == 'VariavelExpressao':
-            return self.obter(no['nome'])
-        
-        elif tipo == 'AgruparExpressao':
-            return self.avaliar(no['expressao'])
-        
-        elif tipo == 'UnariaExpressao':
-            direita = self.avaliar(no['direita'])
-            
-            if no['operador'] == '-':
-                return -direita
-            elif no['operador'] == '!':
-                return not direita
-        
-        elif tipo == 'BinariaExpressao':
-            esquerda = self.avaliar(no['esquerda'])
-            direita = self.avaliar(no['direita'])
-            
-            if no['operador'] == '+':
-                return esquerda + direita
-            elif no['operador'] == '-':
-                return esquerda - direita
-            elif no['operador'] == '*':
-                return esquerda * direita
-            elif no['operador'] == '/':
-                return esquerda / direita
-            elif no['operador'] == '==':
-                return esquerda == direita
-            elif no['operador'] == '!=':
-                return esquerda != direita
-            elif no['operador'] == '<':
-                return esquerda < direita
-            elif no['operador'] == '<=':
-                return esquerda <= direita
-            elif no['operador'] == '>':
-                return esquerda > direita
-            elif no['operador'] == '>=':
-                return esquerda >= direita
-        
-        elif tipo == 'LogicaExpressao':
-            esquerda = self.avaliar(no['esquerda'])
-            
-            if no['operador'] == 'e':
-                return esquerda and self.avaliar(no['direita'])
-            elif no['operador'] == 'ou':
-                return esquerda or self.avaliar(no['direita'])
-        
-        elif tipo == 'AtribuicaoExpressao':
-            valor = self.avaliar(no['valor'])
-            self.definir(no['nome'], valor)
-            return valor
-        
-        elif tipo == 'AtribuicaoIndexacao':
-            objeto = self.avaliar(no['objeto'])
-            indice = self.avaliar(no['indice'])
-            valor = self.avaliar(no['valor'])
-            
-            objeto[indice] = valor
-            return valor
-        
-        elif tipo == 'AtribuicaoAtributo':
-            objeto = self.avaliar(no['objeto'])
-            valor = self.avaliar(no['valor'])
-            
-            setattr(objeto, no['nome'], valor)
-            return valor
-        
-        elif tipo == 'ChamadaExpressao':
-            funcao = self.avaliar(no['funcao'])
-            argumentos = [self.avaliar(arg) for arg in no['argumentos']]
-            
-            if not callable(funcao):
-                raise ErroTupa(f"Não é possível chamar um não-callable: {funcao}")
-            
-            return funcao(*argumentos)
-        
-        elif tipo == 'IndexacaoExpressao':
-            objeto = self.avaliar(no['objeto'])
-            indice = self.avaliar(no['indice'])
-            
-            try:
-                return objeto[indice]
-            except (IndexError, KeyError):
-                raise ErroTupa(f"Índice inválido: {indice}")
-            except TypeError:
-                raise ErroTupa(f"Objeto não indexável: {objeto}")
-        
-        elif tipo == 'AtributoExpressao':
-            objeto = self.avaliar(no['objeto'])
-            
             try:
-                return getattr(objeto, no['nome'])
+                funcao = getattr(alvo, nome)
             except AttributeError:
-                raise ErroTupa(f"Atributo não encontrado: '{no['nome']}'")
-        
-        elif tipo == 'ListaExpressao':
-            elementos = [self.avaliar(elem) for elem in no['elementos']]
-            return elementos
-        
-        elif tipo == 'DicionarioExpressao':
-            dicionario = {}
-            for par in no['pares']:
-                chave = self.avaliar(par['chave'])
-                valor = self.avaliar(par['valor'])
-                dicionario[chave] = valor
-            return dicionario
-        
-        else:
-            raise ErroTupa(f"Tipo de expressão desconhecido: {tipo}")
+                raise ErroTupa(f"Atributo não encontrado: '{nome}'")
+            if not callable(funcao):
+                raise ErroTupa(f"Não é possível chamar um não-callable: {funcao}")
+            return funcao(*[argumento(q) for argumento in argumentos])
 
-class BreakException(Exception):
-    """Exceção usada para implementar o comando 'break'"""
-    pass
+        return chamar_metodo
 
-class ContinueException(Exception):
-    """Exceção usada para implementar o comando 'continue'"""
-    pass
+# Perfil por amostragem
+#
+# Uma thread acorda a cada INTERVALO_PERFIL segundos e lê a pilha Python da
+# thread que executa o programa, sem instrumentar os motores. Na VM, os
+# quadros de MaquinaVirtual.executar trazem o código e o pc atuais e as
+# chamadas guardadas, convertidos em linhas pela tabela de linhas de cada
+# CodigoObjeto; no percurso da árvore, os quadros de Interpretador.executar
+# trazem a declaração em execução e os das funções Tupã, a declaração da
+# função. Cada amostra vale o tempo decorrido desde a anterior.
+
+INTERVALO_PERFIL = 0.005
 
-def executar_arquivo(caminho):
-    """Executa um arquivo Tupã"""
+# Linhas de cada tabela do relatório de texto
+LINHAS_RELATORIO_PERFIL = 20
+
+# Funções Python dos motores que executam uma função ou método Tupã
+# declarado em 'no' ou 'metodo', no percurso da árvore
+FUNCOES_ARVORE_PERFIL = ('funcao', 'executar_metodo')
+
+def pilha_tupa(quadro):
+    """Pilha Tupã ((função, linha), ...) da pilha Python que termina em 'quadro'"""
+    codigo_vm = MaquinaVirtual.executar.__code__
+    codigo_arvore = Interpretador.executar.__code__
+    codigo_corpo = Interpretador.executar_corpo.__code__
+
+    # Percorre do quadro mais interno para o mais externo, montando a pilha
+    # invertida; só a declaração mais interna de cada função é consultada
+    invertida = []
+    linha = None
+    arvore = False
+    while quadro is not None:
+        codigo = quadro.f_code
+        if codigo is codigo_vm:
+            variaveis = quadro.f_locals
+            atual = variaveis.get('codigo')
+            if atual is not None:
+                # pc já aponta para a instrução seguinte, exceto antes da primeira
+                invertida.append((atual.nome, atual.linha(max(variaveis.get('pc', 0) - 2, 0))))
+                for chamada in reversed(variaveis.get('chamadas', ())):
+                    invertida.append((chamada[0].nome, chamada[0].linha(chamada[4] - 2)))
+        elif codigo is codigo_arvore or codigo is codigo_corpo:
+            arvore = True
+            if linha is None:
+                # executar_corpo() avalia o 'devolver' do corpo sem passar por executar()
+                no = quadro.f_locals.get('no' if codigo is codigo_arvore else 'instrucao')
+                linha = getattr(no, 'linha', None)
+        elif codigo.co_name in FUNCOES_ARVORE_PERFIL and codigo.co_filename == __file__:
+            variaveis = quadro.f_locals
+            declaracao = variaveis.get('no', variaveis.get('metodo'))
+            if isinstance(declaracao, DeclaracaoFuncao):
+                invertida.append((declaracao.nome, declaracao.linha if linha is None else linha))
+                linha = None
+        quadro = quadro.f_back
+    if arvore:
+        invertida.append(('<programa>', linha))
+    return tuple(reversed(invertida))
+
+class Perfilador:
+    """Perfil por amostragem de um programa Tupã, usado por 'with'
+
+    'pilhas' associa cada pilha Tupã amostrada ao tempo total, em segundos,
+    em que ela foi vista. Só os motores 'vm' e 'arvore' são amostrados; os
+    fechamentos não deixam na pilha Python nada que identifique o nó.
+    """
+    def __init__(self, intervalo=INTERVALO_PERFIL):
+        self.intervalo = intervalo
+        self.pilhas = {}
+        self.amostras = 0
+        self.ativo = False
+        self.alvo = None
+        self.amostrador = None
+
+    def __enter__(self):
+        import threading
+        self.alvo = threading.get_ident()
+        self.ativo = True
+        self.amostrador = threading.Thread(target=self.amostrar, name='perfil-tupa', daemon=True)
+        self.amostrador.start()
+        return self
+
+    def __exit__(self, *excecao):
+        self.ativo = False
+        self.amostrador.join()
+
+    def amostrar(self):
+        """Laço da thread de amostragem"""
+        import time
+        anterior = time.perf_counter()
+        while self.ativo:
+            time.sleep(self.intervalo)
+            agora = time.perf_counter()
+            quadro = sys._current_frames().get(self.alvo)
+            if quadro is not None:
+                pilha = pilha_tupa(quadro)
+                if pilha:
+                    self.pilhas[pilha] = self.pilhas.get(pilha, 0.0) + (agora - anterior)
+                    self.amostras += 1
+            del quadro
+            anterior = agora
+
+    def tempos(self, chave):
+        """Tempos próprio e total por chave(função, linha), em segundos"""
+        proprio, total = {}, {}
+        for pilha, segundos in self.pilhas.items():
+            chave_propria = chave(*pilha[-1])
+            proprio[chave_propria] = proprio.get(chave_propria, 0.0) + segundos
+            # Recursões contam uma vez por amostra no tempo total
+            for item in {chave(*quadro) for quadro in pilha}:
+                total[item] = total.get(item, 0.0) + segundos
+        return proprio, total
+
+    def relatorio(self):
+        """Relatório de texto com as funções e linhas mais demoradas"""
+        duracao = sum(self.pilhas.values())
+        linhas = [f"Perfil: {self.amostras} amostras, {duracao:.3f}s"]
+        if not duracao:
+            return linhas[0]
+
+        for titulo, chave, por_total in (("Funções (por tempo total)", lambda nome, linha: nome, True),
+                                         ("Linhas (por tempo próprio)", lambda nome, linha: (nome, linha), False)):
+            proprio, total = self.tempos(chave)
+            if por_total:
+                itens = sorted(total, key=lambda item: (total[item], proprio.get(item, 0.0)), reverse=True)
+            else:
+                itens = sorted(total, key=lambda item: (proprio.get(item, 0.0), total[item]), reverse=True)
+            linhas.append("")
+            linhas.append(titulo)
+            linhas.append(f"{'total':>9} {'%':>6} {'próprio':>9} {'%':>6}  local")
+            for item in itens[:LINHAS_RELATORIO_PERFIL]:
+                local = item if isinstance(item, str) else f"{item[0]}, linha {item[1]}"
+                linhas.append(f"{total[item]:>8.3f}s {100 * total[item] / duracao:>5.1f}% "
+                              f"{proprio.get(item, 0.0):>8.3f}s {100 * proprio.get(item, 0.0) / duracao:>5.1f}%  {local}")
+        return '\n'.join(linhas)
+
+    def pilhas_colapsadas(self):
+        """Pilhas no formato 'a;b;c contagem' do flamegraph.pl, em microssegundos"""
+        linhas = sorted(f"{';'.join(f'{nome}:{linha}' for nome, linha in pilha)} {round(segundos * 1e6)}\n"
+                        for pilha, segundos in self.pilhas.items())
+        return ''.join(linhas)
+
+# Cache em disco das árvores sintáticas, como o __pycache__ do Python: cada
+# arquivo 'nome.tupa' analisado guarda sua árvore em '__tupacache__/nome.tupac'.
+# O cabeçalho traz um resumo SHA-256 do código-fonte e do próprio interpretador,
+# então editar qualquer um dos dois invalida o cache. A árvore é guardada antes
+# do Resolvedor, que depende das globais de cada execução.
+DIRETORIO_CACHE = '__tupacache__'
+MAGICO_CACHE = b'TUPAC\x01'
+RESUMO_INTERPRETADOR = None
+
+def resumo_interpretador():
+    """Resumo do código deste interpretador, calculado uma vez por processo"""
+    global RESUMO_INTERPRETADOR
+    if RESUMO_INTERPRETADOR is None:
+        import hashlib
+        try:
+            with open(__file__, 'rb') as arquivo:
+                RESUMO_INTERPRETADOR = hashlib.sha256(arquivo.read()).digest()
+        except OSError:
+            RESUMO_INTERPRETADOR = b''
+    return RESUMO_INTERPRETADOR
+
+def caminho_cache(caminho):
+    """Arquivo .tupac correspondente a um arquivo Tupã"""
+    diretorio, nome = os.path.split(os.path.abspath(caminho))
+    return os.path.join(diretorio, DIRETORIO_CACHE, os.path.splitext(nome)[0] + '.tupac')
+
+def analisar_arquivo(caminho, codigo, usar_cache=True):
+    """Árvore sintática do código de um arquivo, lida do cache em disco quando válido"""
+    if not usar_cache:
+        return Parser(Lexer(codigo).iter_tokens()).analisar()
+
+    import hashlib
+    import pickle
+
+    cabecalho = MAGICO_CACHE + hashlib.sha256(resumo_interpretador() + codigo.encode('utf-8')).digest()
+    arquivo_cache = caminho_cache(caminho)
+    try:
+        with open(arquivo_cache, 'rb') as arquivo:
+            if arquivo.read(len(cabecalho)) == cabecalho:
+                return pickle.load(arquivo)
+    except Exception:
+        # Cache ausente, corrompido ou de outro formato: analisa de novo
+        pass
+
+    arvore = Parser(Lexer(codigo).iter_tokens()).analisar()
+    try:
+        os.makedirs(os.path.dirname(arquivo_cache), exist_ok=True)
+        temporario = f"{arquivo_cache}.{os.getpid()}"
+        with open(temporario, 'wb') as arquivo:
+            arquivo.write(cabecalho)
+            pickle.dump(arvore, arquivo, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, arquivo_cache)
+    except (OSError, RecursionError, pickle.PicklingError):
+        # Sem permissão de escrita ou árvore profunda demais: segue sem cache
+        pass
+    return arvore
+
+def executar_arquivo(caminho, motor=MOTOR_PADRAO, estatisticas=False, otimizar=True, mostrar_arvore=False,
+                     usar_cache=True, buffer_saida=True, perfil=False):
+    """Executa um arquivo Tupã, reaproveitando a árvore do cache em disco se 'usar_cache'
+
+    Com 'perfil', as pilhas amostradas vão para 'nome.pilhas', ao lado de 'nome.tupa'.
+    """
     try:
         with open(caminho, 'r', encoding='utf-8') as arquivo:
             codigo = arquivo.read()
         
-        executar_codigo(codigo)
+        arvore = analisar_arquivo(caminho, codigo, usar_cache)
+        executar_arvore(arvore, motor, estatisticas, otimizar, mostrar_arvore,
+                        os.path.dirname(os.path.abspath(caminho)), usar_cache, buffer_saida,
+                        os.path.splitext(caminho)[0] + '.pilhas' if perfil else None)
     except FileNotFoundError:
         print(f"Erro: Arquivo não encontrado: {caminho}")
     except Exception as e:
         print(f"Erro ao executar o arquivo: {e}")
 
-def executar_codigo(codigo):
+def executar_codigo(codigo, motor=MOTOR_PADRAO, estatisticas=False, otimizar=True, mostrar_arvore=False):
     """Executa um código Tupã"""
     lexer = Lexer(codigo)
-    tokens = lexer.tokenizar()
+    tokens = lexer.iter_tokens()
     
     parser = Parser(tokens)
     arvore = parser.analisar()
     
-    interpretador = Interpretador()
-    interpretador.interpretar(arvore)
+    executar_arvore(arvore, motor, estatisticas, otimizar, mostrar_arvore)
+
+def executar_arvore(arvore, motor=MOTOR_PADRAO, estatisticas=False, otimizar=True, mostrar_arvore=False,
+                    diretorio=None, usar_cache=True, buffer_saida=True, perfil=None):
+    """Executa uma árvore sintática recém-analisada
+
+    Com 'estatisticas', relata os caches em linha ao final; com
+    'mostrar_arvore', apenas mostra a árvore pronta para execução, em JSON.
+    Módulos são procurados primeiro em 'diretorio', o do arquivo executado.
+    Sem 'buffer_saida', cada linha de 'mostrar' é escrita assim que mostrada.
+    Com 'perfil', o caminho de um arquivo, amostra a execução: o relatório
+    vai para a saída de erros e as pilhas colapsadas, para o arquivo.
+    """
+    interpretador = Interpretador(motor, otimizar)
+    interpretador.caminhos_modulos = caminhos_modulos(diretorio)
+    interpretador.usar_cache = usar_cache
+    if not buffer_saida:
+        interpretador.saida = SaidaTupa(limite=1)
+    if mostrar_arvore:
+        import json
+        print(json.dumps(interpretador.preparar(arvore).to_dict(), ensure_ascii=False, indent=2))
+        return
+
+    if perfil is None:
+        interpretador.interpretar(arvore)
+    else:
+        if motor == 'fechamentos':
+            raise ErroTupa("O perfil só está disponível nos motores 'vm' e 'arvore'")
+        with Perfilador() as perfilador:
+            interpretador.interpretar(arvore)
+        print(perfilador.relatorio(), file=sys.stderr)
+        with open(perfil, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(perfilador.pilhas_colapsadas())
+        print(f"Pilhas colapsadas em {perfil}", file=sys.stderr)
+    if estatisticas:
+        print(interpretador.relatorio_caches(), file=sys.stderr)
 
-def iniciar_shell():
+def iniciar_shell(motor=MOTOR_PADRAO):
     """Inicia um shell interativo para a linguagem Tupã"""
     print("Bem-vindo ao Shell Tupã!")
     print("Digite 'sair' para sair.")
     
-    interpretador = Interpretador()
+    interpretador = Interpretador(motor)
     
     while True:
         try:
@@ -1288,7 +5071,7 @@ def iniciar_shell():
                 break
             
             lexer = Lexer(codigo)
-            tokens = lexer.tokenizar()
+            tokens = lexer.iter_tokens()
             
             parser = Parser(tokens)
             arvore = parser.analisar()
@@ -1300,9 +5083,33 @@ def iniciar_shell():
             print(f"Erro interno: {e}")
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    import argparse
+
+    argumentos = argparse.ArgumentParser(description="Interpretador da linguagem Tupã")
+    argumentos.add_argument('arquivo', nargs='?', help="arquivo Tupã a executar (sem ele, abre o shell)")
+    argumentos.add_argument('--motor', choices=MOTORES, default=MOTOR_PADRAO,
+                            help="motor de execução: 'vm' (bytecode, padrão), 'arvore' (percurso da árvore) "
+                                 "ou 'fechamentos' (compilação para funções Python)")
+    argumentos.add_argument('--estatisticas-cache', action='store_true',
+                            help="ao final, mostra acertos e falhas dos caches em linha de atributos e métodos")
+    argumentos.add_argument('--sem-otimizacao', action='store_true',
+                            help="não dobra constantes nem remove ramos mortos antes de executar")
+    argumentos.add_argument('--mostrar-arvore', action='store_true',
+                            help="mostra a árvore sintática otimizada, em JSON, em vez de executar o arquivo")
+    argumentos.add_argument('--sem-buffer', action='store_true',
+                            help="escreve cada linha de 'mostrar' imediatamente, sem acumulá-las")
+    argumentos.add_argument('--sem-cache', action='store_true',
+                            help=f"não lê nem grava a árvore analisada em {DIRETORIO_CACHE}/")
+    argumentos.add_argument('--perfil', action='store_true',
+                            help="amostra a execução e relata as funções e linhas mais demoradas; as pilhas, "
+                                 "para gráficos de chama, vão para 'arquivo.pilhas'")
+    opcoes = argumentos.parse_args()
+
+    if opcoes.arquivo:
         # Executa o arquivo especificado
-        executar_arquivo(sys.argv[1])
+        executar_arquivo(opcoes.arquivo, opcoes.motor, opcoes.estatisticas_cache,
+                         not opcoes.sem_otimizacao, opcoes.mostrar_arvore, not opcoes.sem_cache,
+                         not opcoes.sem_buffer, opcoes.perfil)
     else:
         # Inicia o shell interativo
-        iniciar_shell()
\ No newline at end of file
+        iniciar_shell(opcoes.motor)
\ No newline at end of file